@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Per-stage DSP benchmarks for AudioProcessor.
+
+Generates synthetic speech-plus-noise signals for every combination of the
+requested durations, sample rates and channel counts, times each processing
+stage and the full ``process_audio`` pipeline (regular, low memory and
+streaming), and reports the realtime factor (audio seconds per processing
+second) and the peak traced memory of every measurement as JSON. Everything runs offline; output is written as WAV
+so no encoder is needed.
+
+Usage:
+    python benchmarks/bench_processor.py --durations 10 60 --rates 44100 48000 \\
+        --channels 1 2 --output bench.json
+    python benchmarks/bench_processor.py --baseline bench.json --max-slowdown 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import scipy
+import soundfile as sf
+from scipy import signal as sps
+from src.audio_processing.processor import AudioProcessor
+
+DEFAULT_SETTINGS = {
+    'noise_reduction': 0.5,
+    'compression': 0.5,
+    'eq_preset': 'Stüdyo',
+    'codec': 'wav',
+}
+
+
+def synthetic_speech(duration, sr, channels=1, seed=0):
+    """
+    Speech-like test signal: harmonic voiced segments with a syllable-rate
+    envelope and pauses, on top of low-level pink-ish background noise
+
+    Returns:
+        np.ndarray: float32 array of shape (samples,) or (channels, samples)
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    t = np.arange(n) / sr
+
+    out = []
+    for channel in range(channels):
+        # Gliding fundamental with a few harmonics
+        f0 = 120 + 30 * channel + 20 * np.sin(2 * np.pi * 0.3 * t)
+        phase = 2 * np.pi * np.cumsum(f0) / sr
+        voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+
+        # Syllables (~4 Hz) grouped into phrases separated by pauses
+        syllables = np.clip(np.sin(2 * np.pi * 4 * t + channel), 0, None)
+        phrases = (np.sin(2 * np.pi * 0.2 * t + channel) > -0.3).astype(np.float64)
+        speech = 0.3 * voiced * syllables * phrases
+
+        # Background noise with a 1/f-like tilt
+        b, a = sps.butter(1, 1000 / (sr / 2))
+        noise = 0.02 * sps.lfilter(b, a, rng.standard_normal(n)) + 0.003 * rng.standard_normal(n)
+
+        out.append(speech + noise)
+
+    y = np.asarray(out, dtype=np.float32)
+    return y[0] if channels == 1 else y
+
+
+def stage_functions(processor, settings):
+    """(name, function(y, sr)) for every stage in process order"""
+    return [
+        ('noise_reduction', lambda y, sr: processor._apply_noise_reduction(y, sr, settings['noise_reduction'])),
+        ('eq', lambda y, sr: processor._apply_eq(y, sr, settings['eq_preset'])),
+        ('compression', lambda y, sr: processor._apply_compression(
+            y, settings['compression'], sr, **processor._compression_options(settings))),
+        ('normalize', lambda y, sr: processor._normalize_audio(y)),
+    ]
+
+
+def measure(func, repeat):
+    """
+    Best wall time over ``repeat`` runs, then one run under tracemalloc
+
+    Returns:
+        tuple: (seconds, peak traced bytes, result of the last run)
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+
+def run_benchmarks(durations, rates, channel_counts, repeat=3, settings=None, streaming=True):
+    """Run all benchmarks and return the JSON-serializable report"""
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    work_dir = tempfile.mkdtemp(prefix='pse-bench-')
+    processor = AudioProcessor(output_dir=os.path.join(work_dir, 'output'), cache=False, stage_cache=False)
+    processor.warm_up()
+    results = []
+
+    try:
+        for duration in durations:
+            for sr in rates:
+                for channels in channel_counts:
+                    case = {'duration': duration, 'sample_rate': sr, 'channels': channels}
+                    y = synthetic_speech(duration, sr, channels)
+
+                    def record(stage, seconds, peak):
+                        results.append(dict(
+                            case,
+                            stage=stage,
+                            seconds=seconds,
+                            realtime_factor=duration / seconds if seconds > 0 else None,
+                            peak_memory_bytes=peak,
+                        ))
+                        print(f"{duration:>6}s {sr:>6}Hz {channels}ch {stage:<18} "
+                              f"{seconds:8.3f}s {duration / seconds:9.1f}x {peak / 2 ** 20:9.1f} MiB",
+                              file=sys.stderr)
+
+                    # Individual stages, each fed the output of the previous one
+                    for stage, func in stage_functions(processor, settings):
+                        seconds, peak, y = measure(lambda: func(y, sr), repeat)
+                        record(stage, seconds, peak)
+
+                    # Full pipeline from a file on disk
+                    input_file = os.path.join(work_dir, f'input_{duration}_{sr}_{channels}.wav')
+                    sf.write(input_file, synthetic_speech(duration, sr, channels).T, sr, subtype='PCM_16')
+                    modes = [('pipeline', settings), ('pipeline_low_memory', dict(settings, low_memory=True))]
+                    if streaming:
+                        modes.append(('pipeline_streaming', dict(settings, streaming=True)))
+                    for stage, job_settings in modes:
+                        seconds, peak, _ = measure(
+                            lambda: processor.process_audio(input_file, job_settings), repeat)
+                        record(stage, seconds, peak)
+                    os.remove(input_file)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+        },
+        'settings': settings,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(report, baseline, max_slowdown):
+    """
+    Compare realtime factors with a baseline report
+
+    Returns:
+        list: Descriptions of every measurement that got slower than allowed
+    """
+    def key(entry):
+        return (entry['duration'], entry['sample_rate'], entry['channels'], entry['stage'])
+
+    previous = {key(entry): entry for entry in baseline.get('results', [])}
+    regressions = []
+    for entry in report['results']:
+        old = previous.get(key(entry))
+        if not old or not old.get('realtime_factor') or not entry.get('realtime_factor'):
+            continue
+        if entry['realtime_factor'] < old['realtime_factor'] * (1 - max_slowdown):
+            regressions.append(
+                f"{entry['stage']} ({entry['duration']}s, {entry['sample_rate']}Hz, {entry['channels']}ch): "
+                f"{old['realtime_factor']:.1f}x -> {entry['realtime_factor']:.1f}x realtime"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the AudioProcessor stages.')
+    parser.add_argument('--durations', type=float, nargs='+', default=[10.0, 60.0], help='Signal durations in seconds')
+    parser.add_argument('--rates', type=int, nargs='+', default=[44100, 48000], help='Sample rates')
+    parser.add_argument('--channels', type=int, nargs='+', default=[1, 2], help='Channel counts')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per measurement (best is reported)')
+    parser.add_argument('--no-streaming', action='store_true', help='Skip the streaming pipeline measurement')
+    parser.add_argument('--output', default=None, help='Write the JSON report to this file (default: stdout)')
+    parser.add_argument('--baseline', default=None, help='Earlier JSON report to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=0.2,
+                        help='Allowed relative drop in realtime factor before failing (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.durations, args.rates, args.channels, args.repeat, streaming=not args.no_streaming)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.max_slowdown)
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
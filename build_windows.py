@@ -17,9 +17,9 @@ def build_windows_exe():
         "--onefile",
         "--icon=assets/logo/podcast-studio-enhencer-logo.ico",
         "--add-data=assets/logo/podcast-studio-enhencer-logo.png:assets/logo",
+        "--add-data=assets/chains:assets/chains",
         "--hidden-import=scipy.signal",
         "--hidden-import=librosa",
-        "--hidden-import=noisereduce",
         "--hidden-import=soundfile",
         "--hidden-import=PIL",
         "main.py"
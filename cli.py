@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+import sys
+from src.cli.batch import main
+
+if __name__ == "__main__":
+    sys.exit(main())
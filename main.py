@@ -1,10 +1,29 @@
 #!/usr/bin/env python3
+import time
+START_TIME = time.perf_counter()  # Taken before the UI imports for the startup metric
+
+import argparse
+import multiprocessing
 import os
+import sys
 import tkinter as tk
 from tkinter import ttk
 from src.ui.main_window import MainWindow
 
+def report_startup(root, measure_only):
+    """Print how long it took until the window was ready, optionally quit"""
+    startup_ms = (time.perf_counter() - START_TIME) * 1000
+    print(f"Startup time: {startup_ms:.0f} ms")
+    sys.stdout.flush()
+    if measure_only:
+        root.destroy()
+
 def main():
+    parser = argparse.ArgumentParser(description="Podcast Studio Enhancer")
+    parser.add_argument('--measure-startup', action='store_true',
+                        help="Print the startup time once the window is ready and exit")
+    args = parser.parse_args()
+    
     # Create output directory if it doesn't exist
     os.makedirs('output', exist_ok=True)
     
@@ -14,7 +33,7 @@ def main():
     
     # Set window size and position
     window_width = 800
-    window_height = 600
+    window_height = 990
     screen_width = root.winfo_screenwidth()
     screen_height = root.winfo_screenheight()
     center_x = int(screen_width/2 - window_width/2)
@@ -35,8 +54,13 @@ def main():
     # Create main window
     app = MainWindow(root)
     
+    # Report the startup time once the window has been drawn
+    root.after_idle(report_startup, root, args.measure_startup)
+    
     # Start the application
     root.mainloop()
 
 if __name__ == "__main__":
+    # Noise reduction workers are spawned, which a packaged app has to hand over to them
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,205 @@
+"""
+Frame-level activity index: where a recording has speech and where it is dead air.
+
+``ActivityIndex`` measures the RMS of every 20 ms frame (the signal is
+framed with reshapes, a chunk at a time, like ``frame_rms``) and marks
+frames active with hysteresis: a region opens where the level rises
+``OPEN_DB`` above the noise floor and only closes once it falls below
+``CLOSE_DB`` above it, so speech is not chopped at every soft syllable.
+Pauses shorter than ``MIN_SILENCE_SECONDS`` stay inside their region and
+regions are padded on both sides, so consonants and breaths at the edges
+are kept.
+
+``process_active`` runs an expensive stage (the spectral gate) over the
+active regions only and applies a fixed gain to the silence in between,
+crossfading at every edge. ``ActivityIndex.trim_bounds`` gives the range
+that remains after cutting leading and trailing silence.
+"""
+import numpy as np
+from src.audio_processing.noise_profile import SILENCE_RMS
+
+# Length of an analysis frame
+FRAME_SECONDS = 0.02
+
+# Hysteresis thresholds above the noise floor (10th percentile of the frame levels)
+NOISE_FLOOR_PERCENTILE = 10
+OPEN_DB = 12.0
+CLOSE_DB = 6.0
+
+# Pauses shorter than this belong to the surrounding speech
+MIN_SILENCE_SECONDS = 0.5
+
+# Audio kept around every active region (covers the crossfade)
+ACTIVE_PAD_SECONDS = 0.1
+
+# Crossfade between processed regions and the attenuated silence
+FADE_SECONDS = 0.01
+
+# Silence kept before the first and after the last active frame when trimming
+TRIM_PAD_SECONDS = 0.25
+
+
+def frame_levels(y, frame_length, chunk_frames=4096):
+    """
+    Level in dB of consecutive frames, the loudest channel of each frame
+
+    A trailing partial frame counts as a frame of its own.
+    """
+    y = y if y.ndim == 2 else y[None, :]
+    n = y.shape[-1]
+    n_frames = -(-n // frame_length)
+    rms = np.zeros(n_frames)
+    for start in range(0, n_frames, chunk_frames):
+        stop = min(start + chunk_frames, n_frames)
+        # Convert to float64 a chunk at a time instead of copying the whole signal
+        chunk = np.asarray(y[:, start * frame_length:stop * frame_length], dtype=np.float64)
+        padding = (stop - start) * frame_length - chunk.shape[-1]
+        if padding:
+            chunk = np.pad(chunk, ((0, 0), (0, padding)))
+        frames = chunk.reshape(chunk.shape[0], stop - start, frame_length)
+        rms[start:stop] = np.sqrt(np.mean(frames * frames, axis=-1)).max(axis=0)
+    return 20 * np.log10(np.maximum(rms, SILENCE_RMS))
+
+
+def _runs(mask):
+    """Start and stop indices of the runs of True in a boolean array"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def hysteresis(levels, open_level, close_level):
+    """Active frames: opened above ``open_level``, closed again below ``close_level``"""
+    # +1 where a region opens, 0 where it closes, -1 in between (keep the last state)
+    events = np.full(len(levels), -1, dtype=np.int8)
+    events[levels < close_level] = 0
+    events[levels > open_level] = 1
+    last_event = np.maximum.accumulate(np.where(events >= 0, np.arange(len(levels)), 0))
+    return events[last_event] == 1
+
+
+class ActivityIndex:
+    """Active (non-silent) frames of a signal"""
+
+    def __init__(self, active, frame_length, n_samples, levels=None):
+        """
+        Args:
+            active (np.ndarray): One bool per frame
+            frame_length (int): Samples per frame
+            n_samples (int): Length of the indexed signal
+            levels (np.ndarray): Frame levels in dB the index was computed from (optional)
+        """
+        self.active = np.asarray(active, dtype=bool)
+        self.frame_length = frame_length
+        self.n_samples = n_samples
+        self.levels = levels
+
+    @classmethod
+    def from_signal(cls, y, sr, open_db=OPEN_DB, close_db=CLOSE_DB,
+                    min_silence=MIN_SILENCE_SECONDS, pad=ACTIVE_PAD_SECONDS):
+        """
+        Index a (samples,) or (channels, samples) signal
+
+        A signal without a level range of at least ``open_db`` (no pauses to
+        tell apart, e.g. continuous music) is active everywhere.
+        """
+        frame_length = max(1, int(FRAME_SECONDS * sr))
+        levels = frame_levels(y, frame_length)
+        if len(levels) == 0:
+            return cls(levels > 0, frame_length, y.shape[-1], levels)
+
+        # The floor ignores digital silence, which says nothing about the room noise
+        audible = levels[levels > 20 * np.log10(SILENCE_RMS)]
+        if len(audible) == 0:
+            return cls(np.zeros(len(levels), dtype=bool), frame_length, y.shape[-1], levels)
+        floor = np.percentile(audible, NOISE_FLOOR_PERCENTILE)
+        if np.max(audible) - floor < open_db:
+            return cls(np.ones(len(levels), dtype=bool), frame_length, y.shape[-1], levels)
+
+        active = hysteresis(levels, floor + open_db, floor + close_db)
+
+        # Close short pauses between active runs, then pad every run
+        starts, stops = _runs(active)
+        frames_per_second = sr / frame_length
+        short = (starts[1:] - stops[:-1]) < min_silence * frames_per_second
+        for stop, start in zip(stops[:-1][short], starts[1:][short]):
+            active[stop:start] = True
+        pad_frames = int(np.ceil(pad * frames_per_second))
+        starts, stops = _runs(active)
+        for start, stop in zip(starts, stops):
+            active[max(0, start - pad_frames):stop + pad_frames] = True
+        return cls(active, frame_length, y.shape[-1], levels)
+
+    @property
+    def active_fraction(self):
+        """Share of the frames that are active (1 for an empty signal)"""
+        return float(self.active.mean()) if len(self.active) else 1.0
+
+    def regions(self):
+        """Active regions as (start, stop) sample ranges"""
+        starts, stops = _runs(self.active)
+        return [
+            (int(start) * self.frame_length, min(int(stop) * self.frame_length, self.n_samples))
+            for start, stop in zip(starts, stops)
+        ]
+
+    def trim_bounds(self, sr, pad=TRIM_PAD_SECONDS):
+        """
+        (start, stop) samples left after cutting leading and trailing silence
+
+        The whole signal if nothing is active, so trimming never empties a file.
+        """
+        active = np.flatnonzero(self.active)
+        if len(active) == 0:
+            return 0, self.n_samples
+        pad_samples = int(pad * sr)
+        start = max(0, int(active[0]) * self.frame_length - pad_samples)
+        stop = min(self.n_samples, (int(active[-1]) + 1) * self.frame_length + pad_samples)
+        return start, stop
+
+
+def process_active(y, regions, apply, silent_gain, fade, progress=None, out=None):
+    """
+    Process only the active regions of a signal and attenuate the rest
+
+    Args:
+        y (np.ndarray): (samples,) or (channels, samples) signal
+        regions (list): Active (start, stop) sample ranges, sorted and disjoint
+        apply (callable): ``apply(segment, progress, out)`` processes one region into ``out``
+        silent_gain (float): Gain of the samples outside the regions
+        fade (int): Crossfade length at every region edge (samples)
+        progress (callable): Called with the finished fraction (0-1), weighted by region length
+        out (np.ndarray): Array the result is written to (may be ``y`` itself)
+
+    Returns:
+        np.ndarray: The processed signal
+    """
+    if out is None:
+        out = np.empty_like(y)
+    gain = y.dtype.type(silent_gain)
+    total = sum(stop - start for start, stop in regions) or 1
+    done = 0
+    previous = 0
+    for start, stop in regions:
+        # The region's edges are read before it is processed (``out`` may be ``y``)
+        n_fade = min(fade, (stop - start) // 2)
+        head = y[..., start:start + n_fade] * gain
+        tail = y[..., stop - n_fade:stop] * gain
+        np.multiply(y[..., previous:start], gain, out=out[..., previous:start])
+
+        def region_progress(fraction, offset=done, length=stop - start):
+            if progress:
+                progress((offset + fraction * length) / total)
+
+        apply(y[..., start:stop], region_progress, out[..., start:stop])
+        if n_fade:
+            ramp = np.linspace(0, 1, n_fade, endpoint=False, dtype=y.dtype)
+            segment = out[..., start:start + n_fade]
+            segment[...] = segment * ramp + head * (1 - ramp)
+            segment = out[..., stop - n_fade:stop]
+            segment[...] = segment * ramp[::-1] + tail * (1 - ramp[::-1])
+        done += stop - start
+        previous = stop
+    np.multiply(y[..., previous:], gain, out=out[..., previous:])
+    if progress:
+        progress(1.0)
+    return out
@@ -0,0 +1,87 @@
+"""Helpers for processing audio as a stream of blocks"""
+import numpy as np
+import soundfile as sf
+
+# Samples per block of the in-place (low memory) stage implementations
+WORK_BLOCK_SIZE = 65536
+
+
+def read_blocks(input_file, block_size, mono=False):
+    """
+    Yield float32 blocks of the input file
+
+    Mono files (or ``mono=True``) give blocks of shape (samples,), other
+    files blocks of shape (channels, samples) like librosa.load(mono=False).
+    """
+    for block in sf.blocks(input_file, blocksize=block_size, dtype='float32', always_2d=True):
+        if mono:
+            # Downmix like librosa.load(mono=True)
+            yield block.mean(axis=1, dtype=np.float32)
+        elif block.shape[1] == 1:
+            yield block[:, 0]
+        else:
+            yield np.ascontiguousarray(block.T)
+
+
+def with_context(blocks, func, context):
+    """
+    Apply ``func`` to every block padded with neighbouring audio.
+
+    Each block is processed as ``previous[-context:] + block + next[:context]``
+    (zero padded at the start and end of the stream, with the last block
+    padded to the full block length) and only the part
+    belonging to the block itself is yielded. The output therefore lags one
+    block behind the input. Samples run along the last axis.
+
+    A block's samples are no longer read once its output has been yielded,
+    so the output may be written back into the input buffer.
+    """
+    previous = None
+    pending = None
+    block_size = 0
+
+    def zeros(like, n):
+        return np.zeros(like.shape[:-1] + (n,), dtype=like.dtype)
+
+    for block in blocks:
+        n = block.shape[-1]
+        block_size = max(block_size, n)
+        if previous is None:
+            previous = zeros(block, context)
+        if pending is not None:
+            head = block[..., :context]
+            if head.shape[-1] < context:
+                head = np.concatenate([head, zeros(head, context - head.shape[-1])], axis=-1)
+            out = func(np.concatenate([previous, pending, head], axis=-1))
+            previous = np.concatenate([previous, pending], axis=-1)[..., -context:]
+            yield out[..., context:context + pending.shape[-1]]
+        pending = block
+
+    if pending is not None:
+        # Pad the last block to a full block so it is analysed like all the others
+        pad = max(block_size - pending.shape[-1], 0) + context
+        segment = np.concatenate([previous, pending, zeros(pending, pad)], axis=-1)
+        yield func(segment)[..., context:context + pending.shape[-1]]
+
+
+def split_blocks(y, block_size):
+    """Yield consecutive blocks of an in-memory signal along its last axis (views, no copies)"""
+    for start in range(0, y.shape[-1], block_size):
+        yield y[..., start:start + block_size]
+
+
+def rechunk(blocks, chunk_size):
+    """Regroup a stream of blocks into blocks of exactly ``chunk_size`` samples (the last one may be shorter)"""
+    buffered = []
+    count = 0
+    for block in blocks:
+        buffered.append(block)
+        count += block.shape[-1]
+        while count >= chunk_size:
+            joined = np.concatenate(buffered, axis=-1) if len(buffered) > 1 else buffered[0]
+            yield joined[..., :chunk_size]
+            rest = joined[..., chunk_size:]
+            buffered = [rest] if rest.shape[-1] else []
+            count = rest.shape[-1]
+    if count:
+        yield np.concatenate(buffered, axis=-1) if len(buffered) > 1 else buffered[0]
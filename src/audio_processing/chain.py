@@ -0,0 +1,486 @@
+"""
+Declarative processing chains and the compiler that turns them into passes.
+
+A chain lists its stages with their parameters, in order. It is read from a
+JSON or TOML preset file (``load_chain``) or built from the classic
+settings (``chain_from_settings``)::
+
+    name = "Röportaj"
+
+    [[stages]]
+    type = "highpass"
+    freq = 80
+
+    [[stages]]
+    type = "compression"
+    amount = 0.5
+
+``compile_chain`` validates the stages against ``STAGE_TYPES`` and turns
+them into as few passes over the audio as possible:
+
+- adjacent linear filters (EQ presets or bands, high-/low-pass filters and
+  gains) merge into one FIR filter, the convolution of their impulse
+  responses;
+- adjacent pointwise operations (gains, instantaneous compressor curves)
+  run as one block-wise pass, and a gain right after a compressor becomes
+  part of its makeup gain;
+- gains in front of the normalization, including the makeup gain of a
+  compressor directly before it, are dropped: the normalization scales to
+  its target whatever level it is given.
+
+Every resulting ``ChainOp`` runs as one stage of the in-memory StageGraph
+or of the streaming generator chain, except that a filter right after noise
+reduction is applied to the gate's STFT frames when it is short enough
+(``CompiledChain.passes``).
+"""
+import functools
+import os
+import numpy as np
+from scipy import signal
+from src.audio_processing.activity import TRIM_PAD_SECONDS
+from src.audio_processing.chain_files import ChainError, chain_name, chain_path, read_chain_file
+from src.audio_processing.compressor import Compressor
+from src.audio_processing.equalizer import (
+    DEFAULT_PRESET, EQ_PRESETS, EqFilter, get_band_filter, preset_bands, response_length, truncate_response
+)
+from src.audio_processing.loudness import DEFAULT_TRUE_PEAK_DB
+from src.audio_processing.noise_profile import N_FFT
+from src.audio_processing.spectral import SpectralFilter, fits_frames
+
+# Peak level of peak normalization
+DEFAULT_PEAK = 0.95
+
+# Parameters of every stage type, with their defaults
+STAGE_TYPES = {
+    'noise_reduction': {'amount': 0.5, 'skip_silence': False},
+    'trim_silence': {'pad': TRIM_PAD_SECONDS},
+    'eq': {'preset': 'Stüdyo', 'bands': None},
+    'highpass': {'freq': 80.0, 'order': 2},
+    'lowpass': {'freq': 16000.0, 'order': 2},
+    'gain': {'db': 0.0},
+    'compression': {'amount': 0.5, 'attack_ms': 0.0, 'release_ms': 0.0, 'knee': 0.0, 'lookahead_ms': 0.0},
+    'normalize': {'loudness': None, 'true_peak': DEFAULT_TRUE_PEAK_DB, 'peak': DEFAULT_PEAK},
+}
+
+# Allowed (inclusive) range of every numeric parameter
+PARAM_RANGES = {
+    'amount': (0.0, 1.0),
+    'pad': (0.0, 10.0),
+    'freq': (1.0, 100000.0),
+    'order': (1, 8),
+    'db': (-60.0, 40.0),
+    'attack_ms': (0.0, 1000.0),
+    'release_ms': (0.0, 5000.0),
+    'knee': (0.0, 1.0),
+    'lookahead_ms': (0.0, 50.0),
+    'loudness': (-70.0, 0.0),
+    'true_peak': (-20.0, 0.0),
+    'peak': (0.01, 1.0),
+}
+
+# Compiled op kind of every primitive operation
+_OP_KINDS = {
+    'denoise': 'noise_reduction',
+    'trim': 'trim',
+    'fir': 'filter',
+    'scale': 'pointwise',
+    'curve': 'pointwise',
+    'compressor': 'compression',
+    'normalize': 'normalize',
+}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_stage(stage, index=0):
+    """
+    Check one stage spec and fill in the defaults of missing parameters
+
+    Returns:
+        dict: ``{'type': ..., **params}``
+    """
+    where = f"Stage {index + 1}"
+    if not isinstance(stage, dict) or 'type' not in stage:
+        raise ChainError(f"{where}: expected a table with a 'type'")
+    stage_type = stage['type']
+    if stage_type not in STAGE_TYPES:
+        raise ChainError(f"{where}: unknown type '{stage_type}' (known: {', '.join(STAGE_TYPES)})")
+    where = f"{where} ({stage_type})"
+
+    defaults = STAGE_TYPES[stage_type]
+    unknown = [key for key in stage if key != 'type' and key not in defaults]
+    if unknown:
+        raise ChainError(f"{where}: unknown parameter(s) {', '.join(unknown)}")
+
+    spec = {'type': stage_type}
+    for key, default in defaults.items():
+        value = stage.get(key, default)
+        if key == 'bands':
+            value = _validate_bands(value, where)
+        elif isinstance(default, bool):
+            if not isinstance(value, bool):
+                raise ChainError(f"{where}: '{key}' must be true or false")
+        elif isinstance(default, str):
+            if not isinstance(value, str):
+                raise ChainError(f"{where}: '{key}' must be a string")
+        elif value is not None or default is not None:
+            if not _is_number(value):
+                raise ChainError(f"{where}: '{key}' must be a number")
+            low, high = PARAM_RANGES[key]
+            if not low <= value <= high:
+                raise ChainError(f"{where}: '{key}' must be between {low} and {high}, got {value}")
+            value = int(value) if isinstance(default, int) else float(value)
+        spec[key] = value
+
+    if stage_type == 'eq' and spec['bands'] is None and spec['preset'] not in EQ_PRESETS:
+        raise ChainError(f"{where}: unknown preset '{spec['preset']}' (known: {', '.join(EQ_PRESETS)})")
+    return spec
+
+
+def _validate_bands(bands, where):
+    if bands is None:
+        return None
+    if not isinstance(bands, (list, tuple)):
+        raise ChainError(f"{where}: 'bands' must be a list of [frequency, gain] pairs")
+    checked = []
+    for band in bands:
+        if (not isinstance(band, (list, tuple)) or len(band) != 2
+                or not all(_is_number(value) for value in band) or band[0] <= 0 or band[1] < 0):
+            raise ChainError(f"{where}: invalid band {band!r}, expected [frequency > 0, gain >= 0]")
+        checked.append([float(band[0]), float(band[1])])
+    return checked
+
+
+def validate_chain(spec):
+    """
+    Check a whole chain spec (a list of stages, or a table with 'stages')
+
+    Returns:
+        dict: ``{'name': ..., 'stages': [validated stage, ...]}``
+    """
+    if isinstance(spec, (list, tuple)):
+        spec = {'stages': list(spec)}
+    if not isinstance(spec, dict) or not isinstance(spec.get('stages'), (list, tuple)):
+        raise ChainError("A chain needs a list of 'stages'")
+    stages = [validate_stage(stage, index) for index, stage in enumerate(spec['stages'])]
+    for index, stage in enumerate(stages[:-1]):
+        if stage['type'] == 'normalize':
+            raise ChainError(f"Stage {index + 1} (normalize): normalization must be the last stage")
+    return {'name': str(spec.get('name', '')), 'stages': stages}
+
+
+def load_chain(path):
+    """Read and validate a chain from a .json or .toml file"""
+    spec = read_chain_file(path)
+    try:
+        chain = validate_chain(spec)
+    except ChainError as e:
+        raise ChainError(f"{os.path.basename(path)}: {e}") from e
+    chain['name'] = chain_name(chain, path)
+    return chain
+
+
+def resolve_chain(chain):
+    """Validated chain from a file path, a preset chain name or an in-memory spec"""
+    if isinstance(chain, str):
+        return load_chain(chain_path(chain))
+    return validate_chain(chain)
+
+
+def chain_from_settings(settings, peak=DEFAULT_PEAK):
+    """The chain the classic settings (sliders, EQ preset, loudness target) describe"""
+    stages = []
+    if settings.get('noise_reduction', 0) > 0:
+        stages.append({
+            'type': 'noise_reduction',
+            'amount': settings['noise_reduction'],
+            'skip_silence': bool(settings.get('skip_silence', False))
+        })
+    if settings.get('trim_silence', False):
+        stages.append({'type': 'trim_silence'})
+
+    # Unknown presets keep falling back to the balanced EQ
+    preset = settings.get('eq_preset', 'Stüdyo')
+    stages.append({'type': 'eq', 'preset': preset if preset in EQ_PRESETS else DEFAULT_PRESET})
+
+    if settings.get('compression', 0) > 0:
+        stages.append({
+            'type': 'compression',
+            'amount': settings['compression'],
+            'attack_ms': settings.get('compression_attack_ms', 0.0),
+            'release_ms': settings.get('compression_release_ms', 0.0),
+            'knee': settings.get('compression_knee', 0.0),
+            'lookahead_ms': settings.get('compression_lookahead_ms', 0.0)
+        })
+
+    true_peak = settings.get('true_peak')
+    stages.append({
+        'type': 'normalize',
+        'loudness': settings.get('loudness_target'),
+        'true_peak': DEFAULT_TRUE_PEAK_DB if true_peak is None else true_peak,
+        'peak': peak
+    })
+    return validate_chain({'name': '', 'stages': stages})
+
+
+def settings_chain(settings, peak=DEFAULT_PEAK):
+    """The chain given in settings['chain'] (path or spec), else the one the settings describe"""
+    if settings.get('chain'):
+        return resolve_chain(settings['chain'])
+    return chain_from_settings(settings, peak)
+
+
+def _primitive(kind, stage, factor=1.0):
+    return {'kind': kind, 'stage': stage, 'factor': factor}
+
+
+def _expand(stage):
+    """The primitive operation of one validated stage"""
+    stage_type = stage['type']
+    if stage_type == 'noise_reduction':
+        return _primitive('denoise', stage)
+    if stage_type == 'trim_silence':
+        return _primitive('trim', stage)
+    if stage_type in ('eq', 'highpass', 'lowpass'):
+        return _primitive('fir', stage)
+    if stage_type == 'gain':
+        return _primitive('scale', stage, 10 ** (stage['db'] / 20))
+    if stage_type == 'compression':
+        makeup = Compressor.from_amount(stage['amount']).makeup_gain
+        smoothed = stage['attack_ms'] > 0 or stage['release_ms'] > 0
+        return _primitive('compressor' if smoothed else 'curve', stage, makeup)
+    return _primitive('normalize', stage)
+
+
+def _fold_gains(primitives):
+    """Fold every gain into a neighbouring filter, compressor or normalization where possible"""
+    folded = []
+    for primitive in primitives:
+        previous = folded[-1] if folded else None
+        if primitive['kind'] == 'scale' and previous and previous['kind'] in ('scale', 'fir', 'curve', 'compressor'):
+            # Scaling the output of a filter or compressor is part of its response or makeup gain
+            previous['factor'] *= primitive['factor']
+            continue
+        if primitive['kind'] == 'fir' and previous and previous['kind'] == 'scale':
+            primitive['factor'] *= folded.pop()['factor']
+        if primitive['kind'] == 'normalize':
+            # The normalization undoes any gain in front of it
+            while folded and folded[-1]['kind'] == 'scale':
+                folded.pop()
+            if folded and folded[-1]['kind'] in ('fir', 'curve', 'compressor'):
+                folded[-1]['factor'] = 1.0
+        folded.append(primitive)
+    return [primitive for primitive in folded if not (primitive['kind'] == 'scale' and primitive['factor'] == 1.0)]
+
+
+class ChainOp:
+    """One pass of a compiled chain: one or more fused stages"""
+
+    def __init__(self, kind, primitives):
+        """
+        Args:
+            kind (str): 'noise_reduction', 'trim', 'filter', 'pointwise', 'compression' or 'normalize'
+            primitives (list): The fused operations, in order
+        """
+        self.kind = kind
+        self.primitives = list(primitives)
+
+    @property
+    def name(self):
+        """Stage name: the fused stage types, e.g. 'highpass+eq'"""
+        return '+'.join(dict.fromkeys(primitive['stage']['type'] for primitive in self.primitives))
+
+    @property
+    def stage(self):
+        """Spec of the (first) stage of this op"""
+        return self.primitives[0]['stage']
+
+    @property
+    def params(self):
+        """Everything that determines the op's output (for cache keys)"""
+        return [dict(primitive['stage'], factor=primitive['factor']) for primitive in self.primitives]
+
+    def linear_filter(self, sr):
+        """The merged filter of a 'filter' op at a sample rate (cached)"""
+        return _merged_filter(self._filter_key(), sr)
+
+    def spectral_filter(self, sr, n_fft=N_FFT):
+        """The merged filter as per-bin gains on STFT frames, or None if it does not fit them (cached)"""
+        return _spectral_filter(self._filter_key(), sr, n_fft)
+
+    def _filter_key(self):
+        return tuple(
+            (tuple(sorted((k, tuple(map(tuple, v)) if k == 'bands' and v else v)
+                          for k, v in primitive['stage'].items())), primitive['factor'])
+            for primitive in self.primitives
+        )
+
+    def compressor(self):
+        """A fresh Compressor for a 'compression' op or a compressor curve (makeup gain folded in)"""
+        return self._make_compressor(self.primitives[0])
+
+    def pointwise(self):
+        """Function applying every operation of a 'pointwise' op to one block"""
+        steps = []
+        for primitive in self.primitives:
+            if primitive['kind'] == 'scale':
+                steps.append(lambda block, gain=primitive['factor']: block * block.dtype.type(gain))
+            else:
+                # Instantaneous curve: no state, no sample rate
+                steps.append(functools.partial(self._make_compressor(primitive).process, sr=None))
+
+        def apply(block):
+            for step in steps:
+                block = step(block)
+            return block
+        return apply
+
+    @staticmethod
+    def _make_compressor(primitive):
+        stage = primitive['stage']
+        compressor = Compressor.from_amount(
+            stage['amount'],
+            attack_ms=stage['attack_ms'],
+            release_ms=stage['release_ms'],
+            knee=stage['knee'],
+            lookahead_ms=stage['lookahead_ms']
+        )
+        compressor.makeup_gain = primitive['factor']
+        return compressor
+
+
+@functools.lru_cache(maxsize=32)
+def _merged_filter(key, sr):
+    """One FIR filter for a run of linear stages ((stage items, factor) tuples)"""
+    stages = [(dict(items), factor) for items, factor in key]
+    if len(stages) == 1 and stages[0][0]['type'] == 'eq' and stages[0][1] == 1.0:
+        # A lone EQ is the shared preset filter
+        return _eq_filter(stages[0][0], sr)
+
+    bands = []
+    response = np.ones(1)
+    gain = 1.0
+    convolved = False
+    for stage, factor in stages:
+        gain *= factor
+        if stage['type'] == 'eq':
+            eq_filter = _eq_filter(stage, sr)
+            bands.extend(eq_filter.bands)
+            part = eq_filter.impulse_response
+        else:
+            part = _pass_filter_response(stage, sr)
+        if len(part) > 1 or part[0] != 1.0:
+            convolved = len(response) > 1
+            response = signal.fftconvolve(response, part) if convolved else response * part
+    # The parts are truncated already: only a convolution lengthens the response again
+    # (truncating twice would cut a lone part shorter than the filter it stands for)
+    if convolved:
+        response = truncate_response(response)
+    return EqFilter(bands, sr, impulse_response=response * gain)
+
+
+@functools.lru_cache(maxsize=32)
+def _spectral_filter(key, sr, n_fft):
+    response = _merged_filter(key, sr).impulse_response
+    return SpectralFilter(response, n_fft) if fits_frames(response, n_fft) else None
+
+
+def _eq_filter(stage, sr):
+    bands = stage['bands'] if stage['bands'] is not None else preset_bands(stage['preset'])
+    return get_band_filter(bands, sr)
+
+
+def _pass_filter_response(stage, sr):
+    """Impulse response of a Butterworth high- or low-pass stage"""
+    if stage['freq'] >= sr / 2:
+        if stage['type'] == 'lowpass':
+            # Nothing to remove below Nyquist
+            return np.ones(1)
+        raise ChainError(f"highpass at {stage['freq']:g} Hz is above the Nyquist frequency of {sr} Hz audio")
+    sos = signal.butter(stage['order'], stage['freq'] / (sr / 2), btype=stage['type'], output='sos')
+    impulse = np.zeros(response_length(stage['freq'], sr))
+    impulse[0] = 1.0
+    return truncate_response(signal.sosfilt(sos, impulse))
+
+
+class CompiledChain:
+    """A validated chain compiled into fused passes"""
+
+    def __init__(self, name, stages, ops):
+        self.name = name
+        self.stages = stages
+        self.ops = ops
+
+    @property
+    def normalize(self):
+        """The final normalization op, or None"""
+        return self.ops[-1] if self.ops and self.ops[-1].kind == 'normalize' else None
+
+    def normalize_options(self):
+        """Loudness target (None = peak normalization), true-peak ceiling and peak level, or None"""
+        op = self.normalize
+        if op is None:
+            return None
+        return {'loudness_target': op.stage['loudness'], 'true_peak': op.stage['true_peak'], 'peak': op.stage['peak']}
+
+    def ops_of_kind(self, kind):
+        return [op for op in self.ops if op.kind == kind]
+
+    @property
+    def streamable(self):
+        """
+        Whether every op can run block by block
+
+        Trimming and skipping silence need the whole file, and so does noise
+        reduction behind another op: its profile must be measured on that op's
+        output, while streaming scans the unprocessed file.
+        """
+        return not any(
+            op.kind == 'trim'
+            or (op.kind == 'noise_reduction' and (op.stage['skip_silence'] or index > 0))
+            for index, op in enumerate(self.ops)
+        )
+
+    def passes(self, sr):
+        """
+        The ops grouped into passes over the audio at a sample rate
+
+        A filter right after noise reduction joins the gate's STFT frames when
+        it fits them (see spectral.fits_frames), so the pair needs a single
+        analysis/synthesis instead of a gate pass and a convolution pass. Not
+        with skip_silence: the filter must also reach the skipped pauses.
+        """
+        passes = []
+        for op in self.ops:
+            previous = passes[-1] if passes else None
+            if (op.kind == 'filter' and previous and len(previous) == 1 and previous[0].kind == 'noise_reduction'
+                    and not previous[0].stage['skip_silence'] and op.spectral_filter(sr) is not None):
+                previous.append(op)
+            else:
+                passes.append([op])
+        return passes
+
+    def describe(self):
+        """One line per pass, e.g. '2. highpass+eq (filter)'"""
+        return '\n'.join(f"{index}. {op.name} ({op.kind})" for index, op in enumerate(self.ops, 1))
+
+
+def compile_chain(chain):
+    """
+    Compile a chain (path, spec or validated chain) into the fewest passes
+
+    Returns:
+        CompiledChain
+    """
+    chain = resolve_chain(chain)
+    primitives = _fold_gains([_expand(stage) for stage in chain['stages']])
+    ops = []
+    for primitive in primitives:
+        kind = _OP_KINDS[primitive['kind']]
+        if ops and kind in ('filter', 'pointwise') and ops[-1].kind == kind:
+            ops[-1].primitives.append(primitive)
+        else:
+            ops.append(ChainOp(kind, [primitive]))
+    return CompiledChain(chain['name'], chain['stages'], ops)
@@ -0,0 +1,65 @@
+"""
+Chain preset files: finding and parsing them, without the processing stack.
+
+Only the standard library is imported here, so the UI can list the preset
+chains at start-up (see ``warmup``); validation and compilation live in
+``chain``.
+"""
+import json
+import os
+
+# Preset chains shipped with the application
+CHAIN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'assets', 'chains')
+
+CHAIN_EXTENSIONS = ('.json', '.toml')
+
+
+class ChainError(ValueError):
+    """A chain file or spec that cannot be read or is invalid"""
+
+
+def read_chain_file(path):
+    """Parse a .json or .toml chain file (not validated)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in CHAIN_EXTENSIONS:
+        raise ChainError(f"{os.path.basename(path)}: chains are .json or .toml files")
+    try:
+        if extension == '.json':
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    except (OSError, ValueError) as e:
+        raise ChainError(f"{os.path.basename(path)}: {e}") from e
+
+
+def chain_name(spec, path):
+    """Display name of a chain: its 'name', else the file name"""
+    name = spec.get('name') if isinstance(spec, dict) else None
+    return str(name) if name else os.path.splitext(os.path.basename(path))[0]
+
+
+def available_chains(directory=CHAIN_DIR):
+    """Preset chains in a directory as {name: path}, sorted by file name"""
+    if not os.path.isdir(directory):
+        return {}
+    chains = {}
+    for file_name in sorted(os.listdir(directory)):
+        if os.path.splitext(file_name)[1].lower() in CHAIN_EXTENSIONS:
+            path = os.path.join(directory, file_name)
+            try:
+                chains[chain_name(read_chain_file(path), path)] = path
+            except ChainError as e:
+                print(f"Skipping chain {file_name}: {e}")
+    return chains
+
+
+def chain_path(chain):
+    """File of a chain given as a path or as the name of a preset chain (the path itself if neither exists)"""
+    if os.path.isfile(chain):
+        return chain
+    return available_chains().get(chain, chain)
@@ -0,0 +1,206 @@
+import numpy as np
+from src.audio_processing.blocks import WORK_BLOCK_SIZE
+
+
+class Compressor:
+    """
+    Vectorized dynamic range compressor with an envelope follower.
+
+    With attack and release both set to 0 the compressor works sample by
+    sample and reproduces the original hard-knee curve exactly. Otherwise a
+    peak detector runs on short hops, the gain is smoothed with separate
+    attack/release time constants and ramped linearly across each hop.
+
+    The compressor keeps its envelope, gain and lookahead delay between calls
+    to ``process``, so it can be fed one block at a time. Blocks whose length
+    is a multiple of the detector hop give exactly the same output as
+    processing the whole signal at once.
+    """
+
+    # Length of one detector hop in milliseconds
+    HOP_MS = 0.5
+
+    def __init__(self, threshold, ratio, makeup_gain=1.0, attack_ms=0.0,
+                 release_ms=0.0, knee=0.0, lookahead_ms=0.0):
+        """
+        Args:
+            threshold (float): Linear amplitude above which the signal is compressed
+            ratio (float): Compression ratio (e.g. 4.0 for 4:1)
+            makeup_gain (float): Linear gain applied after compression
+            attack_ms (float): Attack time of the envelope follower
+            release_ms (float): Release time of the envelope follower
+            knee (float): Width of the soft knee around the threshold (linear amplitude)
+            lookahead_ms (float): Delay of the audio relative to the detector
+        """
+        self.threshold = threshold
+        self.ratio = ratio
+        self.makeup_gain = makeup_gain
+        self.attack_ms = attack_ms
+        self.release_ms = release_ms
+        self.knee = knee
+        self.lookahead_ms = lookahead_ms
+        self.reset()
+
+    @classmethod
+    def from_amount(cls, amount, **options):
+        """Create a compressor from the 0-1 'compression' amount used in the settings"""
+        # Higher amount = lower threshold, higher ratio and more makeup gain
+        threshold = 0.5 - (amount * 0.4)  # Threshold between 0.1 and 0.5
+        ratio = 1 + (amount * 5)  # Ratio between 1:1 and 6:1
+        makeup_gain = 1.0 + (amount * 0.3)
+        return cls(threshold, ratio, makeup_gain, **options)
+
+    @property
+    def smoothing(self):
+        """Whether the envelope follower is active"""
+        return self.attack_ms > 0 or self.release_ms > 0
+
+    def reset(self):
+        """Clear the detector and delay line state"""
+        self._envelope = 0.0
+        self._gain = 1.0
+        self._delay = None
+
+    def latency(self, sr):
+        """Number of samples the output lags behind the input"""
+        if not self.smoothing:
+            return 0
+        return int(round(self.lookahead_ms * sr / 1000.0))
+
+    def process(self, y, sr):
+        """
+        Compress one block of audio.
+
+        Args:
+            y (np.ndarray): Samples, either 1-D or (channels, samples)
+            sr (int): Sample rate
+
+        Returns:
+            np.ndarray: Compressed block with the same shape as ``y``
+        """
+        if not self.smoothing:
+            return self._process_static(y)
+        return self._process_smoothed(y, sr)
+
+    def compress(self, y, sr):
+        """Compress a whole signal, compensating the lookahead latency"""
+        self.reset()
+        latency = self.latency(sr)
+        if latency == 0:
+            return self.process(y, sr)
+
+        pad = np.zeros(y.shape[:-1] + (latency,), dtype=y.dtype)
+        out = self.process(np.concatenate([y, pad], axis=-1), sr)
+        return out[..., latency:]
+
+    def compress_in_place(self, y, sr, block_size=WORK_BLOCK_SIZE, progress=None):
+        """
+        Like ``compress``, but writes the result back into ``y`` block by block
+
+        Only block-sized temporaries are allocated. The block size is rounded
+        to whole detector hops, so the output is identical to ``compress``.
+        ``progress`` is called with the finished fraction after every block.
+        """
+        self.reset()
+        n = y.shape[-1]
+        latency = self.latency(sr)
+        if self.smoothing:
+            hop = max(1, int(sr * self.HOP_MS / 1000.0))
+            block_size = max(hop, block_size // hop * hop)
+
+        # Output of a block lags its input by the latency; those samples were already read
+        for start in range(0, n, block_size):
+            block = y[..., start:start + block_size]
+            if latency and start + block_size >= n:
+                # Flush the delay line together with the last block, as ``compress`` does
+                block = np.concatenate([block, np.zeros(y.shape[:-1] + (latency,), dtype=y.dtype)], axis=-1)
+            self._write_delayed(y, self.process(block, sr), start - latency)
+            if progress:
+                progress(min(start + block_size, n) / n)
+        return y
+
+    @staticmethod
+    def _write_delayed(y, out, position):
+        """Write ``out`` to ``y`` starting at ``position``, clipped to the signal"""
+        skip = max(0, -position)
+        stop = min(y.shape[-1], position + out.shape[-1])
+        if stop > position + skip:
+            y[..., position + skip:stop] = out[..., skip:stop - position]
+
+    def static_curve(self, level):
+        """Output level of the compressor for a given (absolute) input level"""
+        threshold = self.threshold
+        out = np.where(level > threshold, threshold + (level - threshold) / self.ratio, level)
+
+        if self.knee > 0:
+            half = self.knee / 2.0
+            in_knee = np.abs(level - threshold) < half
+            knee_out = level + (1.0 / self.ratio - 1.0) * (level - threshold + half) ** 2 / (2.0 * self.knee)
+            out = np.where(in_knee, knee_out, out)
+
+        return out
+
+    def _process_static(self, y):
+        """Instantaneous per-sample compression (the original hard-knee behaviour)"""
+        level = np.abs(y)
+        compressed = np.where(y < 0, -self.static_curve(level), self.static_curve(level))
+        compressed = compressed.astype(y.dtype, copy=False)
+        return compressed * self.makeup_gain
+
+    def _process_smoothed(self, y, sr):
+        """Compression driven by a hop-wise attack/release envelope"""
+        n = y.shape[-1]
+        if n == 0:
+            return y.copy()
+
+        # Delay the audio so the detector can see transients before they arrive
+        latency = self.latency(sr)
+        if latency > 0:
+            if self._delay is None:
+                self._delay = np.zeros(y.shape[:-1] + (latency,), dtype=y.dtype)
+            delayed = np.concatenate([self._delay, y], axis=-1)
+            self._delay = delayed[..., n:].copy()
+            audio = delayed[..., :n]
+        else:
+            audio = y
+
+        # Linked detector: loudest channel drives the gain for all channels
+        level = np.abs(y) if y.ndim == 1 else np.max(np.abs(y), axis=0)
+
+        # Peak level per hop
+        hop = max(1, int(sr * self.HOP_MS / 1000.0))
+        n_hops = -(-n // hop)
+        padded = np.zeros(n_hops * hop, dtype=level.dtype)
+        padded[:n] = level
+        peaks = padded.reshape(n_hops, hop).max(axis=1)
+
+        # Envelope follower over the hops
+        attack = self._coefficient(self.attack_ms, sr, hop)
+        release = self._coefficient(self.release_ms, sr, hop)
+        envelope = np.empty(n_hops)
+        env = self._envelope
+        for i, peak in enumerate(peaks.tolist()):
+            coeff = attack if peak > env else release
+            env = coeff * env + (1.0 - coeff) * peak
+            envelope[i] = env
+        self._envelope = env
+
+        # Gain per hop from the static curve
+        safe = np.maximum(envelope, 1e-12)
+        hop_gain = np.where(envelope > 0, self.static_curve(safe) / safe, 1.0)
+
+        # Ramp linearly from the previous hop's gain to avoid zipper noise
+        previous = np.concatenate([[self._gain], hop_gain[:-1]])
+        ramp = np.arange(1, hop + 1) / hop
+        gain = (previous[:, None] + (hop_gain - previous)[:, None] * ramp).reshape(-1)[:n]
+        self._gain = float(hop_gain[-1])
+
+        gain = (gain * self.makeup_gain).astype(y.dtype, copy=False)
+        return audio * gain
+
+    @staticmethod
+    def _coefficient(time_ms, sr, hop):
+        """One-pole smoothing coefficient for a time constant evaluated once per hop"""
+        if time_ms <= 0:
+            return 0.0
+        return float(np.exp(-hop / (sr * time_ms / 1000.0)))
@@ -0,0 +1,203 @@
+"""
+Output encoders.
+
+``StreamEncoder`` pipes raw float32 samples straight into an ffmpeg
+subprocess, so the processed audio never has to be written to disk as a WAV
+and read back before encoding. Blocks are handed to a background thread that
+feeds ffmpeg's stdin, which lets encoding overlap with the processing that
+produces the next block. ``LosslessWriter`` writes WAV/FLAC with soundfile
+and is used for lossless codecs or when no ffmpeg is installed.
+"""
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import numpy as np
+import soundfile as sf
+
+# codec name -> (ffmpeg encoder, file extension)
+CODECS = {
+    'mp3': ('libmp3lame', '.mp3'),
+    'aac': ('aac', '.m4a'),
+    'opus': ('libopus', '.opus'),
+    'ogg': ('libvorbis', '.ogg'),
+}
+
+# codec name -> (soundfile format, file extension)
+LOSSLESS_CODECS = {
+    'wav': ('WAV', '.wav'),
+    'flac': ('FLAC', '.flac'),
+}
+
+DEFAULT_CODEC = 'mp3'
+DEFAULT_BITRATE = '192k'
+
+# Blocks waiting for the encoder before ``write`` blocks the producer
+QUEUE_BLOCKS = 8
+
+
+def find_ffmpeg():
+    """Path of the ffmpeg executable, or None if it is not installed"""
+    return shutil.which('ffmpeg')
+
+
+class LosslessWriter:
+    """Writes blocks to a WAV or FLAC file with soundfile"""
+
+    def __init__(self, output_file, sr, channels=1, file_format='WAV'):
+        self.output_file = output_file
+        self._file = sf.SoundFile(output_file, 'w', samplerate=sr, channels=channels, format=file_format)
+
+    def write(self, block):
+        """Write a block of shape (samples,) or (samples, channels)"""
+        self._file.write(block)
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        """Close and delete the partial output"""
+        self._file.close()
+        if os.path.exists(self.output_file):
+            os.remove(self.output_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class StreamEncoder:
+    """Encodes float32 blocks by streaming them into ffmpeg's stdin"""
+
+    def __init__(self, output_file, sr, channels=1, codec=DEFAULT_CODEC, bitrate=DEFAULT_BITRATE, ffmpeg=None):
+        """
+        Args:
+            output_file (str): Path of the encoded file
+            sr (int): Sample rate of the blocks
+            channels (int): Number of channels of the blocks
+            codec (str): Key of CODECS
+            bitrate (str): Target bitrate passed to ffmpeg (e.g. '192k')
+            ffmpeg (str): Path of the ffmpeg executable
+        """
+        encoder, _ = CODECS[codec]
+        self.output_file = output_file
+        self.channels = channels
+        self._log = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            [
+                ffmpeg or find_ffmpeg(), '-hide_banner', '-loglevel', 'error', '-y',
+                '-f', 'f32le', '-ar', str(sr), '-ac', str(channels), '-i', 'pipe:0',
+                '-vn', '-c:a', encoder, '-b:a', bitrate,
+                output_file
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=self._log
+        )
+        self._queue = queue.Queue(maxsize=QUEUE_BLOCKS)
+        self._error = None
+        self._thread = threading.Thread(target=self._feed, daemon=True)
+        self._thread.start()
+
+    def _feed(self):
+        """Background thread: move queued blocks into ffmpeg's stdin"""
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._process.stdin.write(data)
+            except (BrokenPipeError, OSError) as e:
+                self._error = e
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def write(self, block):
+        """Queue a block of shape (samples,) or (samples, channels) for encoding"""
+        data = np.ascontiguousarray(block, dtype='<f4').tobytes()
+        self._queue.put(data)
+
+    def close(self):
+        """Wait for ffmpeg to finish; raises RuntimeError if encoding failed"""
+        self._queue.put(None)
+        self._thread.join()
+        returncode = self._process.wait()
+        self._log.seek(0)
+        message = self._log.read().decode('utf-8', 'replace').strip()
+        self._log.close()
+        if returncode != 0 or self._error is not None:
+            if os.path.exists(self.output_file):
+                os.remove(self.output_file)
+            raise RuntimeError(f"ffmpeg failed to encode {os.path.basename(self.output_file)}: {message or self._error}")
+
+    def abort(self):
+        """Stop ffmpeg and delete the partial output"""
+        self._process.kill()
+        self._queue.put(None)
+        self._thread.join()
+        self._process.wait()
+        self._log.close()
+        if os.path.exists(self.output_file):
+            os.remove(self.output_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def output_extension(codec):
+    """Extension of the file open_writer writes for a codec (.wav for lossy codecs without ffmpeg)"""
+    if codec in LOSSLESS_CODECS:
+        return LOSSLESS_CODECS[codec][1]
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}")
+    return CODECS[codec][1] if find_ffmpeg() is not None else '.wav'
+
+
+def open_writer(output_base, sr, channels=1, codec=DEFAULT_CODEC, bitrate=DEFAULT_BITRATE):
+    """
+    Open the best available writer for a codec
+
+    Lossy codecs are encoded through ffmpeg; if ffmpeg is not installed the
+    audio is written losslessly as WAV instead.
+
+    Args:
+        output_base (str): Output path without extension
+        sr (int): Sample rate
+        channels (int): Number of channels
+        codec (str): 'mp3', 'aac', 'opus', 'ogg', 'flac' or 'wav'
+        bitrate (str): Bitrate for lossy codecs
+
+    Returns:
+        LosslessWriter or StreamEncoder: Writer with ``write``/``close``/``abort`` and ``output_file``
+    """
+    if codec in LOSSLESS_CODECS:
+        file_format, extension = LOSSLESS_CODECS[codec]
+        return LosslessWriter(output_base + extension, sr, channels, file_format)
+
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec: {codec}")
+
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        print(f"FFmpeg not found, keeping WAV format instead of {codec}")
+        return LosslessWriter(output_base + '.wav', sr, channels, 'WAV')
+
+    _, extension = CODECS[codec]
+    return StreamEncoder(output_base + extension, sr, channels, codec, bitrate, ffmpeg)
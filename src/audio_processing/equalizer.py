@@ -0,0 +1,227 @@
+"""
+Fused multi-band EQ.
+
+The original EQ added ``(gain - 1) * bandpass(y)`` to the signal for every
+band, which meant one filter design and one full-length ``lfilter`` pass per
+band. Because all bands are applied to the same input, the whole preset is a
+single linear filter::
+
+    H(z) = 1 + sum((gain_k - 1) * B_k(z) / A_k(z))
+
+Its impulse response is computed once per (preset, sample rate), truncated
+where the remaining tail energy drops below ``TAIL_ENERGY`` of the total and
+applied with one FFT overlap-add convolution, so the cost no longer grows
+with the number of bands.
+
+Tolerance: compared with the band-by-band ``lfilter`` implementation the
+fused filter deviates by less than 1e-4 of the input peak level (below
+-80 dBFS) for every preset in ``EQ_PRESETS`` at 44.1, 48 and 96 kHz.
+Bands whose upper edge lies at or above Nyquist are skipped instead of
+raising an error during filter design.
+"""
+import functools
+import numpy as np
+from scipy import signal
+from src.audio_processing.blocks import WORK_BLOCK_SIZE
+
+# Block size of ``EqFilter.apply`` when it reports progress
+PROGRESS_BLOCK_SIZE = 1 << 20
+
+# Relative tail energy at which the fused impulse response is truncated
+TAIL_ENERGY = 1e-10
+
+# Bands are (center frequency in Hz, linear gain)
+EQ_PRESETS = {
+    # Slight boost to mid frequencies for clarity
+    'Doğal': [
+        (80, 0.8),    # Reduce low rumble
+        (150, 1.1),   # Slight boost to low mids
+        (3000, 1.2),  # Boost speech clarity
+        (10000, 0.9)  # Slight reduction in high frequencies
+    ],
+    # Boost low-mids for warmth
+    'Sıcak': [
+        (100, 1.2),   # Boost low end
+        (250, 1.3),   # Boost low mids
+        (2500, 0.9),  # Reduce high mids
+        (8000, 0.8)   # Reduce highs
+    ],
+    # Boost high frequencies for brightness
+    'Parlak': [
+        (100, 0.9),   # Reduce low end
+        (1000, 1.1),  # Boost mids
+        (3000, 1.3),  # Boost high mids
+        (8000, 1.4)   # Boost highs
+    ],
+    # Boost low frequencies for depth
+    'Derin': [
+        (80, 1.4),    # Boost sub bass
+        (150, 1.3),   # Boost low end
+        (400, 1.1),   # Boost low mids
+        (3000, 0.9),  # Reduce high mids
+        (8000, 0.8)   # Reduce highs
+    ],
+    # Professional studio sound with clarity and presence
+    'Stüdyo': [
+        (60, 0.7),    # Reduce sub-bass rumble
+        (120, 1.1),   # Slight boost to bass for warmth
+        (250, 0.9),   # Cut muddiness
+        (500, 0.95),  # Slight cut to prevent boxiness
+        (1000, 1.05), # Slight boost for presence
+        (2000, 1.15), # Boost for vocal clarity
+        (3500, 1.25), # Boost for presence and articulation
+        (5000, 1.2),  # Boost for presence
+        (8000, 1.1),  # Slight boost for air
+        (12000, 1.15) # Boost for sparkle and air
+    ],
+    # Balanced EQ, also used for 'Özel' and unknown presets
+    'Özel': [
+        (100, 1.1),   # Slight boost to low end
+        (1000, 1.1),  # Slight boost to mids
+        (5000, 1.1)   # Slight boost to highs
+    ],
+}
+
+DEFAULT_PRESET = 'Özel'
+
+
+def preset_bands(preset):
+    """Return the band list for a preset name, falling back to the balanced EQ"""
+    return EQ_PRESETS.get(preset, EQ_PRESETS[DEFAULT_PRESET])
+
+
+def band_sos(freq, sr):
+    """Second-order sections of the bandpass used for one EQ band"""
+    return signal.butter(2, [(freq * 0.7) / (sr / 2), (freq * 1.3) / (sr / 2)], btype='band', output='sos')
+
+
+def response_length(lowest_freq, sr):
+    """Impulse response length long enough for a filter down to ``lowest_freq`` to ring out"""
+    return int(sr * max(0.25, 40.0 / lowest_freq))
+
+
+def truncate_response(response):
+    """Cut an impulse response once the remaining tail energy is negligible"""
+    tail = np.cumsum(response[::-1] ** 2)[::-1]
+    cut = np.flatnonzero(tail < TAIL_ENERGY * tail[0])
+    if len(cut):
+        response = response[:max(1, cut[0])]
+    return response
+
+
+class EqFilter:
+    """A whole EQ preset fused into a single FIR filter"""
+
+    def __init__(self, bands, sr, impulse_response=None):
+        """
+        Args:
+            bands (list): (center frequency in Hz, linear gain) of every band
+            sr (int): Sample rate
+            impulse_response (np.ndarray): Use this (e.g. merged) response instead of designing one from the bands
+        """
+        self.bands = list(bands)
+        self.sr = sr
+        if impulse_response is None:
+            impulse_response = self._design(self.bands, sr)
+        self.impulse_response = impulse_response
+
+    @staticmethod
+    def _design(bands, sr):
+        """Compute the truncated impulse response of the summed band filters"""
+        active = [(freq, gain) for freq, gain in bands if gain != 1 and freq * 1.3 < sr / 2]
+        if not active:
+            return np.ones(1)
+
+        # Long enough for the narrowest (lowest) band to ring out
+        lowest = min(freq for freq, _ in active)
+        impulse = np.zeros(response_length(lowest, sr))
+        impulse[0] = 1.0
+
+        response = impulse.copy()
+        for freq, gain in active:
+            response += signal.sosfilt(band_sos(freq, sr), impulse) * (gain - 1)
+        return truncate_response(response)
+
+    @property
+    def is_identity(self):
+        """True when the preset leaves the signal untouched"""
+        return len(self.impulse_response) == 1 and self.impulse_response[0] == 1.0
+
+    def apply(self, y, progress=None, block_size=PROGRESS_BLOCK_SIZE):
+        """
+        Filter a whole signal (samples along the last axis)
+
+        Without ``progress`` the signal is filtered in one pass. With it, the
+        signal is filtered block by block (same result up to float rounding)
+        and ``progress`` is called with the finished fraction after each block.
+        """
+        if self.is_identity:
+            return np.copy(y)
+        if progress is None:
+            ir = self.impulse_response.reshape((1,) * (y.ndim - 1) + (-1,))
+            return signal.oaconvolve(y, ir, mode='full', axes=-1)[..., :y.shape[-1]]
+        return self.apply_in_place(np.array(y, dtype=np.float64), block_size, progress)
+
+    def apply_in_place(self, y, block_size=WORK_BLOCK_SIZE, progress=None):
+        """
+        Filter ``y`` in place, block by block
+
+        Only block-sized temporaries are allocated; the result matches
+        ``apply`` up to float rounding.
+        """
+        if self.is_identity:
+            return y
+        n = y.shape[-1]
+        stream = self.stream()
+        for start in range(0, n, block_size):
+            block = y[..., start:start + block_size]
+            block[...] = stream.process(block)
+            if progress:
+                progress(min(start + block_size, n) / n)
+        return y
+
+    def stream(self):
+        """Create a block-wise filter state for streaming use"""
+        return EqStream(self)
+
+
+class EqStream:
+    """Overlap-add state for running an ``EqFilter`` over consecutive blocks"""
+
+    def __init__(self, eq_filter):
+        self.eq_filter = eq_filter
+        self.reset()
+
+    def reset(self):
+        """Clear the convolution tail carried between blocks"""
+        self._tail = None
+
+    def process(self, y):
+        """Filter one block, carrying the convolution tail to the next block"""
+        if self.eq_filter.is_identity or y.shape[-1] == 0:
+            return np.copy(y)
+        n = y.shape[-1]
+        ir = self.eq_filter.impulse_response.reshape((1,) * (y.ndim - 1) + (-1,))
+        full = signal.oaconvolve(y, ir, mode='full', axes=-1)
+
+        # The tail is one sample shorter than the filter, so it always fits
+        if self._tail is not None:
+            full[..., :self._tail.shape[-1]] += self._tail
+
+        self._tail = full[..., n:].copy()
+        return full[..., :n]
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_filter(bands, sr):
+    return EqFilter(bands, sr)
+
+
+def get_eq_filter(preset, sr):
+    """Return the cached fused filter for a preset at a given sample rate"""
+    return _cached_filter(tuple(preset_bands(preset)), sr)
+
+
+def get_band_filter(bands, sr):
+    """Return the cached fused filter for an explicit band list"""
+    return _cached_filter(tuple(tuple(band) for band in bands), sr)
@@ -0,0 +1,268 @@
+"""
+Queue of processing jobs run by a bounded pool of worker threads.
+
+Jobs are picked by priority (higher first) and then by their position in
+the queue, which can be changed while they wait. A running job is cancelled
+by setting its cancel flag; the processing stages check it between blocks
+(see ``ProgressTracker``), so cancelling takes effect within a block instead
+of after the whole file.
+
+The queue knows nothing about the UI: front ends read ``snapshot()`` or pass
+an ``on_update`` callback (called from worker threads, so a UI should hand
+the updates to its own thread, e.g. through an ``EventBus``).
+"""
+import itertools
+import os
+import threading
+import time
+from src.utils.instrumentation import Instrumentation, JobCancelled
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# Priorities offered by front ends
+PRIORITY_LOW = -1
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+
+
+def default_workers():
+    """Worker count for the UI: half the cores (each job already uses several threads), 1-4"""
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+class Job:
+    """One input file with its settings, status and result"""
+
+    def __init__(self, job_id, input_file, settings, priority=PRIORITY_NORMAL, position=0):
+        self.id = job_id
+        self.input_file = input_file
+        self.settings = dict(settings)
+        self.priority = priority
+        self.position = position
+        self.status = QUEUED
+        self.progress = 0
+        self.result = None
+        self.output_file = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def name(self):
+        return os.path.basename(self.input_file)
+
+    @property
+    def seconds(self):
+        """Processing time so far (or in total once finished)"""
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def wait_seconds(self):
+        """Time spent in the queue before a worker picked the job up (so far, if still waiting)"""
+        return (self.started or self.finished or time.time()) - self.submitted
+
+    def sort_key(self):
+        return (-self.priority, self.position)
+
+    def as_dict(self):
+        """Plain copy of the job's state (safe to hand to another thread)"""
+        return {
+            'id': self.id,
+            'input_file': self.input_file,
+            'name': self.name,
+            'priority': self.priority,
+            'status': self.status,
+            'progress': self.progress,
+            'output_file': self.output_file,
+            'renditions': [rendition.as_dict() for rendition in self.result.renditions] if self.result else [],
+            'error': self.error,
+            'seconds': self.seconds,
+            'wait_seconds': self.wait_seconds,
+        }
+
+
+class JobQueue:
+    """Priority queue of jobs processed by ``workers`` threads sharing one processor"""
+
+    def __init__(self, get_processor, workers=None, on_update=None, sinks=None):
+        """
+        Args:
+            get_processor (callable): Returns the AudioProcessor to use (e.g. ProcessorWarmup.get_processor)
+            workers (int): Number of jobs processed at the same time
+            on_update (callable): Called with a Job whenever its status or progress changes
+                (from the thread that changed it, usually a worker)
+            sinks (list): Instrumentation sinks that receive the stage events of every job
+        """
+        self.get_processor = get_processor
+        self.workers = workers or default_workers()
+        self.on_update = on_update
+        self.sinks = list(sinks or [])
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._positions = itertools.count()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._stopped = False
+
+    def submit(self, input_file, settings, priority=PRIORITY_NORMAL):
+        """Add a job to the end of the queue (within its priority) and return it"""
+        with self._condition:
+            job = Job(next(self._ids), input_file, settings, priority, next(self._positions))
+            self._jobs[job.id] = job
+            self._start_workers()
+            self._condition.notify()
+        self._notify(job)
+        return job
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        """All jobs: running ones first, then the waiting ones in the order they will run, then finished ones"""
+        with self._condition:
+            jobs = list(self._jobs.values())
+        running = [job for job in jobs if job.status == RUNNING]
+        queued = sorted((job for job in jobs if job.status == QUEUED), key=Job.sort_key)
+        # A worker sets the status just before the finishing time
+        finished = sorted((job for job in jobs if job.status in FINISHED_STATES),
+                          key=lambda job: job.finished or time.time())
+        return running + queued + finished
+
+    def snapshot(self):
+        """State of all jobs as plain dicts, in the order of ``jobs()``"""
+        with self._condition:
+            return [job.as_dict() for job in self.jobs()]
+
+    def set_priority(self, job_id, priority):
+        """Change the priority of a waiting job"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            job.priority = priority
+        self._notify(job)
+        return True
+
+    def move(self, job_id, offset):
+        """
+        Move a waiting job ``offset`` places up (negative) or down (positive)
+
+        A job moved past a job of another priority takes over that priority,
+        so the queue order always matches what the user sees.
+        """
+        with self._condition:
+            queued = sorted((job for job in self._jobs.values() if job.status == QUEUED), key=Job.sort_key)
+            job = self._jobs.get(job_id)
+            if job not in queued:
+                return False
+            index = queued.index(job)
+            target = max(0, min(len(queued) - 1, index + offset))
+            if target == index:
+                return False
+            queued.insert(target, queued.pop(index))
+            job.priority = queued[target + 1].priority if target < index else queued[target - 1].priority
+            for position, other in enumerate(queued):
+                other.position = position
+            self._positions = itertools.count(len(queued))
+        self._notify(job)
+        return True
+
+    def cancel(self, job_id):
+        """Cancel a waiting job, or ask a running one to stop at its next safe point"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished = time.time()
+        self._notify(job)
+        return True
+
+    def remove(self, job_id):
+        """Forget a finished job"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in FINISHED_STATES:
+                return False
+            del self._jobs[job_id]
+        return True
+
+    def shutdown(self, cancel_running=True):
+        """Stop the workers (cancelling the running jobs) and drop the waiting ones"""
+        with self._condition:
+            self._stopped = True
+            for job in self._jobs.values():
+                if job.status == QUEUED or (cancel_running and job.status == RUNNING):
+                    job.cancel_event.set()
+            self._condition.notify_all()
+
+    def _start_workers(self):
+        # Called with the condition held; threads are created on first use
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._worker, daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self):
+        """Block until a job is waiting, mark it running and return it (None on shutdown)"""
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None
+                queued = [job for job in self._jobs.values() if job.status == QUEUED]
+                if queued:
+                    job = min(queued, key=Job.sort_key)
+                    job.status = RUNNING
+                    job.started = time.time()
+                    return job
+                self._condition.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            self._notify(job)
+            self._run(job)
+            self._notify(job)
+
+    def _run(self, job):
+        def progress(value):
+            job.progress = value
+            self._notify(job)
+
+        try:
+            processor = self.get_processor()
+            job.result = processor.process_audio(
+                job.input_file, job.settings,
+                progress_callback=progress,
+                instrumentation=Instrumentation(self.sinks, job=job.name),
+                cancel_event=job.cancel_event
+            )
+            job.output_file = job.result.output_file
+            job.status = DONE
+            job.progress = 100
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job)
@@ -0,0 +1,241 @@
+"""
+Loudness normalization: ITU-R BS.1770 integrated loudness and a true-peak limiter.
+
+``LoudnessMeter`` K-weights the audio (two biquads whose state carries
+across blocks) and keeps only the mean square of every 100 ms step per
+channel, so the integrated loudness of a whole episode is measured in one
+streaming pass with a few kilobytes of state. The 400 ms gating blocks
+(75 % overlap) and the absolute (-70 LUFS) and relative (-10 LU) gates are
+evaluated from those steps at the end.
+
+``TruePeakLimiter`` estimates the true peak of every sample from a 4x
+oversampled copy and turns the gain reduction each sample needs into a
+smooth gain curve: a sliding minimum followed by a moving average of the
+same width, which never exceeds the required reduction at any sample. Both
+filters are local, so processing blocks with ``LIMITER_CONTEXT`` samples of
+neighbouring audio (``process_blocks``) gives the same result as
+processing the whole signal.
+"""
+import functools
+import numpy as np
+from scipy.ndimage import minimum_filter1d, uniform_filter1d
+from scipy.signal import resample_poly, sosfilt
+from src.audio_processing.blocks import WORK_BLOCK_SIZE, split_blocks, with_context
+
+# Loudness target used by the presets (podcast platforms ask for -16 LUFS)
+DEFAULT_TARGET_LUFS = -16.0
+
+# Ceiling of the true-peak limiter
+DEFAULT_TRUE_PEAK_DB = -1.0
+
+# BS.1770 gating
+GATE_BLOCK_SECONDS = 0.4
+GATE_STEP_SECONDS = 0.1
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# Oversampling factor of the true-peak estimate
+OVERSAMPLE = 4
+
+# Half width of the limiter's gain smoothing (attack and release)
+LIMITER_WINDOW_MS = 5.0
+
+# Neighbouring samples the limiter needs on each side of a block (sliding
+# minimum + moving average of the gain, plus the resampling filter)
+LIMITER_CONTEXT_MS = 2 * LIMITER_WINDOW_MS + 1.0
+
+
+@functools.lru_cache(maxsize=16)
+def k_weighting_sos(sr):
+    """BS.1770 K-weighting (high shelf + RLB high-pass) as second-order sections for any sample rate"""
+    # Bilinear-transform parameters that reproduce the standard's 48 kHz coefficients
+    shelf_gain_db, shelf_q, shelf_hz = 3.999843853973347, 0.7071752369554196, 1681.974450955533
+    highpass_q, highpass_hz = 0.5003270373238773, 38.13547087602444
+
+    k = np.tan(np.pi * shelf_hz / sr)
+    vh = 10 ** (shelf_gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / shelf_q + k * k
+    shelf = [
+        (vh + vb * k / shelf_q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / shelf_q + k * k) / a0,
+        1.0,
+        2 * (k * k - 1) / a0,
+        (1 - k / shelf_q + k * k) / a0,
+    ]
+
+    # The RLB high-pass keeps b = [1, -2, 1] unnormalized, as in the standard
+    k = np.tan(np.pi * highpass_hz / sr)
+    a0 = 1 + k / highpass_q + k * k
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / highpass_q + k * k) / a0]
+    sections = [shelf, highpass]
+    return np.array(sections)
+
+
+class LoudnessMeter:
+    """Integrated loudness (LUFS) of audio fed block by block"""
+
+    def __init__(self, sr, channels=1):
+        self.sr = sr
+        self.channels = channels
+        self.sos = k_weighting_sos(sr)
+        self.step = max(1, int(round(GATE_STEP_SECONDS * sr)))
+        self.reset()
+
+    def reset(self):
+        self._zi = np.zeros((len(self.sos), self.channels, 2))
+        self._partial = np.zeros(self.channels)
+        self._partial_count = 0
+        self._steps = []
+        self.samples = 0
+
+    def process(self, block):
+        """Add a block of (samples,) or (channels, samples) audio"""
+        x = np.asarray(block, dtype=np.float64).reshape(self.channels, -1)
+        n = x.shape[-1]
+        if n == 0:
+            return
+        weighted, self._zi = sosfilt(self.sos, x, axis=-1, zi=self._zi)
+        squares = weighted * weighted
+        self.samples += n
+
+        # Complete the step started by the previous block
+        start = min(n, self.step - self._partial_count)
+        self._partial += squares[:, :start].sum(axis=-1)
+        self._partial_count += start
+        if self._partial_count < self.step:
+            return
+        self._steps.append(self._partial / self.step)
+
+        # Whole steps of this block, and the start of the next one
+        whole = (n - start) // self.step * self.step
+        if whole:
+            steps = squares[:, start:start + whole].reshape(self.channels, -1, self.step).mean(axis=-1)
+            self._steps.extend(steps.T)
+        rest = squares[:, start + whole:]
+        self._partial = rest.sum(axis=-1)
+        self._partial_count = rest.shape[-1]
+
+    def integrated(self):
+        """Gated integrated loudness in LUFS (-inf for silence)"""
+        steps_per_block = int(round(GATE_BLOCK_SECONDS / GATE_STEP_SECONDS))
+        steps = np.array(self._steps).reshape(-1, self.channels)
+        if len(steps) < steps_per_block:
+            # Shorter than one gating block: measure everything as one block
+            total = self._partial + steps.sum(axis=0) * self.step
+            count = len(steps) * self.step + self._partial_count
+            if count == 0:
+                return -np.inf
+            powers = np.array([np.sum(total / count)])
+        else:
+            # Mean square of every 400 ms block (steps j .. j+3), summed over channels
+            cumulative = np.concatenate([np.zeros((1, self.channels)), np.cumsum(steps, axis=0)])
+            blocks = (cumulative[steps_per_block:] - cumulative[:-steps_per_block]) / steps_per_block
+            powers = blocks.sum(axis=-1)
+
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10 * np.log10(powers)
+        gated = powers[loudness > ABSOLUTE_GATE_LUFS]
+        if len(gated) == 0:
+            return -np.inf
+        relative_gate = -0.691 + 10 * np.log10(np.mean(gated)) + RELATIVE_GATE_LU
+        gated = powers[(loudness > ABSOLUTE_GATE_LUFS) & (loudness > relative_gate)]
+        return float(-0.691 + 10 * np.log10(np.mean(gated)))
+
+
+def integrated_loudness(y, sr, block_size=WORK_BLOCK_SIZE):
+    """Integrated loudness in LUFS of a whole (samples,) or (channels, samples) signal"""
+    meter = LoudnessMeter(sr, 1 if y.ndim == 1 else y.shape[0])
+    for block in split_blocks(y, block_size):
+        meter.process(block)
+    return meter.integrated()
+
+
+def true_peak(y):
+    """True peak (linear) of a signal, estimated with 4x oversampling"""
+    if y.shape[-1] == 0:
+        return 0.0
+    return float(np.max(_sample_true_peaks(y)))
+
+
+def _sample_true_peaks(segment):
+    """Oversampled peak around every sample, maximum over the channels"""
+    upsampled = resample_poly(np.asarray(segment, dtype=np.float64), OVERSAMPLE, 1, axis=-1)
+    peaks = np.abs(upsampled).reshape(segment.shape[:-1] + (-1, OVERSAMPLE)).max(axis=-1)
+    return peaks if peaks.ndim == 1 else peaks.max(axis=0)
+
+
+class TruePeakLimiter:
+    """Look-ahead limiter that keeps the oversampled peak below a ceiling"""
+
+    def __init__(self, sr, ceiling_db=DEFAULT_TRUE_PEAK_DB, window_ms=LIMITER_WINDOW_MS):
+        self.sr = sr
+        self.ceiling = 10 ** (ceiling_db / 20)
+        self.window = max(1, int(window_ms * sr / 1000))
+        self.context = int(LIMITER_CONTEXT_MS * sr / 1000)
+
+    def gain(self, segment):
+        """Gain of every sample of a segment (1 where no limiting is needed)"""
+        peaks = _sample_true_peaks(segment)
+        needed = np.minimum(1.0, self.ceiling / np.maximum(peaks, 1e-12))
+        if needed.min() >= 1.0:
+            return None
+        # Every sample within the averaging window has a minimum that already covers
+        # this sample, so the smoothed gain never exceeds the reduction a sample needs
+        size = 2 * self.window + 1
+        smoothed = uniform_filter1d(minimum_filter1d(needed, size, mode='nearest'), size, mode='nearest')
+        return np.minimum(smoothed, needed)
+
+    def process(self, segment):
+        """Limit one segment (the edges of the gain curve need ``context`` samples of neighbours)"""
+        gain = self.gain(segment)
+        if gain is None:
+            return segment
+        return (segment * gain).astype(segment.dtype, copy=False)
+
+    def process_blocks(self, blocks):
+        """Limit a stream of blocks (one block of latency, see ``with_context``)"""
+        return with_context(blocks, self.process, self.context)
+
+    def apply(self, y, block_size=WORK_BLOCK_SIZE, progress=None, out=None):
+        """
+        Limit a whole signal block by block
+
+        Args:
+            progress (callable): Called with the finished fraction (0-1) after every block
+            out (np.ndarray): Array the result is written to (may be ``y`` itself)
+        """
+        n = y.shape[-1]
+        if out is None:
+            out = np.empty_like(y)
+        done = 0
+        for block in self.process_blocks(split_blocks(y, block_size)):
+            out[..., done:done + block.shape[-1]] = block
+            done += block.shape[-1]
+            if progress:
+                progress(done / n)
+        return out
+
+
+def loudness_gain(lufs, target=DEFAULT_TARGET_LUFS):
+    """Linear gain that brings a measured loudness to the target (1 for silence)"""
+    if not np.isfinite(lufs):
+        return 1.0
+    return 10 ** ((target - lufs) / 20)
+
+
+def normalize_loudness(y, sr, target=DEFAULT_TARGET_LUFS, ceiling_db=DEFAULT_TRUE_PEAK_DB,
+                       in_place=False, progress=None):
+    """
+    Scale a whole signal to the target loudness and limit its true peak
+
+    Returns:
+        np.ndarray: Normalized signal (``y`` itself if in_place)
+    """
+    gain = loudness_gain(integrated_loudness(y, sr), target)
+    if in_place:
+        np.multiply(y, y.dtype.type(gain), out=y)
+    else:
+        y = y * gain
+    return TruePeakLimiter(sr, ceiling_db).apply(y, progress=progress, out=y)
@@ -0,0 +1,332 @@
+"""
+Reusable noise profiles and a single-pass stationary spectral gate.
+
+A ``NoiseProfile`` holds the per-frequency mean and standard deviation (in
+dB) of the noise spectrum. It is estimated once, either from the quietest
+region of a recording or from a room-tone clip, and can be saved to a
+``.npz`` file and reused for every episode recorded in the same studio.
+
+``SpectralGate`` applies a profile with the same algorithm as noisereduce's
+stationary mode (threshold at mean + 1.5 std, smoothed mask, partial
+attenuation), but without re-estimating the noise statistics per call.
+``MultichannelGate`` runs one gate per channel in parallel threads.
+``SpectralChain`` lets further frequency-domain stages (see spectral.py)
+apply their gains to the gate's STFT frames before the single resynthesis.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from scipy.signal import fftconvolve
+from src.audio_processing.blocks import split_blocks, with_context
+from src.audio_processing.spectral import istft_frames, stft_frames
+
+# STFT size of the gate (hop is a quarter of it)
+N_FFT = 1024
+
+# Noise threshold in standard deviations above the mean noise level
+N_STD_THRESH = 1.5
+
+# Mask smoothing across frequency and time
+FREQ_MASK_SMOOTH_HZ = 500
+TIME_MASK_SMOOTH_MS = 50
+
+# Length of the quiet region used when no profile or clip is given
+QUIET_REGION_SECONDS = 1.0
+
+# Frames below this RMS are treated as digital silence, not as noise
+SILENCE_RMS = 1e-5
+
+# Block and context sizes used when gating a whole signal
+BLOCK_SIZE = 600000
+CONTEXT_SIZE = 30000
+
+
+def amp_to_db(x, top_db=80.0):
+    """Magnitude in dB, floored at ``top_db`` below the maximum of each frequency bin"""
+    x_db = 20 * np.log10(np.abs(x) + np.finfo(np.float64).eps)
+    return np.maximum(x_db, np.max(x_db, axis=-1, keepdims=True) - top_db)
+
+
+def frame_rms(y, frame_length, chunk_frames=4096):
+    """RMS of consecutive non-overlapping frames (a trailing partial frame is dropped)"""
+    n_frames = len(y) // frame_length
+    rms = np.empty(n_frames)
+    # Convert to float64 a chunk at a time instead of copying the whole signal
+    for start in range(0, n_frames, chunk_frames):
+        stop = min(start + chunk_frames, n_frames)
+        frames = np.asarray(y[start * frame_length:stop * frame_length], dtype=np.float64)
+        rms[start:stop] = np.sqrt(np.mean(frames.reshape(stop - start, frame_length) ** 2, axis=1))
+    return rms
+
+
+def quietest_window(rms, n_frames):
+    """
+    Index of the first frame of the quietest run of ``n_frames`` frames
+
+    Runs that contain digital silence are skipped so the profile describes
+    the actual room noise. Returns 0 if the signal is shorter than the window.
+    """
+    if len(rms) <= n_frames:
+        return 0
+    energy = np.where(rms < SILENCE_RMS, np.inf, rms ** 2)
+    cumulative = np.concatenate([[0.0], np.cumsum(energy)])
+    window = cumulative[n_frames:] - cumulative[:-n_frames]
+    if not np.isfinite(window).any():
+        return 0
+    return int(np.argmin(window))
+
+
+class NoiseProfile:
+    """Per-frequency noise statistics of a recording environment"""
+
+    def __init__(self, sr, mean_db, std_db, n_fft=N_FFT):
+        self.sr = sr
+        self.mean_db = np.asarray(mean_db, dtype=np.float64)
+        self.std_db = np.asarray(std_db, dtype=np.float64)
+        self.n_fft = n_fft
+
+    @classmethod
+    def from_clip(cls, clip, sr, n_fft=N_FFT):
+        """Estimate a profile from a clip that contains only noise (room tone)"""
+        noise_db = amp_to_db(stft_frames(np.asarray(clip, dtype=np.float64), n_fft))
+        return cls(sr, np.mean(noise_db, axis=1), np.std(noise_db, axis=1), n_fft)
+
+    @classmethod
+    def from_signal(cls, y, sr, seconds=QUIET_REGION_SECONDS, n_fft=N_FFT):
+        """Estimate a profile from the quietest region of a recording"""
+        n_frames = max(1, int(seconds * sr) // n_fft)
+        start = quietest_window(frame_rms(y, n_fft), n_frames) * n_fft
+        return cls.from_clip(y[start:start + n_frames * n_fft], sr, n_fft)
+
+    @classmethod
+    def from_file_scan(cls, path, seconds=QUIET_REGION_SECONDS, n_fft=N_FFT):
+        """
+        Estimate a profile from the quietest region of an audio file without
+        loading the whole file (same result as ``from_signal`` on its samples)
+        """
+        info = sf.info(path)
+        rms = []
+        for block in sf.blocks(path, blocksize=n_fft * 512, dtype='float32', always_2d=True):
+            rms.append(frame_rms(block.mean(axis=1, dtype=np.float32), n_fft))
+        rms = np.concatenate(rms) if rms else np.zeros(0)
+
+        n_frames = max(1, int(seconds * info.samplerate) // n_fft)
+        start = quietest_window(rms, n_frames) * n_fft
+        clip, _ = sf.read(path, start=start, frames=n_frames * n_fft, dtype='float32', always_2d=True)
+        return cls.from_clip(clip.mean(axis=1, dtype=np.float32), info.samplerate, n_fft)
+
+    @classmethod
+    def channels_from_file_scan(cls, path, seconds=QUIET_REGION_SECONDS, n_fft=N_FFT):
+        """
+        One profile per channel, each from the quietest region of that channel
+
+        The file is scanned once; every channel then reads back only its own
+        quiet region (same result as ``from_signal`` on every channel).
+        """
+        info = sf.info(path)
+        rms = [[] for _ in range(info.channels)]
+        for block in sf.blocks(path, blocksize=n_fft * 512, dtype='float32', always_2d=True):
+            for channel in range(info.channels):
+                rms[channel].append(frame_rms(block[:, channel], n_fft))
+
+        n_frames = max(1, int(seconds * info.samplerate) // n_fft)
+        profiles = []
+        for channel in range(info.channels):
+            channel_rms = np.concatenate(rms[channel]) if rms[channel] else np.zeros(0)
+            start = quietest_window(channel_rms, n_frames) * n_fft
+            clip, _ = sf.read(path, start=start, frames=n_frames * n_fft, dtype='float32', always_2d=True)
+            profiles.append(cls.from_clip(clip[:, channel], info.samplerate, n_fft))
+        return profiles
+
+    @classmethod
+    def load(cls, path):
+        """Load a profile saved with ``save``, or estimate one from a room-tone audio clip"""
+        if path.lower().endswith('.npz'):
+            with np.load(path) as data:
+                return cls(int(data['sr']), data['mean_db'], data['std_db'], int(data['n_fft']))
+
+        import librosa
+        clip, sr = librosa.load(path, sr=None)
+        return cls.from_clip(clip, sr)
+
+    def save(self, path):
+        """Save the profile as a .npz file; returns the path written (with '.npz' added if missing)"""
+        if not path.endswith('.npz'):
+            path += '.npz'
+        np.savez(path, sr=self.sr, mean_db=self.mean_db, std_db=self.std_db, n_fft=self.n_fft)
+        return path
+
+    def for_sample_rate(self, sr):
+        """Return this profile mapped onto the frequency bins of another sample rate"""
+        if sr == self.sr:
+            return self
+        source = np.linspace(0, self.sr / 2, len(self.mean_db))
+        target = np.linspace(0, sr / 2, self.n_fft // 2 + 1)
+        return NoiseProfile(
+            sr,
+            np.interp(target, source, self.mean_db),
+            np.interp(target, source, self.std_db),
+            self.n_fft
+        )
+
+    def threshold(self, n_std=N_STD_THRESH):
+        """Per-frequency dB level above which a bin counts as signal"""
+        return self.mean_db + self.std_db * n_std
+
+
+def _smoothing_filter(n_grad_freq, n_grad_time):
+    """Triangular 2-D kernel used to smooth the gate mask"""
+    freq = np.concatenate([
+        np.linspace(0, 1, n_grad_freq + 1, endpoint=False),
+        np.linspace(1, 0, n_grad_freq + 2)
+    ])[1:-1]
+    time = np.concatenate([
+        np.linspace(0, 1, n_grad_time + 1, endpoint=False),
+        np.linspace(1, 0, n_grad_time + 2)
+    ])[1:-1]
+    smoothing = np.outer(freq, time)
+    return smoothing / np.sum(smoothing)
+
+
+class _BlockGate:
+    """Block-wise driving shared by the mono and multichannel gates"""
+
+    def process(self, segment):
+        raise NotImplementedError
+
+    def process_blocks(self, blocks, context=CONTEXT_SIZE):
+        """Gate a stream of blocks, each analysed together with its neighbours"""
+        return with_context(blocks, self.process, context)
+
+    def apply(self, y, block_size=BLOCK_SIZE, context=CONTEXT_SIZE, progress=None, out=None):
+        """
+        Gate a whole signal, block by block to keep the STFT small
+
+        Args:
+            progress (callable): Called with the finished fraction (0-1) after every block
+            out (np.ndarray): Array the result is written to (may be ``y`` itself)
+        """
+        n = y.shape[-1]
+        if out is None:
+            out = np.empty_like(y)
+        done = 0
+        for block in self.process_blocks(split_blocks(y, block_size), context):
+            out[..., done:done + block.shape[-1]] = block
+            done += block.shape[-1]
+            if progress:
+                progress(done / n)
+        return out
+
+
+class SpectralGate(_BlockGate):
+    """Stationary spectral gate driven by a precomputed NoiseProfile"""
+
+    def __init__(self, profile, sr, prop_decrease, n_std=N_STD_THRESH):
+        """
+        Args:
+            profile (NoiseProfile): Noise statistics to gate against
+            sr (int): Sample rate of the audio that will be processed
+            prop_decrease (float): Amount of attenuation applied to noise bins (0-1)
+            n_std (float): Threshold in standard deviations above the mean noise level
+        """
+        self.profile = profile.for_sample_rate(sr)
+        self.sr = sr
+        self.prop_decrease = prop_decrease
+        self.n_fft = self.profile.n_fft
+        self.hop = self.n_fft // 4
+        self.threshold = self.profile.threshold(n_std)[:, None]
+
+        n_grad_freq = max(1, int(FREQ_MASK_SMOOTH_HZ / (sr / (self.n_fft / 2))))
+        n_grad_time = max(1, int(TIME_MASK_SMOOTH_MS / ((self.hop / sr) * 1000)))
+        self.smoothing = None
+        if n_grad_freq > 1 or n_grad_time > 1:
+            self.smoothing = _smoothing_filter(n_grad_freq, n_grad_time)
+
+    def mask(self, spectrum):
+        """Gain per STFT bin for a spectrum of shape (frequencies, frames)"""
+        mask = (amp_to_db(spectrum) > self.threshold).astype(np.float64)
+        mask = mask * self.prop_decrease + (1.0 - self.prop_decrease)
+        if self.smoothing is not None:
+            mask = fftconvolve(mask, self.smoothing, mode='same')
+        return mask
+
+    def gains(self, spectrum):
+        """Gain per bin as a stage of a SpectralChain (the mask)"""
+        return self.mask(spectrum)
+
+    def process(self, segment):
+        """Gate one segment of audio in a single STFT analysis/synthesis pass"""
+        spectrum = stft_frames(np.asarray(segment, dtype=np.float64), self.n_fft)
+        return istft_frames(spectrum * self.mask(spectrum), self.n_fft, len(segment), segment.dtype)
+
+    def then(self, *stages):
+        """This gate followed by further spectral stages on the same STFT frames"""
+        return SpectralChain([self, *stages], self.n_fft)
+
+
+class SpectralChain(_BlockGate):
+    """
+    Spectral stages sharing one STFT analysis/synthesis per segment
+
+    Every stage provides ``gains(spectrum)``, computed from the frames as the
+    previous stages left them: a gate's mask, a filter's response.
+    """
+
+    def __init__(self, stages, n_fft=N_FFT):
+        self.stages = list(stages)
+        self.n_fft = n_fft
+
+    def process(self, segment):
+        """Apply every stage to one segment of audio"""
+        spectrum = stft_frames(np.asarray(segment, dtype=np.float64), self.n_fft)
+        for stage in self.stages:
+            spectrum = spectrum * stage.gains(spectrum)
+        return istft_frames(spectrum, self.n_fft, len(segment), segment.dtype)
+
+
+class MultichannelGate(_BlockGate):
+    """
+    One SpectralGate per channel for (channels, samples) audio
+
+    The channels are independent, so they are gated in parallel threads
+    (the STFTs and mask arithmetic release the GIL).
+    """
+
+    def __init__(self, gates, max_workers=None):
+        """
+        Args:
+            gates (list): SpectralGate for every channel
+            max_workers (int): Thread count (default: channels, capped at the CPU count)
+        """
+        self.gates = list(gates)
+        self.max_workers = max_workers or max(1, min(len(self.gates), os.cpu_count() or 1))
+
+    @classmethod
+    def from_profiles(cls, profiles, sr, prop_decrease, n_std=N_STD_THRESH):
+        """Gate every channel against its own profile"""
+        return cls([SpectralGate(profile, sr, prop_decrease, n_std) for profile in profiles])
+
+    def then(self, *stages):
+        """Every channel's gate followed by further spectral stages"""
+        return MultichannelGate([gate.then(*stages) for gate in self.gates], self.max_workers)
+
+    def process(self, segment):
+        """Gate every channel of a (channels, samples) segment"""
+        if self.max_workers == 1:
+            return np.stack([gate.process(channel) for gate, channel in zip(self.gates, segment)])
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            return np.stack(list(pool.map(lambda gate, channel: gate.process(channel), self.gates, segment)))
+
+
+def single_pass_amount(amount):
+    """
+    Attenuation of one gate pass equivalent to the old two-pass chain
+
+    Amounts above 0.6 used to run a second pass at half strength. Both
+    passes scale noise bins by (1 - p), so one pass with
+    1 - (1 - p) * (1 - p / 2) removes the same amount of noise.
+    """
+    if amount > 0.6:
+        return 1.0 - (1.0 - amount) * (1.0 - amount * 0.5)
+    return amount
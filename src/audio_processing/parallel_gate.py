@@ -0,0 +1,182 @@
+"""
+Noise reduction of long signals on a pool of worker processes.
+
+``_BlockGate.apply`` gates a signal in blocks, each analysed together with
+``context`` samples on both sides, and keeps only the block's own part. The
+blocks are therefore independent: ``ParallelGate`` hands them to worker
+processes and reassembles the kept parts in order, which gives exactly the
+serial result (same segments, same STFT frames, so no seams).
+
+Segments travel through two ``SharedMemory`` arrays of a few slots each
+(input segments and gated segments) instead of being pickled, and only a
+window of ``2 * workers`` blocks is in flight, so the shared memory stays
+small even for a 10 hour recording kept in mapped scratch files. Every
+worker receives the gate, and with it the single noise profile, once when
+the pool starts.
+
+Workers are started with 'forkserver' (or 'spawn' where that is missing)
+rather than forked from a process that already runs UI or job queue
+threads, and each gates the channels of its blocks on a single thread: the
+processes already use the cores, more threads would only compete for them.
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from src.audio_processing.noise_profile import BLOCK_SIZE, CONTEXT_SIZE
+
+# Gate and shared memory attachments of the current worker process
+_gate = None
+_attached = {}
+
+
+def denoise_workers(settings):
+    """Worker processes for noise reduction from the 'denoise_workers' setting (0 = CPU count)"""
+    workers = settings.get('denoise_workers', 1)
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _init_worker(gate):
+    global _gate
+    # One thread per worker process (a MultichannelGate would otherwise start one per channel)
+    if hasattr(gate, 'max_workers'):
+        gate.max_workers = 1
+    _gate = gate
+
+
+def _worker_context():
+    """Start method of the worker processes: never fork a process that is running threads"""
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _attach(role, name):
+    """The worker's attachment to a shared memory block (reattached when the block changes)"""
+    shm = _attached.get(role)
+    if shm is None or shm.name != name:
+        if shm is not None:
+            shm.close()
+        shm = _attached[role] = SharedMemory(name=name)
+    return shm
+
+
+def _gate_slot(inputs_name, outputs_name, shape, dtype, slot):
+    """Gate the segment in one input slot into the same output slot"""
+    inputs = np.ndarray(shape, dtype=dtype, buffer=_attach('inputs', inputs_name).buf)
+    outputs = np.ndarray(shape, dtype=dtype, buffer=_attach('outputs', outputs_name).buf)
+    outputs[slot] = _gate.process(inputs[slot])
+    return slot
+
+
+class ParallelGate:
+    """Runs a SpectralGate or MultichannelGate over the blocks of a signal in worker processes"""
+
+    def __init__(self, gate, workers):
+        """
+        Args:
+            gate: The gate to run (pickled once into every worker)
+            workers (int): Number of worker processes
+        """
+        self.gate = gate
+        self.workers = max(1, workers)
+        self._pool = None
+        self._shared = None
+
+    def apply(self, y, block_size=BLOCK_SIZE, context=CONTEXT_SIZE, progress=None, out=None):
+        """
+        Gate a whole signal, same arguments and result as ``_BlockGate.apply``
+
+        Signals of a single block are gated in this process.
+        """
+        n = y.shape[-1]
+        if self.workers == 1 or n <= block_size:
+            return self.gate.apply(y, block_size, context, progress=progress, out=out)
+        if out is None:
+            out = np.empty_like(y)
+
+        segment_length = block_size + 2 * context
+        slots = 2 * self.workers
+        inputs, outputs = self._slots((slots,) + y.shape[:-1] + (segment_length,), y.dtype)
+        pool = self._start()
+
+        starts = range(0, n, block_size)
+        in_flight = deque()
+        segment = None
+        done = 0
+
+        def collect():
+            # Blocks are written back in order, and only once the next segment (whose
+            # context overlaps this block) has been copied out, so ``out`` may be ``y``
+            nonlocal done
+            start, future = in_flight.popleft()
+            slot = future.result()
+            length = min(block_size, n - start)
+            out[..., start:start + length] = outputs[slot][..., context:context + length]
+            done += length
+            if progress:
+                progress(done / n)
+
+        try:
+            for index, start in enumerate(starts):
+                if len(in_flight) == slots:
+                    collect()
+                slot = index % slots
+                # previous context + block + next context, zero padded at both ends of the signal
+                segment = inputs[slot]
+                segment[...] = 0
+                first = max(0, start - context)
+                stop = min(n, start + block_size + context)
+                segment[..., first - (start - context):stop - (start - context)] = y[..., first:stop]
+                in_flight.append((start, pool.submit(
+                    _gate_slot, self._shared[0].name, self._shared[1].name, inputs.shape, inputs.dtype.str, slot
+                )))
+            while in_flight:
+                collect()
+        except BaseException:
+            for _, future in in_flight:
+                future.cancel()
+            raise
+        finally:
+            # Views of the shared memory would keep it from being closed
+            inputs = outputs = segment = None
+        return out
+
+    def _start(self):
+        """The worker pool, started on first use"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=_worker_context(), initializer=_init_worker, initargs=(self.gate,)
+            )
+        return self._pool
+
+    def _slots(self, shape, dtype):
+        """Input and output slot arrays in shared memory, reallocated when more room is needed"""
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if self._shared is None or self._shared[0].size < size:
+            self._release_shared()
+            self._shared = (SharedMemory(create=True, size=size), SharedMemory(create=True, size=size))
+        return tuple(np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm in self._shared)
+
+    def _release_shared(self):
+        if self._shared is not None:
+            for shm in self._shared:
+                shm.close()
+                shm.unlink()
+            self._shared = None
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        self._release_shared()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
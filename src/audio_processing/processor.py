@@ -1,18 +1,98 @@
 import os
+import tempfile
 import time
 import numpy as np
 import soundfile as sf
-import librosa
-import noisereduce as nr
-from pydub import AudioSegment
-from scipy import signal
+from src.audio_processing.activity import FADE_SECONDS, TRIM_PAD_SECONDS, ActivityIndex, process_active
+from src.audio_processing.blocks import WORK_BLOCK_SIZE, read_blocks
+from src.audio_processing.chain import compile_chain, settings_chain
+from src.audio_processing.compressor import Compressor
+from src.audio_processing.equalizer import EQ_PRESETS, get_band_filter, get_eq_filter
+from src.audio_processing.loudness import DEFAULT_TRUE_PEAK_DB, normalize_loudness
+from src.audio_processing.noise_profile import MultichannelGate, NoiseProfile, SpectralGate, single_pass_amount
+from src.audio_processing.parallel_gate import ParallelGate, denoise_workers
+from src.audio_processing.renditions import (
+    ProcessingResult, RenditionWriter, encode_renditions, encode_workers, output_renditions
+)
+from src.audio_processing.resampling import processing_rates, resample, resampled_shape, source_sample_rate
+from src.audio_processing.result_cache import DEFAULT_MAX_BYTES, ResultCache
+from src.audio_processing.scratch import DEFAULT_MAPPED_THRESHOLD_BYTES, ScratchSpace, use_mapped
+from src.audio_processing.stage_graph import DEFAULT_MEMORY_BYTES, StageCache, StageGraph, source_identity
+from src.audio_processing.streaming import StreamingPipeline, can_stream
+from src.utils.instrumentation import Instrumentation, ProgressTracker
 
 class AudioProcessor:
-    def __init__(self):
-        self.output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'output')
+    # Part of every result cache key; bump whenever a change alters the processed audio
+    PROCESSOR_VERSION = '5'
+    
+    # Peak level the output is normalized to (slightly below 0 dB to prevent clipping)
+    NORMALIZE_TARGET = 0.95
+    
+    # Samples handed to the encoder at a time
+    WRITE_BLOCK_SIZE = 65536
+    
+    # Sample rates whose filters are prepared by warm_up
+    WARM_UP_RATES = (44100, 48000)
+    
+    # Default processing cost of each stage in microseconds per sample, used
+    # to turn work done into progress until real jobs have been measured
+    DEFAULT_STAGE_COSTS = {
+        'noise_profile': 0.01,
+        'load': 0.01,
+        'resample': 0.01,
+        'noise_reduction': 0.5,
+        'trim_silence': 0.002,
+        'highpass': 0.06,
+        'lowpass': 0.06,
+        'eq': 0.06,
+        'gain': 0.005,
+        'compression': 0.02,
+        'output_resample': 0.01,
+        'normalize': 0.005,
+        'encode': 0.05
+    }
+    
+    # Weight of the newest measurement in the running stage cost average
+    STAGE_COST_SMOOTHING = 0.3
+    
+    def __init__(self, output_dir=None, cache=True, cache_max_bytes=DEFAULT_MAX_BYTES,
+                 stage_cache=True, stage_cache_max_bytes=DEFAULT_MEMORY_BYTES,
+                 scratch_dir=None, mapped_threshold_bytes=DEFAULT_MAPPED_THRESHOLD_BYTES):
+        """
+        Args:
+            output_dir (str): Directory for processed files (default: ./output)
+            cache: True for a ResultCache in ``output_dir/.cache``, False to disable
+                caching, or a ResultCache instance
+            cache_max_bytes (int): Size limit of the default cache
+            stage_cache: True for a StageCache of intermediate stage outputs (in memory,
+                spilling to ``output_dir/.cache/stages``), False to disable, or a StageCache instance
+            stage_cache_max_bytes (int): Memory budget of the default stage cache
+            scratch_dir (str): Directory for memory-mapped scratch files and the streaming
+                scratch file (default: the system temp directory / ``output_dir``)
+            mapped_threshold_bytes (int): Decoded (float32) size above which files are
+                processed in memory-mapped scratch files when settings say scratch='auto'
+        """
+        if output_dir is None:
+            output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'output')
+        self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
+        self.stage_costs = dict(self.DEFAULT_STAGE_COSTS)
+        
+        if cache is True:
+            cache = ResultCache(os.path.join(self.output_dir, '.cache'), cache_max_bytes)
+        self.cache = cache or None
+        
+        # Re-rendering a file with changed settings reuses the outputs of unchanged stages
+        if stage_cache is True:
+            stage_cache = StageCache(stage_cache_max_bytes, os.path.join(self.output_dir, '.cache', 'stages'))
+        self.stage_cache = stage_cache or None
+        
+        self.scratch_dir = scratch_dir
+        if scratch_dir is not None:
+            os.makedirs(scratch_dir, exist_ok=True)
+        self.mapped_threshold_bytes = mapped_threshold_bytes
         
-    def process_audio(self, input_file, settings, progress_callback=None):
+    def process_audio(self, input_file, settings, progress_callback=None, instrumentation=None, cancel_event=None):
         """
         Process audio file to enhance it to studio podcast quality
         
@@ -20,228 +100,468 @@ class AudioProcessor:
             input_file (str): Path to input audio file
             settings (dict): Dictionary containing processing settings
             progress_callback (callable): Function to call with progress updates (0-100)
+            instrumentation (Instrumentation): Receives start/end events of every stage (optional)
+            cancel_event (threading.Event): Set it to stop the job at the next safe point;
+                process_audio then raises JobCancelled and leaves no output behind
             
         Returns:
-            str: Path to the processed output file
+            ProcessingResult: File, size and encoding time of every output rendition
         """
-        # Update progress
-        if progress_callback:
-            progress_callback(5)
-            
-        # Load audio file
-        y, sr = librosa.load(input_file, sr=None)
-        
-        # Update progress
-        if progress_callback:
-            progress_callback(15)
+        # Reject unknown codecs or clashing rendition labels before any processing
+        output_renditions(settings)
         
-        # Apply noise reduction
-        if settings.get('noise_reduction', 0) > 0:
-            noise_reduction_amount = settings.get('noise_reduction', 0.5)
-            y = self._apply_noise_reduction(y, sr, noise_reduction_amount)
+        if instrumentation is None:
+            instrumentation = Instrumentation(job=os.path.basename(input_file))
             
-        # Update progress
-        if progress_callback:
-            progress_callback(30)
+        # The same input rendered with the same settings before: reuse that output
+        cache_key = None
+        if self.cache is not None:
+            with instrumentation.stage('cache_lookup'):
+                cache_key = self.cache.make_key(input_file, settings, self.PROCESSOR_VERSION)
+                result = self.cache.get(cache_key, self._make_output_base(input_file))
+            if result is not None:
+                if progress_callback:
+                    progress_callback(100)
+                return result
             
-        # Apply EQ based on preset
-        eq_preset = settings.get('eq_preset', 'Stüdyo')  # Default to Studio preset
-        y = self._apply_eq(y, sr, eq_preset)
+        with instrumentation.job_profile():
+            # Long recordings can be processed block by block with bounded memory (chains that
+            # trim or skip silence, or filter before noise reduction, need the whole file, so
+            # they run in memory, in mapped scratch files if the file is large)
+            if settings.get('streaming', False) and can_stream(input_file) and self.compile_chain(settings).streamable:
+                result = self._process_audio_streaming(
+                    input_file, settings, progress_callback, instrumentation, cancel_event
+                )
+            else:
+                result = self._process_audio_in_memory(
+                    input_file, settings, progress_callback, instrumentation, cancel_event
+                )
+                
+        self._learn_stage_costs(instrumentation)
         
-        # Update progress
-        if progress_callback:
-            progress_callback(50)
-            
-        # Apply compression
-        if settings.get('compression', 0) > 0:
-            compression_amount = settings.get('compression', 0.5)
-            y = self._apply_compression(y, compression_amount)
-            
-        # Update progress
-        if progress_callback:
-            progress_callback(70)
-            
-        # Normalize audio
-        y = self._normalize_audio(y)
+        if cache_key is not None:
+            try:
+                self.cache.put(cache_key, result)
+            except OSError as e:
+                print(f"Could not cache {os.path.basename(result.output_file)}: {e}")
+        return result
+    
+    def _process_audio_in_memory(self, input_file, settings, progress_callback, instrumentation, cancel_event=None):
+        """Load the whole file and run the stages of the stage graph, reusing memoized outputs"""
+        # Inputs too large for RAM keep their signal in memory-mapped scratch files
+        scratch = None
+        if use_mapped(input_file, settings, self.mapped_threshold_bytes):
+            scratch = ScratchSpace(self.scratch_dir)
+        try:
+            return self._run_stage_graph(input_file, settings, progress_callback, instrumentation,
+                                         cancel_event, scratch)
+        finally:
+            if scratch is not None:
+                scratch.close()
+    
+    def _run_stage_graph(self, input_file, settings, progress_callback, instrumentation, cancel_event, scratch):
+        """Evaluate the stage graph and encode its output (in ``scratch`` arrays if given)"""
+        # Low memory and mapped mode: float32 throughout, every stage writes back into the
+        # same buffer, so no stage output can be memoized
+        in_place = settings.get('low_memory', False) or scratch is not None
+        graph = self._stage_graph(input_file, settings, in_place, scratch)
+        target = graph.output
         
-        # Update progress
-        if progress_callback:
-            progress_callback(85)
-            
-        # Create output filename
-        base_name = os.path.splitext(os.path.basename(input_file))[0]
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        output_file = os.path.join(self.output_dir, f"{base_name}_enhanced_{timestamp}.wav")
+        # Only the stages downstream of a changed setting (or of an evicted output) run
+        progress = self._progress_tracker(graph.plan(target) + ['encode'], progress_callback, cancel_event)
         
-        # Save processed audio
-        sf.write(output_file, y, sr)
+        # Memoized stages of this job served from the stage cache / computed
+        cache_counts = {'hits': 0, 'misses': 0}
         
-        # Try to convert to MP3 for smaller file size if FFmpeg is available
-        mp3_output = output_file.replace('.wav', '.mp3')
-        conversion_success = self._convert_to_mp3(output_file, mp3_output)
+        def run_stage(stage, inputs):
+            if stage.memoize and graph.cache is not None:
+                cache_counts['misses'] += 1
+            progress.begin(stage.name)
+            audio = inputs[0][0] if inputs else None
+            samples = audio.shape[-1] if audio is not None else None
+            with instrumentation.stage(stage.name, samples, audio.nbytes if audio is not None else None) as info:
+                y, sr = stage.func(*inputs, progress.update)
+                info['samples'] = y.shape[-1]
+                info['nbytes'] = y.nbytes
+            return y, sr
         
-        # If conversion was successful, use the MP3 file and remove the WAV
-        if conversion_success and os.path.exists(mp3_output):
-            os.remove(output_file)
-            output_file = mp3_output
+        def cached_stage(stage, value, seconds):
+            y, _ = value
+            cache_counts['hits'] += 1
+            instrumentation.record(stage.name, seconds, seconds, y.shape[-1], cached=True)
         
-        # Update progress
-        if progress_callback:
-            progress_callback(100)
+        y, sr = graph.evaluate(target, run=run_stage, on_hit=cached_stage)
+        if graph.cache is not None:
+            instrumentation.summary('stage_cache', cache=graph.cache.stats(), **cache_counts)
+        n_samples = y.shape[-1]
             
-        return output_file
-    
-    def _apply_noise_reduction(self, y, sr, amount):
-        """Apply noise reduction to the audio"""
-        # Calculate noise profile from the first second
-        noise_sample = y[:min(len(y), sr)]
-        
-        # Apply noise reduction with sensitivity based on amount
-        reduced_noise = nr.reduce_noise(
-            y=y, 
-            sr=sr,
-            prop_decrease=amount,
-            stationary=True
+        # Encode processed audio straight from memory, every rendition on its own encoder
+        progress.begin('encode')
+        renditions = output_renditions(settings)
+        with instrumentation.stage('encode', n_samples, y.nbytes):
+            results = encode_renditions(
+                y, sr, self._make_output_base(input_file), renditions,
+                workers=encode_workers(settings, len(renditions)),
+                progress=progress.update,
+                block_size=self.WRITE_BLOCK_SIZE
+            )
+        
+        progress.finish()
+        return ProcessingResult(results)
+    
+    def _stage_graph(self, input_file, settings, in_place=False, scratch=None):
+        """
+        The in-memory chain as a StageGraph of (audio, sample rate) outputs
+        
+        Each stage function takes its input and a progress callback. Stage
+        parameters hold exactly the settings that change that stage's output.
+        With a ScratchSpace the signal is loaded (and resampled) into
+        memory-mapped arrays, which the in-place stages then process block by block.
+        """
+        graph = StageGraph(
+            f"{source_identity(input_file)}:{self.PROCESSOR_VERSION}",
+            None if in_place else self.stage_cache
         )
         
-        # For studio quality, apply a second pass with more gentle settings on higher amounts
-        if amount > 0.6:
-            reduced_noise = nr.reduce_noise(
-                y=reduced_noise,
-                sr=sr,
-                prop_decrease=amount * 0.5,  # Gentler second pass
-                stationary=True
+        def load(progress):
+            if scratch is not None and can_stream(input_file):
+                return self._load_mapped(input_file, scratch, progress)
+            # Keep the channel layout: (samples,) or (channels, samples)
+            # (librosa is imported lazily, it is slow to import)
+            import librosa
+            y, sr = librosa.load(input_file, sr=None, mono=False)
+            if scratch is not None:
+                # Formats soundfile cannot read are decoded whole, then moved out of RAM
+                mapped = scratch.allocate(y.shape)
+                mapped[...] = y
+                return mapped, sr
+            if in_place:
+                y = np.require(y, dtype=np.float32, requirements=['W'])
+            return y, sr
+        upstream = graph.add('load', load)
+        
+        def resample_to(rate):
+            def run(audio, progress):
+                y, sr = audio
+                out = scratch.allocate(resampled_shape(y.shape, sr, rate)) if scratch is not None else None
+                return resample(y, sr, rate, progress=progress, out=out), rate
+            return run
+        
+        # High-rate uploads are brought to the processing rate first (block-wise polyphase)
+        source_sr, processing_sr, output_sr = self.sample_rates(input_file, settings)
+        if processing_sr != source_sr:
+            upstream = graph.add(
+                'resample',
+                resample_to(processing_sr),
+                params={'rate': processing_sr},
+                inputs=[upstream]
+            )
+        
+        # The stages of the (declarative or settings) chain, fused into as few passes as possible
+        chain = self.compile_chain(settings)
+        profile = self.resolve_noise_profile(settings) if chain.ops_of_kind('noise_reduction') else None
+        workers = denoise_workers(settings)
+        for ops in chain.passes(processing_sr):
+            op = ops[0]
+            if op.kind == 'normalize':
+                break
+            params = {'ops': [params for fused in ops for params in fused.params]}
+            if op.kind == 'noise_reduction':
+                params['profile'] = profile
+            upstream = graph.add(
+                self._unique_stage_name(graph, '+'.join(fused.name for fused in ops)),
+                self._chain_op_stage(op, in_place, profile, workers, spectral=ops[1:]),
+                params=params,
+                inputs=[upstream]
+            )
+        
+        if output_sr != processing_sr:
+            upstream = graph.add(
+                'output_resample',
+                resample_to(output_sr),
+                params={'rate': output_sr},
+                inputs=[upstream]
             )
         
-        return reduced_noise
+        # Normalizing is cheap and its output is only encoded, so it is not memoized
+        if chain.normalize is not None:
+            graph.add(
+                'normalize',
+                self._chain_op_stage(chain.normalize, in_place),
+                params=chain.normalize_options(),
+                inputs=[upstream],
+                memoize=False
+            )
+        return graph
     
-    def _apply_eq(self, y, sr, preset):
-        """Apply EQ based on preset"""
-        if preset == 'Doğal':
-            # Slight boost to mid frequencies for clarity
-            return self._apply_eq_filter(y, sr, [
-                (80, 0.8),    # Reduce low rumble
-                (150, 1.1),   # Slight boost to low mids
-                (3000, 1.2),  # Boost speech clarity
-                (10000, 0.9)  # Slight reduction in high frequencies
-            ])
-        elif preset == 'Sıcak':
-            # Boost low-mids for warmth
-            return self._apply_eq_filter(y, sr, [
-                (100, 1.2),   # Boost low end
-                (250, 1.3),   # Boost low mids
-                (2500, 0.9),  # Reduce high mids
-                (8000, 0.8)   # Reduce highs
-            ])
-        elif preset == 'Parlak':
-            # Boost high frequencies for brightness
-            return self._apply_eq_filter(y, sr, [
-                (100, 0.9),   # Reduce low end
-                (1000, 1.1),  # Boost mids
-                (3000, 1.3),  # Boost high mids
-                (8000, 1.4)   # Boost highs
-            ])
-        elif preset == 'Derin':
-            # Boost low frequencies for depth
-            return self._apply_eq_filter(y, sr, [
-                (80, 1.4),    # Boost sub bass
-                (150, 1.3),   # Boost low end
-                (400, 1.1),   # Boost low mids
-                (3000, 0.9),  # Reduce high mids
-                (8000, 0.8)   # Reduce highs
-            ])
-        elif preset == 'Stüdyo':
-            # Professional studio sound with clarity and presence
-            return self._apply_eq_filter(y, sr, [
-                (60, 0.7),    # Reduce sub-bass rumble
-                (120, 1.1),   # Slight boost to bass for warmth
-                (250, 0.9),   # Cut muddiness
-                (500, 0.95),  # Slight cut to prevent boxiness
-                (1000, 1.05), # Slight boost for presence
-                (2000, 1.15), # Boost for vocal clarity
-                (3500, 1.25), # Boost for presence and articulation
-                (5000, 1.2),  # Boost for presence
-                (8000, 1.1),  # Slight boost for air
-                (12000, 1.15) # Boost for sparkle and air
-            ])
-        else:  # 'Özel' or any other preset
-            # Balanced EQ
-            return self._apply_eq_filter(y, sr, [
-                (100, 1.1),   # Slight boost to low end
-                (1000, 1.1),  # Slight boost to mids
-                (5000, 1.1)   # Slight boost to highs
-            ])
+    @staticmethod
+    def _unique_stage_name(graph, name):
+        """``name``, or ``name#2``, ``name#3``... if the chain uses the same stage more than once"""
+        unique = name
+        count = 1
+        while unique in graph.stages:
+            count += 1
+            unique = f"{name}#{count}"
+        return unique
     
-    def _apply_eq_filter(self, y, sr, bands):
-        """Apply multi-band EQ filter"""
-        # Create a copy of the audio
-        y_filtered = np.copy(y)
-        
-        # Apply each band
-        for freq, gain in bands:
-            # Design bandpass filter
-            b, a = signal.butter(2, [(freq * 0.7) / (sr / 2), (freq * 1.3) / (sr / 2)], btype='band')
-            
-            # Apply filter to get the band
-            y_band = signal.lfilter(b, a, y)
+    def _chain_op_stage(self, op, in_place, profile=None, workers=1, spectral=()):
+        """
+        Stage function running one compiled chain op on an (audio, sample rate) input
+
+        ``spectral`` are the filter ops applied to the frames of a noise reduction op.
+        """
+        if op.kind == 'noise_reduction':
+            def run(y, sr, progress):
+                return self._apply_noise_reduction(
+                    y, sr, op.stage['amount'], profile, progress=progress, in_place=in_place,
+                    skip_silence=op.stage['skip_silence'], workers=workers,
+                    spectral_stages=[fused.spectral_filter(sr) for fused in spectral]
+                )
+        elif op.kind == 'trim':
+            def run(y, sr, progress):
+                return self._trim_silence(y, sr, op.stage['pad'])
+        elif op.kind == 'filter':
+            def run(y, sr, progress):
+                return self._apply_filter(y, op.linear_filter(sr), in_place=in_place, progress=progress)
+        elif op.kind == 'pointwise':
+            def run(y, sr, progress):
+                return self._apply_pointwise(y, op.pointwise(), in_place=in_place, progress=progress)
+        elif op.kind == 'compression':
+            def run(y, sr, progress):
+                return self._run_compressor(y, op.compressor(), sr, in_place=in_place, progress=progress)
+        else:
+            options = {
+                'loudness_target': op.stage['loudness'], 'true_peak': op.stage['true_peak'], 'peak': op.stage['peak']
+            }
             
-            # Apply gain and add to output
-            y_filtered = y_filtered + (y_band * (gain - 1))
+            def run(y, sr, progress):
+                return self._normalize_audio(y, in_place=in_place, sr=sr, progress=progress, **options)
+        return lambda audio, progress: (run(audio[0], audio[1], progress), audio[1])
+    
+    def _load_mapped(self, input_file, scratch, progress):
+        """Decode a file block by block into a memory-mapped scratch array"""
+        info = sf.info(input_file)
+        shape = (info.frames,) if info.channels == 1 else (info.channels, info.frames)
+        y = scratch.allocate(shape)
+        done = 0
+        for block in read_blocks(input_file, WORK_BLOCK_SIZE):
+            n = min(block.shape[-1], info.frames - done)
+            y[..., done:done + n] = block[..., :n]
+            done += n
+            progress(done / max(1, info.frames))
+        # Headers may announce more frames than the file holds
+        return y[..., :done], info.samplerate
+    
+    def _process_audio_streaming(self, input_file, settings, progress_callback, instrumentation, cancel_event=None):
+        """Process the file block by block (see StreamingPipeline)"""
+        info = sf.info(input_file)
+        _, _, output_sr = self.sample_rates(input_file, settings)
+        with self._open_writer(input_file, output_sr, settings, info.channels) as writer:
+            StreamingPipeline(self).run(input_file, settings, writer, progress_callback, instrumentation, cancel_event)
+        return ProcessingResult(writer.results)
+    
+    def stage_cost(self, stage):
+        """
+        Cost estimate of a stage in microseconds per sample, or None if unknown
         
-        return y_filtered
+        Fused chain stages ('highpass+eq') start from the sum of their parts and
+        repeated ones ('eq#2') from the first, until they have been measured.
+        """
+        if stage in self.stage_costs:
+            return self.stage_costs[stage]
+        parts = stage.split('#')[0].split('+')
+        if all(part in self.stage_costs for part in parts):
+            return sum(self.stage_costs[part] for part in parts)
+        return None
     
-    def _apply_compression(self, y, amount):
-        """Apply dynamic range compression"""
-        # Calculate threshold based on amount (higher amount = lower threshold)
-        threshold = 0.5 - (amount * 0.4)  # Threshold between 0.1 and 0.5
-        
-        # Calculate ratio based on amount (higher amount = higher ratio)
-        ratio = 1 + (amount * 5)  # Ratio between 1:1 and 6:1
-        
-        # Apply compression
-        y_compressed = np.zeros_like(y)
-        for i in range(len(y)):
-            if abs(y[i]) > threshold:
-                # Compress the signal above threshold
-                y_compressed[i] = threshold + (abs(y[i]) - threshold) / ratio
-                # Preserve the sign
-                if y[i] < 0:
-                    y_compressed[i] = -y_compressed[i]
-            else:
-                y_compressed[i] = y[i]
+    def _progress_tracker(self, stages, progress_callback, cancel_event=None):
+        """ProgressTracker weighting the stages by their measured cost per sample"""
+        return ProgressTracker(
+            [(stage, self.stage_cost(stage) or 0.0) for stage in stages], progress_callback, cancel_event
+        )
+    
+    def _learn_stage_costs(self, instrumentation):
+        """Fold the stage timings of a finished job into the running cost estimates"""
+        for stage, (seconds, samples) in instrumentation.totals.items():
+            current = self.stage_cost(stage)
+            if current is None or samples <= 0:
+                continue
+            cost = seconds / samples * 1e6
+            self.stage_costs[stage] = current + self.STAGE_COST_SMOOTHING * (cost - current)
+    
+    def warm_up(self):
+        """
+        Preload the heavy DSP modules and fill the filter caches
+
+        Runs the whole chain once on a short synthetic signal so that module
+        imports, librosa's lazy submodules and the fused EQ filters for the
+        common sample rates are ready before the first real job.
+        """
+        import librosa
         
-        # Apply a slight makeup gain to compensate for compression
-        makeup_gain = 1.0 + (amount * 0.3)  # More compression = more makeup gain
-        y_compressed = y_compressed * makeup_gain
+        # The first librosa.load call is slow (numba/audioread set-up), so load a tiny file once
+        fd, warm_up_file = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            sf.write(warm_up_file, np.zeros(1024, dtype=np.float32), self.WARM_UP_RATES[0])
+            librosa.load(warm_up_file, sr=None)
+        finally:
+            os.remove(warm_up_file)
         
-        return y_compressed
+        for sr in self.WARM_UP_RATES:
+            t = np.arange(sr) / sr
+            y = (0.3 * np.sin(2 * np.pi * 220 * t) + 0.01 * np.random.randn(sr)).astype(np.float32)
+            y = self._apply_noise_reduction(y, sr, 0.5)
+            for preset in EQ_PRESETS:
+                get_eq_filter(preset, sr)
+            y = self._apply_eq(y, sr, 'Stüdyo')
+            y = self._apply_compression(y, 0.5, sr)
+            self._normalize_audio(y)
+    
+    def _make_output_base(self, input_file):
+        """
+        Timestamped output path (without extension) for the input file
+
+        Jobs of equally named inputs finishing in the same second get the
+        same base; the encoders and the cache add a suffix when claiming it.
+        """
+        base_name = os.path.splitext(os.path.basename(input_file))[0]
+        timestamp = time.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.output_dir, f"{base_name}_enhanced_{timestamp}")
+    
+    def _open_writer(self, input_file, sr, settings, channels=1):
+        """Open the encoders of the renditions in settings (WAV if FFmpeg is missing)"""
+        return RenditionWriter(self._make_output_base(input_file), sr, channels, output_renditions(settings))
+    
+    def _compression_options(self, settings):
+        """Envelope options for the compressor (all 0 = original hard-knee curve)"""
+        return {
+            'attack_ms': settings.get('compression_attack_ms', 0.0),
+            'release_ms': settings.get('compression_release_ms', 0.0),
+            'knee': settings.get('compression_knee', 0.0),
+            'lookahead_ms': settings.get('compression_lookahead_ms', 0.0)
+        }
+    
+    def sample_rates(self, input_file, settings):
+        """(file, processing, output) sample rates of a file processed with settings"""
+        source_sr = source_sample_rate(input_file)
+        return (source_sr,) + processing_rates(source_sr, settings)
+    
+    def compile_chain(self, settings):
+        """The chain of settings['chain'] (or the one the settings describe), compiled into fused passes"""
+        return compile_chain(settings_chain(settings, self.NORMALIZE_TARGET))
+    
+    def resolve_noise_profile(self, settings):
+        """Return the NoiseProfile given in settings (instance or path), if any"""
+        profile = settings.get('noise_profile')
+        if isinstance(profile, str):
+            profile = NoiseProfile.load(profile)
+        return profile
     
-    def _normalize_audio(self, y):
-        """Normalize audio to optimal level"""
+    def _apply_noise_reduction(self, y, sr, amount, profile=None, progress=None, in_place=False, skip_silence=False,
+                               workers=1, spectral_stages=()):
+        """
+        Apply noise reduction to the audio (writing the result into ``y`` if in_place)
+        
+        With skip_silence only the active regions are gated; the silence between
+        them gets the gate's attenuation of noise as a fixed gain. With several
+        workers the blocks are gated in worker processes (same result).
+        ``spectral_stages`` (e.g. SpectralFilter) are applied to the gate's STFT
+        frames before resynthesis.
+        """
+        # One gate pass replaces the old full pass + gentler second pass
+        amount = single_pass_amount(amount)
+        
+        if y.ndim == 1:
+            # Estimate the noise profile from the quietest region unless one was given
+            if profile is None:
+                profile = NoiseProfile.from_signal(y, sr)
+            gate = SpectralGate(profile, sr, amount)
+        else:
+            # Every channel has its own noise floor; the channels are gated in parallel
+            if profile is None:
+                profiles = [NoiseProfile.from_signal(channel, sr) for channel in y]
+            else:
+                profiles = [profile] * len(y)
+            gate = MultichannelGate.from_profiles(profiles, sr, amount)
+        if spectral_stages:
+            gate = gate.then(*spectral_stages)
+        out = y if in_place else None
+        with ParallelGate(gate, workers) as gate:
+            if skip_silence:
+                return process_active(
+                    y, ActivityIndex.from_signal(y, sr).regions(),
+                    lambda segment, region_progress, region_out: gate.apply(
+                        segment, progress=region_progress, out=region_out
+                    ),
+                    1.0 - amount, int(FADE_SECONDS * sr), progress=progress, out=out
+                )
+            return gate.apply(y, progress=progress, out=out)
+    
+    def _trim_silence(self, y, sr, pad=TRIM_PAD_SECONDS):
+        """Cut leading and trailing silence (a view of ``y``)"""
+        start, stop = ActivityIndex.from_signal(y, sr).trim_bounds(sr, pad)
+        return y[..., start:stop]
+    
+    def _apply_eq(self, y, sr, preset, in_place=False, progress=None):
+        """Apply EQ based on preset"""
+        # Presets are fused into a single cached filter per sample rate
+        return self._apply_filter(y, get_eq_filter(preset, sr), in_place=in_place, progress=progress)
+    
+    def _apply_filter(self, y, eq_filter, in_place=False, progress=None):
+        """Apply a fused FIR filter (an EQ preset, or merged linear chain stages)"""
+        if in_place:
+            return eq_filter.apply_in_place(y, progress=progress)
+        return eq_filter.apply(y, progress=progress)
+    
+    def _apply_eq_filter(self, y, sr, bands):
+        """Apply multi-band EQ filter"""
+        return get_band_filter(bands, sr).apply(y)
+    
+    def _apply_compression(self, y, amount, sr=None, in_place=False, progress=None, **options):
+        """Apply dynamic range compression"""
+        # Attack/release of 0 keeps the original instantaneous hard-knee curve
+        return self._run_compressor(y, Compressor.from_amount(amount, **options), sr, in_place, progress)
+    
+    def _run_compressor(self, y, compressor, sr, in_place=False, progress=None):
+        """Run a compressor over the whole signal"""
+        if not in_place:
+            y = y.copy()
+        # Block-wise (same output as compress), so progress and cancellation are checked between blocks
+        return compressor.compress_in_place(y, sr, progress=progress)
+    
+    def _apply_pointwise(self, y, func, in_place=False, progress=None):
+        """Apply fused pointwise operations (gains, compressor curves) in one block-wise pass"""
+        out = y if in_place else np.empty_like(y)
+        n = y.shape[-1]
+        for start in range(0, n, WORK_BLOCK_SIZE):
+            out[..., start:start + WORK_BLOCK_SIZE] = func(y[..., start:start + WORK_BLOCK_SIZE])
+            if progress:
+                progress(min(start + WORK_BLOCK_SIZE, n) / n)
+        return out
+    
+    def _normalize_audio(self, y, in_place=False, sr=None, loudness_target=None, true_peak=DEFAULT_TRUE_PEAK_DB,
+                         progress=None, peak=None):
+        """Normalize audio to optimal level (peak, or integrated loudness with a true-peak limit)"""
+        if loudness_target is not None:
+            return normalize_loudness(y, sr, loudness_target, true_peak, in_place=in_place, progress=progress)
+        
         # Find the maximum amplitude
-        max_amp = np.max(np.abs(y))
+        if in_place:
+            # max/min instead of max(|y|), which would allocate a full-length temporary
+            max_amp = max(float(np.max(y)), -float(np.min(y))) if y.size else 0.0
+        else:
+            max_amp = np.max(np.abs(y))
         
         # Target amplitude (slightly below 0 dB to prevent clipping)
-        target_amp = 0.95
+        target_amp = self.NORMALIZE_TARGET if peak is None else peak
         
         # Normalize if needed
         if max_amp > 0:
+            if in_place:
+                np.multiply(y, y.dtype.type(target_amp / max_amp), out=y)
+                return y
             y_normalized = y * (target_amp / max_amp)
             return y_normalized
         else:
             return y
-    
-    def _convert_to_mp3(self, wav_file, mp3_file):
-        """Convert WAV to MP3 using pydub"""
-        try:
-            audio = AudioSegment.from_wav(wav_file)
-            audio.export(mp3_file, format="mp3", bitrate="192k")
-            return True
-        except Exception as e:
-            # If FFmpeg is not found, just keep the WAV file
-            if "ffmpeg" in str(e).lower():
-                print(f"FFmpeg not found, keeping WAV format: {e}")
-                return False
-            else:
-                # Re-raise other exceptions
-                raise
@@ -0,0 +1,423 @@
+"""
+Output renditions: several encodings of one processed signal.
+
+A job can ask for several output files through the 'renditions' setting,
+e.g. a 128k MP3 for feeds, a 64k mono Opus for low-bandwidth listeners and
+a FLAC master:
+
+    'renditions': [
+        {'codec': 'mp3', 'bitrate': '128k'},
+        {'codec': 'opus', 'bitrate': '64k', 'channels': 1},
+        {'codec': 'flac'},
+    ]
+
+The chain runs once and every rendition is encoded from the same processed
+signal. ``encode_renditions`` gives each rendition a thread of a pool of
+``encode_workers`` threads that remixes its blocks if needed and feeds its
+own encoder (an ffmpeg subprocess, or soundfile for lossless codecs), so the
+encoders run side by side instead of one after the other. The streaming
+path hands its blocks to all encoders at once through ``RenditionWriter``.
+
+Files are named after the job's output base plus the rendition's label
+(``episode_enhanced_<time>_64k_mono.opus``). Without the setting a job has
+one rendition from 'codec' and 'bitrate', written under the plain output
+base as before. ``claim_output_base`` creates the files of a job before its
+encoders open them, so jobs running at the same time never share a path.
+process_audio returns a ``ProcessingResult`` with the file, size and
+encoding time of every rendition.
+"""
+import itertools
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+import numpy as np
+from src.audio_processing.encoder import (
+    CODECS, DEFAULT_BITRATE, DEFAULT_CODEC, LOSSLESS_CODECS, open_writer, output_extension
+)
+
+# Samples handed to an encoder at a time
+WRITE_BLOCK_SIZE = 65536
+
+# Seconds between progress reports (and cancellation checks) while encoding
+PROGRESS_INTERVAL = 0.1
+
+RENDITION_KEYS = ('codec', 'bitrate', 'channels', 'label')
+
+CHANNEL_LABELS = {1: 'mono', 2: 'stereo'}
+
+
+class Rendition:
+    """One requested output file: codec, bitrate and channel count"""
+
+    def __init__(self, codec=DEFAULT_CODEC, bitrate=DEFAULT_BITRATE, channels=None, label=None):
+        """
+        Args:
+            codec (str): Key of encoder.CODECS or encoder.LOSSLESS_CODECS
+            bitrate (str): Bitrate for lossy codecs (ignored by lossless ones)
+            channels (int): 1 to downmix, 2 for stereo (more channels are folded down,
+                see ``stereo_fold``), None to keep the signal's channels
+            label (str): Suffix of the file name (default: bitrate and channel layout)
+        """
+        if not isinstance(codec, str) or (codec not in CODECS and codec not in LOSSLESS_CODECS):
+            raise ValueError(f"Unknown codec: {codec}")
+        if bitrate is not None and not isinstance(bitrate, str):
+            raise ValueError(f"bitrate must be a string such as '128k', not {bitrate!r}")
+        if channels is not None and (isinstance(channels, bool) or channels not in (1, 2)):
+            raise ValueError(f"channels must be 1, 2 or empty, not {channels!r}")
+        if label is not None and (not isinstance(label, str) or not re.fullmatch(r'[\w-]*', label)):
+            raise ValueError(f"Rendition label may only hold letters, digits, '_' and '-': {label!r}")
+        self.codec = codec
+        self.bitrate = None if codec in LOSSLESS_CODECS else (bitrate or DEFAULT_BITRATE)
+        self.channels = channels
+        self.label = self.default_label() if label is None else label
+
+    @classmethod
+    def from_dict(cls, spec):
+        """Rendition from a settings entry such as {'codec': 'mp3', 'bitrate': '64k', 'channels': 1}"""
+        if not isinstance(spec, dict):
+            raise ValueError(f"A rendition must be a dict, not {spec!r}")
+        unknown = set(spec) - set(RENDITION_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown rendition keys: {', '.join(sorted(unknown))}")
+        return cls(**spec)
+
+    def default_label(self):
+        parts = [] if self.bitrate is None else [self.bitrate]
+        if self.channels is not None:
+            parts.append(CHANNEL_LABELS[self.channels])
+        return '_'.join(parts)
+
+    @property
+    def extension(self):
+        return (LOSSLESS_CODECS.get(self.codec) or CODECS[self.codec])[1]
+
+    def output_base(self, base):
+        """Output path without extension for a job's output base"""
+        return f"{base}_{self.label}" if self.label else base
+
+    def output_suffix(self):
+        """File name after the job's output base (label and the extension actually written)"""
+        return ('_' + self.label if self.label else '') + output_extension(self.codec)
+
+    def output_channels(self, channels):
+        """Channels of the written file for a signal with ``channels``"""
+        return self.channels or channels
+
+    def as_dict(self):
+        return {'codec': self.codec, 'bitrate': self.bitrate, 'channels': self.channels, 'label': self.label}
+
+
+def parse_rendition(text):
+    """
+    Rendition from a command line spec 'codec[:bitrate][:mono|stereo]'
+
+    e.g. 'mp3:128k', 'opus:64k:mono' or 'flac'
+    """
+    codec, *options = text.split(':')
+    spec = {'codec': codec}
+    layouts = {label: channels for channels, label in CHANNEL_LABELS.items()}
+    for option in options:
+        if option in layouts:
+            spec['channels'] = layouts[option]
+        else:
+            spec['bitrate'] = option
+    return spec
+
+
+def output_renditions(settings):
+    """
+    Renditions requested by settings
+
+    Without 'renditions' the job has one rendition from 'codec' and 'bitrate'
+    with an empty label. Default labels that would name two files alike get
+    the codec in front; duplicate explicit labels raise ValueError.
+    """
+    specs = settings.get('renditions')
+    if not specs:
+        return [Rendition(settings.get('codec', DEFAULT_CODEC), settings.get('bitrate', DEFAULT_BITRATE), label='')]
+    if not isinstance(specs, (list, tuple)):
+        raise ValueError('renditions must be a list')
+
+    renditions = [Rendition.from_dict(spec) for spec in specs]
+    # Files of lossy codecs become WAV files when ffmpeg is missing, so labels must differ
+    # across codecs too (a FLAC master and a WAV master both default to no label)
+    defaults = [r.label for spec, r in zip(specs, renditions) if 'label' not in spec]
+    for spec, rendition in zip(specs, renditions):
+        if 'label' not in spec and defaults.count(rendition.label) > 1:
+            rendition.label = '_'.join(filter(None, (rendition.codec, rendition.label)))
+    labels = [rendition.label for rendition in renditions]
+    duplicates = sorted({label for label in labels if labels.count(label) > 1})
+    if duplicates:
+        raise ValueError(f"Several renditions are labelled {', '.join(repr(label) for label in duplicates)}")
+    return renditions
+
+
+def encode_workers(settings, count):
+    """Encoders run at the same time from the 'encode_workers' setting (None or 0 = CPU count)"""
+    workers = settings.get('encode_workers')
+    if workers is None or workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, count))
+
+
+def stereo_fold(channels):
+    """
+    Matrix of shape (channels, 2) folding a multichannel signal down to stereo
+
+    The channels are panned evenly from left to right (the first fully left,
+    the last fully right, a middle one to the centre); both sides are scaled
+    by the number of channels they sum, so two channels stay as they are.
+    """
+    position = np.linspace(0.0, 1.0, channels, dtype=np.float32)
+    return np.column_stack((1.0 - position, position)) / np.float32(channels / 2)
+
+
+def remix(block, channels):
+    """Block of shape (samples,) or (samples, channels) with the channel count of a rendition"""
+    if channels == 1 and block.ndim == 2:
+        return block.mean(axis=1, dtype=np.float32)
+    if channels == 2 and block.ndim == 1:
+        return np.column_stack((block, block))
+    if channels == 2 and block.shape[1] > 2:
+        return block @ stereo_fold(block.shape[1]).astype(block.dtype, copy=False)
+    return block
+
+
+class RenditionResult:
+    """File written for one rendition"""
+
+    def __init__(self, rendition, output_file, seconds=0.0, size=None):
+        """
+        Args:
+            rendition (Rendition): The requested rendition
+            output_file (str): Path of the written file
+            seconds (float): Time spent encoding it
+            size (int): File size in bytes (read from the file if not given)
+        """
+        # Lossy renditions are written as WAV when ffmpeg is missing
+        fallback = os.path.splitext(output_file)[1] != rendition.extension
+        self.codec = 'wav' if fallback else rendition.codec
+        self.bitrate = None if fallback else rendition.bitrate
+        self.channels = rendition.channels
+        self.label = rendition.label
+        self.output_file = output_file
+        self.seconds = seconds
+        self.size = os.path.getsize(output_file) if size is None else size
+
+    @property
+    def suffix(self):
+        """File name after the job's output base (label and extension)"""
+        return ('_' + self.label if self.label else '') + os.path.splitext(self.output_file)[1]
+
+    def as_dict(self):
+        return {
+            'codec': self.codec,
+            'bitrate': self.bitrate,
+            'channels': self.channels,
+            'label': self.label,
+            'output_file': self.output_file,
+            'seconds': self.seconds,
+            'size': self.size,
+        }
+
+
+class ProcessingResult:
+    """Output of process_audio: the written renditions, the first being the main output"""
+
+    def __init__(self, renditions, cached=False):
+        """
+        Args:
+            renditions (list): RenditionResult per rendition, in the requested order
+            cached (bool): Whether the files were copied from the result cache
+        """
+        self.renditions = list(renditions)
+        self.cached = cached
+
+    @property
+    def output_file(self):
+        return self.renditions[0].output_file
+
+    @property
+    def output_files(self):
+        return [rendition.output_file for rendition in self.renditions]
+
+    @property
+    def size(self):
+        return sum(rendition.size for rendition in self.renditions)
+
+    def as_dict(self):
+        return {
+            'output_file': self.output_file,
+            'cached': self.cached,
+            'renditions': [rendition.as_dict() for rendition in self.renditions],
+        }
+
+
+def claim_output_base(base, suffixes):
+    """
+    First of ``base``, ``base-2``, ``base-3``... free for every suffix, with its files created
+
+    The files are created empty with O_EXCL, so two jobs (threads or
+    processes) writing outputs of equally named inputs in the same second
+    get different names; the writers then overwrite the empty files.
+    """
+    for attempt in itertools.count(1):
+        candidate = base if attempt == 1 else f"{base}-{attempt}"
+        created = []
+        try:
+            for suffix in suffixes:
+                os.close(os.open(candidate + suffix, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                created.append(candidate + suffix)
+            return candidate
+        except FileExistsError:
+            for path in created:
+                os.remove(path)
+
+
+def release_outputs(base, suffixes):
+    """Delete whatever is left of the files of a claimed output base"""
+    for suffix in suffixes:
+        if os.path.exists(base + suffix):
+            os.remove(base + suffix)
+
+
+def open_rendition(output_base, sr, channels, rendition):
+    """Writer for one rendition of a signal with ``channels`` (see encoder.open_writer)"""
+    return open_writer(
+        rendition.output_base(output_base), sr, rendition.output_channels(channels),
+        codec=rendition.codec, bitrate=rendition.bitrate or DEFAULT_BITRATE
+    )
+
+
+class _Stopped(Exception):
+    """Raised in an encoder thread to abort its file after another rendition failed"""
+
+
+def encode_renditions(y, sr, output_base, renditions, workers=None, progress=None, block_size=WRITE_BLOCK_SIZE):
+    """
+    Encode a processed signal into every rendition concurrently
+
+    Each rendition is encoded by its own task on a pool of ``workers`` threads,
+    reading the shared signal block by block. The file names are claimed
+    first (see ``claim_output_base``). Progress is reported (and may
+    raise, e.g. JobCancelled) from the calling thread; if it raises or any
+    rendition fails, the other encoders stop and no output is left behind.
+
+    Args:
+        y (np.ndarray): Signal of shape (samples,) or (channels, samples)
+        sr (int): Sample rate
+        output_base (str): Output path without extension (a suffix is added if taken)
+        renditions (list): Rendition per output file
+        workers (int): Renditions encoded at the same time (default: all)
+        progress (callable): Receives the finished fraction (0-1) of all renditions
+        block_size (int): Samples handed to an encoder at a time
+
+    Returns:
+        list: RenditionResult per rendition
+    """
+    n_samples = y.shape[-1]
+    channels = 1 if y.ndim == 1 else y.shape[0]
+    suffixes = [rendition.output_suffix() for rendition in renditions]
+    output_base = claim_output_base(output_base, suffixes)
+    written = [0] * len(renditions)
+    stop = threading.Event()
+
+    def encode(index, rendition):
+        start = time.perf_counter()
+        with open_rendition(output_base, sr, channels, rendition) as writer:
+            for offset in range(0, n_samples, block_size):
+                if stop.is_set():
+                    raise _Stopped()
+                # Writers take (samples, channels)
+                writer.write(remix(y[..., offset:offset + block_size].T, rendition.channels))
+                written[index] = min(n_samples, offset + block_size)
+        return RenditionResult(rendition, writer.output_file, time.perf_counter() - start)
+
+    total = max(1, n_samples) * len(renditions)
+    with ThreadPoolExecutor(max_workers=workers or len(renditions)) as pool:
+        futures = [pool.submit(encode, index, rendition) for index, rendition in enumerate(renditions)]
+        try:
+            pending = futures
+            while pending:
+                done, pending = wait(pending, timeout=PROGRESS_INTERVAL, return_when=FIRST_EXCEPTION)
+                failed = [future for future in done if future.exception() is not None]
+                if failed:
+                    raise failed[0].exception()
+                if progress:
+                    progress(sum(written) / total)
+        except BaseException:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            # Finished renditions are deleted too: a job leaves all of its files or none
+            release_outputs(output_base, suffixes)
+            raise
+    return [future.result() for future in futures]
+
+
+class RenditionWriter:
+    """
+    Hands every block to the encoders of all renditions (for producers that
+    create the signal block by block, like the streaming pipeline)
+
+    Lossy encoders run in their own ffmpeg processes, so they still encode
+    concurrently. ``results`` is filled in once the writer has been closed.
+    """
+
+    def __init__(self, output_base, sr, channels, renditions):
+        self.renditions = renditions
+        self.results = None
+        self._writers = []
+        self._seconds = [0.0] * len(renditions)
+        self._suffixes = [rendition.output_suffix() for rendition in renditions]
+        self._base = claim_output_base(output_base, self._suffixes)
+        try:
+            for rendition in renditions:
+                self._writers.append(open_rendition(self._base, sr, channels, rendition))
+        except BaseException:
+            self.abort()
+            raise
+
+    def write(self, block):
+        """Write a block of shape (samples,) or (samples, channels) to every rendition"""
+        for index, (rendition, writer) in enumerate(zip(self.renditions, self._writers)):
+            start = time.perf_counter()
+            writer.write(remix(block, rendition.channels))
+            self._seconds[index] += time.perf_counter() - start
+
+    def close(self):
+        """Finish every file; if one fails the others are deleted as well"""
+        closed = []
+        try:
+            for index, writer in enumerate(self._writers):
+                start = time.perf_counter()
+                writer.close()
+                self._seconds[index] += time.perf_counter() - start
+                closed.append(writer)
+        except BaseException:
+            for writer in self._writers[len(closed) + 1:]:
+                writer.abort()
+            release_outputs(self._base, self._suffixes)
+            raise
+        self.results = [
+            RenditionResult(rendition, writer.output_file, seconds)
+            for rendition, writer, seconds in zip(self.renditions, self._writers, self._seconds)
+        ]
+
+    def abort(self):
+        """Stop every encoder and delete the partial outputs"""
+        for writer in self._writers:
+            writer.abort()
+        release_outputs(self._base, self._suffixes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
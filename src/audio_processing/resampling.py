@@ -0,0 +1,151 @@
+"""
+Block-wise polyphase resampling between the file, processing and output rates.
+
+The anti-aliasing filter of every rate pair is designed once and cached
+(``polyphase_filter``). ``resample_blocks`` resamples a stream of blocks
+with ``scipy.signal.resample_poly``: the stream is cut into chunks whose
+length is a multiple of the decimation factor, so every chunk maps to a
+whole number of output samples, and each chunk is filtered together with a
+few samples of its neighbours. The result is identical to resampling the
+whole signal at once while only one chunk is held in memory.
+"""
+import functools
+import math
+from fractions import Fraction
+import numpy as np
+import soundfile as sf
+from scipy.signal import firwin, resample_poly
+from src.audio_processing.blocks import WORK_BLOCK_SIZE, rechunk, split_blocks
+
+# Zero crossings of the windowed sinc on each side, and its Kaiser window
+FILTER_HALF_LENGTH = 16
+KAISER_BETA = 8.6
+
+# Cutoff relative to the lower of the two Nyquist frequencies
+CUTOFF = 0.95
+
+
+def resample_ratio(sr_in, sr_out):
+    """Interpolation and decimation factors (up, down) between two rates"""
+    ratio = Fraction(int(sr_out), int(sr_in))
+    return ratio.numerator, ratio.denominator
+
+
+@functools.lru_cache(maxsize=16)
+def polyphase_filter(up, down):
+    """Low-pass FIR of the polyphase resampler for a rate pair (cached per pair)"""
+    max_rate = max(up, down)
+    return firwin(2 * FILTER_HALF_LENGTH * max_rate + 1, CUTOFF / max_rate, window=('kaiser', KAISER_BETA))
+
+
+def output_length(n, sr_in, sr_out):
+    """Number of samples ``n`` input samples resample to"""
+    up, down = resample_ratio(sr_in, sr_out)
+    return -(-n * up // down)
+
+
+def resampled_shape(shape, sr_in, sr_out):
+    """Shape of a (samples,) or (channels, samples) signal after resampling"""
+    return tuple(shape[:-1]) + (output_length(shape[-1], sr_in, sr_out),)
+
+
+def resample_blocks(blocks, sr_in, sr_out, block_size=WORK_BLOCK_SIZE):
+    """
+    Resample a stream of float32 blocks from ``sr_in`` to ``sr_out``
+
+    Yields float32 blocks of about ``block_size`` input samples (one chunk
+    of latency); blocks are passed through untouched if the rates match.
+    """
+    if sr_in == sr_out:
+        yield from blocks
+        return
+
+    up, down = resample_ratio(sr_in, sr_out)
+    window = polyphase_filter(up, down)
+    # Input samples the filter reaches on each side, rounded up to whole decimation periods
+    context = math.ceil(math.ceil(len(window) / (2 * up) + 1) / down) * down
+    chunk_size = max(down, block_size // down * down)
+
+    def zeros(like, n):
+        return np.zeros(like.shape[:-1] + (n,), dtype=like.dtype)
+
+    def resample(segment):
+        return resample_poly(segment, up, down, axis=-1, window=window)
+
+    previous = None
+    pending = None
+    received = 0
+    emitted = 0
+    for chunk in rechunk(blocks, chunk_size):
+        if previous is None:
+            previous = zeros(chunk, context)
+        if pending is not None:
+            head = chunk[..., :context]
+            if head.shape[-1] < context:
+                head = np.concatenate([head, zeros(head, context - head.shape[-1])], axis=-1)
+            out = resample(np.concatenate([previous, pending, head], axis=-1))
+            count = pending.shape[-1] * up // down
+            start = context * up // down
+            previous = np.concatenate([previous, pending], axis=-1)[..., -context:]
+            emitted += count
+            yield out[..., start:start + count].astype(np.float32)
+        pending = chunk
+        received += chunk.shape[-1]
+
+    if pending is not None:
+        out = resample(np.concatenate([previous, pending, zeros(pending, context)], axis=-1))
+        count = -(-received * up // down) - emitted
+        start = context * up // down
+        yield out[..., start:start + count].astype(np.float32)
+
+
+def resample(y, sr_in, sr_out, block_size=WORK_BLOCK_SIZE, progress=None, out=None):
+    """
+    Resample a whole (samples,) or (channels, samples) signal block by block
+
+    Args:
+        progress (callable): Called with the finished fraction (0-1) after every block
+        out (np.ndarray): float32 array of the resampled shape the result is written to
+            (e.g. a memory-mapped scratch array, see ``resampled_shape``)
+
+    Returns:
+        np.ndarray: float32 signal at ``sr_out`` (``y`` itself if the rates match)
+    """
+    if sr_in == sr_out:
+        return y
+    n_out = output_length(y.shape[-1], sr_in, sr_out)
+    if out is None:
+        out = np.empty(resampled_shape(y.shape, sr_in, sr_out), dtype=np.float32)
+    done = 0
+    for block in resample_blocks(split_blocks(y, block_size), sr_in, sr_out, block_size):
+        out[..., done:done + block.shape[-1]] = block
+        done += block.shape[-1]
+        if progress:
+            progress(done / n_out)
+    return out
+
+
+def source_sample_rate(path):
+    """Sample rate of an audio file without decoding it"""
+    try:
+        return sf.info(path).samplerate
+    except Exception:
+        import librosa
+        return librosa.get_samplerate(path)
+
+
+def processing_rates(source_sr, settings):
+    """
+    Processing and output sample rates for a file at ``source_sr``
+
+    ``processing_rate`` in settings resamples on load (None keeps the file's
+    rate) and ``max_processing_rate`` only resamples files above that rate;
+    ``output_rate`` resamples the processed audio before it is normalized
+    and encoded (None keeps the processing rate).
+    """
+    processing_sr = int(settings.get('processing_rate') or source_sr)
+    max_sr = settings.get('max_processing_rate')
+    if max_sr and processing_sr > max_sr:
+        processing_sr = int(max_sr)
+    output_sr = int(settings.get('output_rate') or processing_sr)
+    return processing_sr, output_sr
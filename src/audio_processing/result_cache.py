@@ -0,0 +1,324 @@
+"""
+Persistent, content-addressed cache of processed outputs.
+
+A cache key is the SHA-256 of the input file's bytes, the normalized
+settings (defaults filled in, keys that do not change the output dropped,
+noise profiles replaced by a hash of their contents) and the processor
+version. Rendering the same episode with the same settings again returns
+the stored output instead of reprocessing it.
+
+Cached files live in their own directory next to an ``index.json`` that
+records the files (one per output rendition), size and last access time
+of every entry, so the cache survives restarts. When the total size exceeds
+``max_bytes`` the least recently used entries are deleted. Outputs handed
+to the caller are copies of the cached files, so evicting an entry never
+deletes a file the user was given and editing an output (e.g. its tags)
+never alters the cache.
+
+Several processes (e.g. the batch CLI's workers) can share one cache: every
+read-modify-write of the index holds an exclusive lock on ``index.lock``
+(``fcntl.flock``, ``msvcrt.locking`` on Windows) as well as a thread lock.
+Files that are in the directory but not in the index, e.g. left by a crash
+between copying a file and recording it, are deleted when a cache is opened.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from src.audio_processing.chain import compile_chain, settings_chain
+from src.audio_processing.chain_files import chain_path
+from src.audio_processing.loudness import DEFAULT_TRUE_PEAK_DB
+from src.audio_processing.renditions import (
+    ProcessingResult, Rendition, RenditionResult, claim_output_base, output_renditions, release_outputs
+)
+
+# Default size limit of the cache directory
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Settings keys whose value does not change the processed audio (beyond float rounding)
+IGNORED_SETTINGS = ('streaming', 'low_memory', 'scratch', 'denoise_workers', 'encode_workers')
+
+# Values process_audio uses for missing settings
+SETTING_DEFAULTS = {
+    'noise_reduction': 0.0,
+    'compression': 0.0,
+    'eq_preset': 'Stüdyo',
+    'codec': 'mp3',
+    'bitrate': '192k',
+    'compression_attack_ms': 0.0,
+    'compression_release_ms': 0.0,
+    'compression_knee': 0.0,
+    'compression_lookahead_ms': 0.0,
+    'skip_silence': False,
+    'trim_silence': False,
+}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_value(value):
+    """JSON-friendly, hash-stable form of a settings value"""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): normalize_value(item) for key, item in sorted(value.items())}
+    if hasattr(value, 'mean_db') and hasattr(value, 'std_db'):
+        # NoiseProfile instance
+        digest = hashlib.sha256()
+        for array in (np.asarray([value.sr, value.n_fft], dtype=np.float64), value.mean_db, value.std_db):
+            digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        return 'profile:' + digest.hexdigest()
+    return repr(value)
+
+
+def normalize_settings(settings):
+    """
+    Canonical form of a settings dict for cache keys
+
+    Missing keys take the defaults of process_audio, keys that only change
+    how the audio is processed (not the result) are dropped, disabled stages
+    lose their options (as does peak normalization the true-peak ceiling),
+    the noise profile is kept only if the chain that runs (settings['chain']
+    or the one the sliders describe) reduces noise,
+    noise profile and chain files are replaced by their hash and the codec
+    options by the full list of renditions.
+    """
+    normalized = dict(SETTING_DEFAULTS)
+    normalized.update({
+        key: value for key, value in settings.items()
+        if key not in IGNORED_SETTINGS and value is not None
+    })
+
+    if not compile_chain(settings_chain(normalized)).ops_of_kind('noise_reduction'):
+        normalized.pop('noise_profile', None)
+        normalized['skip_silence'] = False
+    if not normalized['noise_reduction'] or normalized['noise_reduction'] <= 0:
+        normalized['noise_reduction'] = 0.0
+        normalized['skip_silence'] = False
+    if not normalized['compression'] or normalized['compression'] <= 0:
+        normalized['compression'] = 0.0
+        for key in ('compression_attack_ms', 'compression_release_ms', 'compression_knee', 'compression_lookahead_ms'):
+            normalized.pop(key, None)
+
+    if normalized.get('loudness_target') is None:
+        normalized.pop('true_peak', None)
+    else:
+        normalized.setdefault('true_peak', DEFAULT_TRUE_PEAK_DB)
+
+    profile = normalized.get('noise_profile')
+    if isinstance(profile, str):
+        normalized['noise_profile'] = 'file:' + file_digest(profile)
+    chain = normalized.get('chain')
+    if isinstance(chain, str):
+        normalized['chain'] = 'file:' + file_digest(chain_path(chain))
+    normalized['renditions'] = [rendition.as_dict() for rendition in output_renditions(normalized)]
+    del normalized['codec'], normalized['bitrate']
+
+    return {key: normalize_value(value) for key, value in sorted(normalized.items())}
+
+
+class ResultCache:
+    """Size-bounded LRU cache of processed files, persisted in an index file"""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir (str): Directory holding the cached files and the index
+            max_bytes (int): Total size of cached files before LRU eviction
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.lock_path = os.path.join(cache_dir, LOCK_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.sweep()
+
+    def make_key(self, input_file, settings, version):
+        """Cache key of an input file processed with settings by a processor version"""
+        payload = json.dumps({
+            'input': file_digest(input_file),
+            'settings': normalize_settings(settings),
+            'version': str(version),
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key, output_base):
+        """
+        Return the cached outputs for ``key`` as new files next to ``output_base``
+
+        Args:
+            key (str): Key from ``make_key``
+            output_base (str): Output path without extension (a suffix is added if taken)
+
+        Returns:
+            ProcessingResult: The copied renditions, or None on a cache miss
+        """
+        with self._locked():
+            index = self._load_index()
+            entry = index.get(key)
+            if entry is None:
+                return None
+            # Entries written before renditions existed hold a bare 'file' and no metadata
+            renditions = entry.get('renditions')
+            if not renditions or not all(os.path.exists(os.path.join(self.cache_dir, item['file']))
+                                         for item in renditions):
+                self._remove_files(index.pop(key))
+                self._save_index(index)
+                return None
+
+            # The cached file name is the key followed by the rendition's label and extension
+            suffixes = [item['file'][len(key):] for item in renditions]
+            output_base = claim_output_base(output_base, suffixes)
+            results = []
+            try:
+                for item, suffix in zip(renditions, suffixes):
+                    output_file = output_base + suffix
+                    shutil.copyfile(os.path.join(self.cache_dir, item['file']), output_file)
+                    rendition = Rendition(item['codec'], item['bitrate'], item['channels'], item['label'])
+                    results.append(RenditionResult(rendition, output_file))
+            except BaseException:
+                release_outputs(output_base, suffixes)
+                raise
+
+            entry['last_access'] = time.time()
+            self._save_index(index)
+            return ProcessingResult(results, cached=True)
+
+    def put(self, key, result):
+        """Store copies of the files of a freshly processed ProcessingResult under ``key`` and evict old entries"""
+        renditions = []
+        with self._locked():
+            for rendition in result.renditions:
+                name = key + rendition.suffix
+                cached_file = os.path.join(self.cache_dir, name)
+                shutil.copyfile(rendition.output_file, cached_file)
+                renditions.append({
+                    'file': name,
+                    'codec': rendition.codec,
+                    'bitrate': rendition.bitrate,
+                    'channels': rendition.channels,
+                    'label': rendition.label,
+                    'size': os.path.getsize(cached_file),
+                })
+
+            index = self._load_index()
+            index[key] = {
+                'renditions': renditions,
+                'size': sum(item['size'] for item in renditions),
+                'last_access': time.time(),
+            }
+            self._evict(index)
+            self._save_index(index)
+
+    def clear(self):
+        """Delete every cached file and the index"""
+        with self._locked():
+            for entry in self._load_index().values():
+                self._remove_files(entry)
+            self._save_index({})
+
+    def total_bytes(self):
+        """Total size of the cached files"""
+        with self._locked():
+            return sum(entry['size'] for entry in self._load_index().values())
+
+    def sweep(self):
+        """Delete files of the cache directory that no index entry refers to"""
+        with self._locked():
+            known = {INDEX_FILE, LOCK_FILE}
+            for entry in self._load_index().values():
+                known.update(self._entry_files(entry))
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                # Subdirectories (the stage cache's spill files) are not the result cache's
+                if name not in known and os.path.isfile(path):
+                    os.remove(path)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the index against other threads and other processes sharing the directory"""
+        with self._lock:
+            with open(self.lock_path, 'a+b') as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                else:
+                    f.seek(0)
+                    while True:
+                        try:
+                            # Gives up after about 10 seconds of retrying; keep waiting
+                            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            pass
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    else:
+                        f.seek(0)
+                        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _evict(self, index):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            entry = index.pop(key)
+            self._remove_files(entry)
+            total -= entry['size']
+
+    @staticmethod
+    def _entry_files(entry):
+        return [item['file'] for item in entry['renditions']] if 'renditions' in entry else [entry['file']]
+
+    def _remove_files(self, entry):
+        for name in self._entry_files(entry):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _load_index(self):
+        # The index is re-read on every access (under the file lock) so several processes can share the cache
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def _save_index(self, index):
+        # Write to a temporary file and rename so a crash never leaves a truncated index
+        temp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.index_path)
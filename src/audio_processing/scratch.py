@@ -0,0 +1,91 @@
+"""
+Memory-mapped scratch storage for the signals of very long recordings.
+
+A 10 hour stereo live stream is almost 7 GB as float32, more than a small
+render machine has. In mapped mode the in-memory chain keeps its signal in
+``np.memmap`` arrays backed by files in a scratch directory instead: the
+stages already work block by block and in place (see low memory mode), so
+only the pages they touch are resident and the OS page cache evicts the
+rest under memory pressure.
+
+``ScratchSpace`` owns one private directory per job and deletes it when the
+job ends (or, at the latest, when the interpreter exits). ``use_mapped``
+decides between RAM and mapped mode from the decoded size of the input.
+"""
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+import soundfile as sf
+
+# Decoded (float32) size above which the signal is kept in mapped scratch files
+DEFAULT_MAPPED_THRESHOLD_BYTES = 2 * 1024 ** 3
+
+# Values of the 'scratch' setting
+SCRATCH_AUTO = 'auto'
+SCRATCH_MEMORY = 'memory'
+SCRATCH_MAPPED = 'mapped'
+
+
+def decoded_size(input_file, sr=None):
+    """
+    Estimated size in bytes of the file decoded to float32 (at ``sr`` if given)
+
+    Uses the header when soundfile can read the file, otherwise the duration
+    reported by librosa for a stereo signal.
+    """
+    try:
+        info = sf.info(input_file)
+        frames, channels, rate = info.frames, info.channels, info.samplerate
+    except Exception:
+        import librosa
+        rate = librosa.get_samplerate(input_file)
+        frames, channels = int(librosa.get_duration(path=input_file) * rate), 2
+    if sr:
+        frames = int(frames * sr / rate)
+    return frames * channels * np.dtype(np.float32).itemsize
+
+
+def use_mapped(input_file, settings, threshold_bytes=DEFAULT_MAPPED_THRESHOLD_BYTES, sr=None):
+    """Whether to process a file in mapped mode ('scratch' setting, or its decoded size when 'auto')"""
+    mode = settings.get('scratch', SCRATCH_AUTO)
+    if mode == SCRATCH_MAPPED:
+        return True
+    if mode == SCRATCH_MEMORY:
+        return False
+    return decoded_size(input_file, sr) > threshold_bytes
+
+
+class ScratchSpace:
+    """A private directory of memory-mapped arrays, removed on ``close``"""
+
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str): Where the scratch directory is created (default: the system temp directory)
+        """
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix='pse-scratch-', dir=directory)
+        self._count = 0
+        # Cleans up even if the job dies without closing the space
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+
+    def allocate(self, shape, dtype=np.float32):
+        """New zero-filled array of ``shape`` backed by a file in the scratch directory"""
+        self._count += 1
+        path = os.path.join(self.path, f"signal{self._count}.f32")
+        if int(np.prod(shape)) == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+
+    def close(self):
+        """Delete the scratch files (arrays still referencing them must not be used afterwards)"""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
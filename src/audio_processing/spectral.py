@@ -0,0 +1,95 @@
+"""
+STFT analysis/synthesis shared by the frequency-domain stages.
+
+The spectral gate works on STFT frames (Hann window of ``n_fft`` samples,
+hop of a quarter). Other frequency-domain stages can apply their per-bin
+gains to the same frames (see ``SpectralChain``), so noise reduction
+followed by a filter needs one analysis/synthesis pair instead of the
+gate's transform plus a convolution for the filter.
+
+``SpectralFilter`` turns a linear filter into such a stage: its frequency
+response sampled at the bin frequencies. Multiplying the frames by it is a
+circular convolution of every windowed frame, so after overlap-add the
+filter actually applied is the impulse response folded onto one frame and
+tapered by the autocorrelation of the window (``effective_response``). That
+is close to the FIR only when the response is short compared with a frame:
+``fits_frames`` accepts a filter whose magnitude response changes by at
+most ``SPECTRAL_FILTER_TOLERANCE_DB`` wherever it passes more than
+``RESPONSE_FLOOR`` of its peak. Low-pass filters and the broad presets
+(Özel, Parlak) fit 1024 sample frames; narrow low bands (Stüdyo, Derin) and
+high-pass filters ring much longer and stay FIR passes.
+"""
+import numpy as np
+from scipy.signal import get_window, istft, stft
+
+# Largest magnitude deviation (dB) a filter may get from being applied to the frames
+SPECTRAL_FILTER_TOLERANCE_DB = 0.5
+
+# Bins where the filter passes less than this share of its peak are not compared
+RESPONSE_FLOOR = 1e-2
+
+
+def stft_frames(y, n_fft):
+    """STFT of a segment, shape (n_fft // 2 + 1, frames), hop of n_fft / 4"""
+    hop = n_fft // 4
+    _, _, spectrum = stft(y, nfft=n_fft, noverlap=n_fft - hop, nperseg=n_fft, padded=False)
+    return spectrum
+
+
+def istft_frames(spectrum, n_fft, length, dtype=np.float32):
+    """Resynthesise ``stft_frames`` output into exactly ``length`` samples"""
+    _, y = istft(spectrum, nfft=n_fft, noverlap=n_fft - n_fft // 4, nperseg=n_fft)
+    out = np.zeros(length, dtype=dtype)
+    n = min(length, len(y))
+    out[:n] = y[:n]
+    return out
+
+
+def bin_response(impulse_response, n_fft):
+    """Frequency response of a filter at the STFT bin frequencies"""
+    # Evaluate on a grid that is a multiple of n_fft, so every bin frequency is on it
+    factor = -(-len(impulse_response) // n_fft)
+    return np.fft.rfft(impulse_response, n=factor * n_fft)[::factor]
+
+
+def effective_response(impulse_response, n_fft):
+    """
+    Impulse response that applying ``bin_response`` to the frames amounts to
+
+    Lags run from -(n_fft - 1) to n_fft - 1 (the part of the folded response
+    that lands before a frame's own samples acts as pre-ringing).
+    """
+    folded = np.zeros(-(-len(impulse_response) // n_fft) * n_fft)
+    folded[:len(impulse_response)] = impulse_response
+    folded = folded.reshape(-1, n_fft).sum(axis=0)
+
+    window = get_window('hann', n_fft)
+    taper = np.correlate(window, window, mode='full')
+    lags = np.arange(-(n_fft - 1), n_fft)
+    return folded[lags % n_fft] * taper / taper[n_fft - 1]
+
+
+def fits_frames(impulse_response, n_fft, tolerance_db=SPECTRAL_FILTER_TOLERANCE_DB):
+    """Whether a filter can be applied to STFT frames of ``n_fft`` without audibly changing its response"""
+    if len(impulse_response) == 1:
+        return True
+    effective = effective_response(impulse_response, n_fft)
+    size = 1 << int(np.ceil(np.log2(len(impulse_response) + 2 * n_fft)))
+    # Rotate lag 0 to the start of the grid so both responses share the same phase reference
+    achieved = np.abs(np.fft.rfft(np.roll(np.pad(effective, (0, size - len(effective))), 1 - n_fft)))
+    intended = np.abs(np.fft.rfft(impulse_response, n=size))
+    passed = intended > RESPONSE_FLOOR * intended.max()
+    deviation = 20 * np.log10(np.maximum(achieved[passed], 1e-12) / intended[passed])
+    return float(np.max(np.abs(deviation))) <= tolerance_db
+
+
+class SpectralFilter:
+    """A linear filter applied as per-bin gains to STFT frames"""
+
+    def __init__(self, impulse_response, n_fft):
+        self.n_fft = n_fft
+        self.response = bin_response(impulse_response, n_fft)[:, None]
+
+    def gains(self, spectrum):
+        """Gain per bin (the same for every frame)"""
+        return self.response
@@ -0,0 +1,361 @@
+"""
+Processing chain as a graph of stages with memoized outputs.
+
+Every stage of a ``StageGraph`` has a name, a function, the parameters that
+determine its output and the stages it reads from. Its cache key is the
+SHA-256 of its name and parameters together with the keys of its inputs;
+stages without inputs are keyed by the identity of the source file. A key
+therefore changes exactly when the stage or anything upstream of it would
+produce different output, and re-rendering a file after changing one
+setting only recomputes the stages downstream of that setting.
+
+``StageCache`` holds the memoized outputs: a size-bounded LRU in memory,
+optionally spilling evicted entries to a size-bounded directory on disk.
+Every cache spills into its own session subdirectory, so processes sharing
+a spill directory never touch each other's files.
+Memory is counted per buffer: an output that is a view of another one (the
+trimmed signal is a slice of its input) adds nothing while both are cached.
+It counts hits and misses (in total and per stage) and evictions; the
+processor reports them after every job (a 'stage_cache' summary event).
+"""
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+import numpy as np
+from src.audio_processing.result_cache import normalize_value
+
+# Default memory budget of the stage cache
+DEFAULT_MEMORY_BYTES = 1024 ** 3
+
+# Default size limit of the on-disk spill directory
+DEFAULT_SPILL_BYTES = 2 * 1024 ** 3
+
+SPILL_SUFFIX = '.stage'
+
+# Session subdirectories not modified for this long were left by a session that crashed
+STALE_SPILL_SECONDS = 24 * 3600
+
+
+def source_identity(path):
+    """Identity of an input file: path, size and modification time (cheap, no hashing)"""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def value_buffers(value):
+    """Arrays owning the memory of a stage output (a view counts as the array it looks into)"""
+    buffers = {}
+    if isinstance(value, np.ndarray):
+        while isinstance(value.base, np.ndarray):
+            value = value.base
+        buffers[id(value)] = value
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            buffers.update(value_buffers(item))
+    return buffers
+
+
+def value_nbytes(value):
+    """Memory held by a stage output (arrays, possibly inside tuples/lists), every buffer counted once"""
+    return sum(array.nbytes for array in value_buffers(value).values())
+
+
+def _freeze(value):
+    """Make the arrays of a cached output read-only, so no stage can alter the cache"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+    return value
+
+
+def _remove_stale_spills(spill_dir):
+    """Delete the session directories (and loose spill files) nobody has written to for a day"""
+    cutoff = time.time() - STALE_SPILL_SECONDS
+    for name in os.listdir(spill_dir):
+        path = os.path.join(spill_dir, name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            if os.path.isdir(path) and name.startswith('session-'):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name.endswith(SPILL_SUFFIX):
+                os.remove(path)
+        except OSError:
+            # Removed by another process in the meantime
+            pass
+
+
+class StageCache:
+    """LRU cache of stage outputs in memory, with optional spilling to disk"""
+
+    def __init__(self, max_bytes=DEFAULT_MEMORY_BYTES, spill_dir=None, spill_max_bytes=DEFAULT_SPILL_BYTES):
+        """
+        Args:
+            max_bytes (int): Memory held by cached outputs before LRU eviction
+            spill_dir (str): Directory evicted outputs are written to, in a subdirectory of this
+                cache's own (None: evicted outputs are dropped)
+            spill_max_bytes (int): Size limit of the spill directory (LRU as well)
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = None
+        self.spill_max_bytes = spill_max_bytes
+        self._memory = OrderedDict()  # key -> (value, buffer ids)
+        self._buffers = {}  # buffer id -> [array, number of cached outputs using it]
+        self._disk = OrderedDict()  # key -> file size
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.RLock()
+        self._stats = {'hits': 0, 'misses': 0, 'memory_hits': 0, 'disk_hits': 0, 'evictions': 0, 'spills': 0}
+        self._stage_stats = {}
+
+        if spill_dir is not None:
+            # Spilled outputs only live for one session: the session directory is removed with
+            # the cache (or at exit), and those of crashed sessions once they have gone stale
+            os.makedirs(spill_dir, exist_ok=True)
+            _remove_stale_spills(spill_dir)
+            self.spill_dir = tempfile.mkdtemp(prefix=f"session-{os.getpid()}-", dir=spill_dir)
+            weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get(self, key, stage=None):
+        """Cached output for ``key`` (disk entries are moved back to memory), or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._count(stage, 'hits', 'memory_hits')
+                return entry[0]
+
+            if key in self._disk:
+                value = self._read_spill(key)
+                if value is not None:
+                    self._count(stage, 'hits', 'disk_hits')
+                    self._store(key, _freeze(value))
+                    return value
+
+            self._count(stage, 'misses')
+            return None
+
+    def put(self, key, value):
+        """Memoize a stage output (its arrays become read-only)"""
+        with self._lock:
+            self._store(key, _freeze(value))
+
+    def clear(self):
+        """Drop every cached output, in memory and on disk"""
+        with self._lock:
+            for key in list(self._disk):
+                self._drop_spill(key)
+            self._memory.clear()
+            self._buffers.clear()
+            self._memory_bytes = 0
+
+    def stats(self):
+        """Hit/miss counters (in total and per stage) and the current cache sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'stages': {stage: dict(counts) for stage, counts in self._stage_stats.items()},
+            })
+            return stats
+
+    def _count(self, stage, *counters):
+        for counter in counters:
+            self._stats[counter] += 1
+        if stage is not None:
+            counts = self._stage_stats.setdefault(stage, {'hits': 0, 'misses': 0})
+            counts[counters[0]] += 1
+
+    def _store(self, key, value):
+        buffers = value_buffers(value)
+        if key in self._memory:
+            self._release(self._memory.pop(key)[1])
+        if key in self._disk:
+            self._drop_spill(key)
+        if sum(array.nbytes for array in buffers.values()) > self.max_bytes:
+            # Larger than the whole memory budget: straight to disk (if spilling)
+            self._spill(key, value)
+            return
+        for buffer_id, array in buffers.items():
+            entry = self._buffers.setdefault(buffer_id, [array, 0])
+            if entry[1] == 0:
+                self._memory_bytes += array.nbytes
+            entry[1] += 1
+        self._memory[key] = (value, list(buffers))
+        while self._memory_bytes > self.max_bytes:
+            old_key, (old_value, old_buffers) = self._memory.popitem(last=False)
+            self._release(old_buffers)
+            self._stats['evictions'] += 1
+            self._spill(old_key, old_value)
+
+    def _release(self, buffer_ids):
+        """Drop one use of each buffer; memory is freed with the last output using it"""
+        for buffer_id in buffer_ids:
+            entry = self._buffers[buffer_id]
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._memory_bytes -= entry[0].nbytes
+                del self._buffers[buffer_id]
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, key + SPILL_SUFFIX)
+
+    def _spill(self, key, value):
+        if self.spill_dir is None:
+            return
+        path = self._spill_path(key)
+        try:
+            with open(path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            return
+        self._disk[key] = os.path.getsize(path)
+        self._disk_bytes += self._disk[key]
+        self._stats['spills'] += 1
+        while self._disk_bytes > self.spill_max_bytes and self._disk:
+            self._drop_spill(next(iter(self._disk)))
+            self._stats['evictions'] += 1
+
+    def _read_spill(self, key):
+        try:
+            with open(self._spill_path(key), 'rb') as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            value = None
+        self._drop_spill(key)
+        return value
+
+    def _drop_spill(self, key):
+        self._disk_bytes -= self._disk.pop(key)
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class Stage:
+    """One node of a StageGraph"""
+
+    def __init__(self, name, func, params=None, inputs=(), memoize=True):
+        """
+        Args:
+            name (str): Stage name (also used in cache statistics and instrumentation)
+            func (callable): Called with the outputs of ``inputs`` in order; returns the stage output
+            params (dict): Everything besides the inputs that determines the output
+            inputs (sequence): Names of the stages whose outputs ``func`` reads
+            memoize (bool): Keep the output in the cache (cheap, final stages need not)
+        """
+        self.name = name
+        self.func = func
+        self.params = params or {}
+        self.inputs = tuple(inputs)
+        self.memoize = memoize
+
+
+class StageGraph:
+    """Stages of one render of one source, evaluated with memoized intermediates"""
+
+    def __init__(self, source_id, cache=None):
+        """
+        Args:
+            source_id (str): Identity of the input (see ``source_identity``), part of every key
+            cache (StageCache): Where outputs are memoized (None: everything is computed)
+        """
+        self.source_id = source_id
+        self.cache = cache
+        self.stages = {}
+        self._keys = {}
+
+    def add(self, name, func, params=None, inputs=(), memoize=True):
+        """Add a stage reading from already added stages; returns its name"""
+        for upstream in inputs:
+            if upstream not in self.stages:
+                raise ValueError(f"Stage '{name}' reads from unknown stage '{upstream}'")
+        self.stages[name] = Stage(name, func, params, inputs, memoize)
+        return name
+
+    @property
+    def output(self):
+        """Name of the last added stage"""
+        return next(reversed(self.stages))
+
+    def key(self, name):
+        """Cache key of a stage's output"""
+        if name not in self._keys:
+            stage = self.stages[name]
+            payload = json.dumps({
+                'stage': name,
+                'params': normalize_value(stage.params),
+                'inputs': [self.key(upstream) for upstream in stage.inputs] or [self.source_id],
+            }, sort_keys=True, ensure_ascii=False)
+            self._keys[name] = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        return self._keys[name]
+
+    def plan(self, target):
+        """Names of the stages that have to run to produce ``target``, in execution order"""
+        order = []
+        seen = set()
+
+        def visit(name):
+            if name in seen:
+                return
+            seen.add(name)
+            stage = self.stages[name]
+            if stage.memoize and self.cache is not None and self.cache.contains(self.key(name)):
+                return
+            for upstream in stage.inputs:
+                visit(upstream)
+            order.append(name)
+
+        visit(target)
+        return order
+
+    def evaluate(self, target, run=None, on_hit=None):
+        """
+        Output of ``target``, computing only the stages whose outputs are not cached
+
+        Args:
+            run (callable): ``run(stage, inputs)`` computes a stage (default: ``stage.func(*inputs)``),
+                e.g. to wrap it in progress and instrumentation
+            on_hit (callable): ``on_hit(stage, value, seconds)`` for every output taken from the cache
+        """
+        if run is None:
+            run = lambda stage, inputs: stage.func(*inputs)
+        values = {}
+
+        def value(name):
+            if name in values:
+                return values[name]
+            stage = self.stages[name]
+            memoized = stage.memoize and self.cache is not None
+            if memoized:
+                started = time.perf_counter()
+                cached = self.cache.get(self.key(name), stage=name)
+                if cached is not None:
+                    if on_hit:
+                        on_hit(stage, cached, time.perf_counter() - started)
+                    values[name] = cached
+                    return cached
+
+            result = run(stage, [value(upstream) for upstream in stage.inputs])
+            if memoized:
+                self.cache.put(self.key(name), result)
+            values[name] = result
+            return result
+
+        return value(target)
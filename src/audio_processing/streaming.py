@@ -0,0 +1,251 @@
+"""
+Bounded-memory, block-wise version of the processing chain.
+
+The file is read in blocks with ``soundfile.blocks`` and pushed through a
+chain of generators (one per compiled chain op: noise reduction, fused
+filters, pointwise stages, compression), each of which keeps its own state
+across block boundaries. Multichannel files are processed as
+(channels, samples) blocks:
+
+- noise reduction processes every block together with ``context`` samples
+  of audio on both sides and keeps only the middle. Block and context sizes
+  match the chunking ``SpectralGate.apply`` uses, so the STFT frames and
+  mask smoothing see exactly the same data as in the in-memory chain
+  (including a filter joined to the gate's frames, see ``CompiledChain.passes``);
+- the EQ carries its overlap-add convolution tail (see ``EqStream``);
+- the compressor carries its envelope and lookahead delay.
+
+The processed blocks are written to a float RF64 scratch file (no 4 GiB
+limit, so multi-hour multitrack recordings fit) while the peak (or,
+with a loudness target, the integrated loudness) is measured, and a second
+cheap pass scales the scratch file straight into the output encoder, through
+the true-peak limiter when normalizing loudness.
+That statistics pass is the only step that needs the whole episode, so the
+peak memory depends on the block size, not on the length of the recording.
+"""
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+from src.audio_processing.blocks import read_blocks, rechunk
+from src.audio_processing.loudness import LoudnessMeter, TruePeakLimiter, loudness_gain
+from src.audio_processing.noise_profile import (
+    BLOCK_SIZE, CONTEXT_SIZE, MultichannelGate, NoiseProfile, SpectralGate, single_pass_amount
+)
+from src.audio_processing.resampling import output_length, processing_rates, resample_blocks
+from src.utils.instrumentation import Instrumentation, ProgressTracker, StreamStageTimer
+
+
+def can_stream(input_file):
+    """Whether soundfile can read the file block by block"""
+    try:
+        sf.info(input_file)
+        return True
+    except Exception:
+        return False
+
+
+def compress_blocks(blocks, compressor, sr):
+    """Run a stateful compressor over blocks, removing its lookahead latency"""
+    compressor.reset()
+    latency = compressor.latency(sr)
+    to_skip = latency
+    shape = None
+
+    for block in blocks:
+        shape = block.shape[:-1]
+        out = compressor.process(block, sr)
+        if to_skip:
+            skipped = min(to_skip, out.shape[-1])
+            out = out[..., skipped:]
+            to_skip -= skipped
+        if out.shape[-1]:
+            yield out
+
+    if latency and shape is not None:
+        # Flush the samples still held in the lookahead delay
+        yield compressor.process(np.zeros(shape + (latency,), dtype=np.float32), sr)[..., to_skip:]
+
+
+class StreamingPipeline:
+    """Runs the AudioProcessor chain block by block with bounded memory"""
+
+    def __init__(self, processor, block_size=BLOCK_SIZE, context_size=CONTEXT_SIZE):
+        self.processor = processor
+        self.block_size = block_size
+        self.context_size = context_size
+
+    def run(self, input_file, settings, writer, progress_callback=None, instrumentation=None, cancel_event=None):
+        """
+        Process ``input_file`` block by block into ``writer``
+
+        Args:
+            input_file (str): Path to an input file readable by soundfile
+            settings (dict): Same settings as AudioProcessor.process_audio
+            writer: Output writer with a ``write(block)`` method (see renditions.RenditionWriter)
+            progress_callback (callable): Function to call with progress updates (0-100)
+            instrumentation (Instrumentation): Receives the stage events (optional)
+            cancel_event (threading.Event): Stops the job with JobCancelled between blocks when set
+        """
+        if instrumentation is None:
+            instrumentation = Instrumentation(job=os.path.basename(input_file))
+
+        info = sf.info(input_file)
+        sr = info.samplerate
+        channels = info.channels
+        total_frames = max(1, info.frames)
+        processing_sr, output_sr = processing_rates(sr, settings)
+        output_frames = max(1, output_length(info.frames, sr, output_sr))
+        block_size = self.block_size
+        chain = self.processor.compile_chain(settings)
+        denoise = bool(chain.ops_of_kind('noise_reduction'))
+        profile = self.processor.resolve_noise_profile(settings) if denoise else None
+        scan_profile = denoise and profile is None
+
+        # The chain stages run interleaved, so the first pass is one progress stage
+        chain_stages = ['load'] + [op.name for op in chain.ops if op.kind != 'normalize']
+        if processing_sr != sr:
+            chain_stages.append('resample')
+        if output_sr != processing_sr:
+            chain_stages.append('output_resample')
+        cost = self.processor.stage_cost
+        planned = [('noise_profile', cost('noise_profile'))] if scan_profile else []
+        planned.append(('process', sum(cost(stage) or 0.0 for stage in chain_stages)))
+        planned.append(('encode', cost('normalize') + cost('encode')))
+        progress = ProgressTracker(planned, progress_callback, cancel_event)
+
+        normalize = chain.normalize_options()
+        meter = None
+        if normalize is not None and normalize['loudness_target'] is not None:
+            meter = LoudnessMeter(output_sr, channels)
+
+        if scan_profile:
+            progress.begin('noise_profile')
+            with instrumentation.stage('noise_profile', info.frames):
+                profile = self._scan_profile(input_file, channels)
+
+        blocks, timers = self._chain(input_file, sr, channels, block_size, settings, profile)
+
+        # First pass: process into a float scratch file and collect the peak and loudness
+        # (RF64: a plain RIFF WAV stops at 4 GiB, about 3 hours of 32-bit stereo)
+        scratch_dir = self.processor.scratch_dir or self.processor.output_dir
+        fd, scratch_file = tempfile.mkstemp(suffix='.rf64', dir=scratch_dir)
+        os.close(fd)
+        try:
+            progress.begin('process')
+            peak = 0.0
+            with instrumentation.stage('process') as stage:
+                with sf.SoundFile(scratch_file, 'w', samplerate=output_sr, channels=channels,
+                                  format='RF64', subtype='FLOAT') as scratch:
+                    for block in blocks:
+                        scratch.write(block.T)
+                        if block.size:
+                            peak = max(peak, float(np.max(np.abs(block))))
+                        if meter is not None:
+                            meter.process(block)
+                        progress.update(timers[0].samples / total_frames)
+                stage['samples'] = timers[-1].samples
+            for timer in timers:
+                instrumentation.record(timer.name, timer.exclusive_wall_seconds, timer.exclusive_cpu_seconds, timer.samples)
+
+            # Second pass: apply the normalization gain while feeding the encoder
+            progress.begin('encode')
+            if meter is not None:
+                gain = loudness_gain(meter.integrated(), normalize['loudness_target'])
+            elif normalize is not None and peak > 0:
+                gain = normalize['peak'] / peak
+            else:
+                gain = 1.0
+            with instrumentation.stage('encode') as stage:
+                # Blocks of (samples,) or (channels, samples), like the chain
+                blocks = (
+                    block.T * np.float32(gain)
+                    for block in sf.blocks(scratch_file, blocksize=block_size, dtype='float32')
+                )
+                if meter is not None:
+                    blocks = TruePeakLimiter(output_sr, normalize['true_peak']).process_blocks(blocks)
+                written = 0
+                for block in blocks:
+                    writer.write(block.T)
+                    written += block.shape[-1]
+                    progress.update(written / output_frames)
+                stage['samples'] = written
+        finally:
+            os.remove(scratch_file)
+
+        progress.finish()
+
+    def _chain(self, input_file, sr, channels, block_size, settings, profile=None):
+        """Build the generator chain for the enabled stages, reading ``input_file``"""
+        return self.chain(read_blocks(input_file, block_size), sr, channels, settings, profile)
+
+    def chain(self, source, sr, channels, settings, profile=None):
+        """
+        Build the generator chain of the compiled chain's ops over any block source
+
+        The final normalization is left to ``run`` (it needs the whole signal).
+        Trimming silence needs the whole file too: process_audio does not stream
+        such chains, and previews play their region untrimmed.
+
+        Args:
+            source: Iterable of float32 blocks, (samples,) or (channels, samples)
+            sr (int): Sample rate of the source; the chain yields blocks at the output rate
+                of ``processing_rates(sr, settings)``
+            profile: NoiseProfile (or one per channel), required when noise reduction is enabled
+
+        Returns:
+            tuple: (final block generator, StreamStageTimer of every stage in chain order)
+        """
+        timers = [StreamStageTimer('load')]
+        blocks = timers[-1].wrap(source)
+
+        def add_stage(name, stage_blocks):
+            timers.append(StreamStageTimer(name, upstream=timers[-1]))
+            return timers[-1].wrap(stage_blocks)
+
+        processing_sr, output_sr = processing_rates(sr, settings)
+        if processing_sr != sr:
+            # Back to full blocks, so the gate sees the same blocks as in the in-memory chain
+            resampled = resample_blocks(blocks, sr, processing_sr, self.block_size)
+            blocks = add_stage('resample', rechunk(resampled, self.block_size))
+            sr = processing_sr
+
+        for ops in self.processor.compile_chain(settings).passes(sr):
+            op = ops[0]
+            if op.kind == 'noise_reduction':
+                # Filters joined to the gate are applied to its STFT frames
+                spectral = [fused.spectral_filter(sr) for fused in ops[1:]]
+                blocks = add_stage(
+                    '+'.join(fused.name for fused in ops),
+                    self._denoise(blocks, sr, op.stage['amount'], channels, profile, spectral)
+                )
+            elif op.kind == 'filter':
+                eq_stream = op.linear_filter(sr).stream()
+                blocks = add_stage(op.name, (eq_stream.process(block) for block in blocks))
+            elif op.kind == 'pointwise':
+                blocks = add_stage(op.name, map(op.pointwise(), blocks))
+            elif op.kind == 'compression':
+                blocks = add_stage(op.name, compress_blocks(blocks, op.compressor(), sr))
+
+        if output_sr != sr:
+            blocks = add_stage('output_resample', resample_blocks(blocks, sr, output_sr, self.block_size))
+
+        return blocks, timers
+
+    def _scan_profile(self, input_file, channels):
+        """Noise profile from a cheap scan of the file (one per channel for multichannel files)"""
+        if channels == 1:
+            return NoiseProfile.from_file_scan(input_file)
+        return NoiseProfile.channels_from_file_scan(input_file)
+
+    def _denoise(self, blocks, sr, amount, channels, profile, spectral_stages=()):
+        """Single-pass noise reduction against a profile (one per channel, or shared)"""
+        amount = single_pass_amount(amount)
+        if channels == 1:
+            gate = SpectralGate(profile, sr, amount)
+        else:
+            profiles = profile if isinstance(profile, list) else [profile] * channels
+            gate = MultichannelGate.from_profiles(profiles, sr, amount)
+        if spectral_stages:
+            gate = gate.then(*spectral_stages)
+        return gate.process_blocks(blocks, self.context_size)
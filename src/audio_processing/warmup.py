@@ -0,0 +1,63 @@
+"""
+Background warm-up of the processing stack.
+
+Importing scipy.signal, librosa and numba takes more than a second, which is
+too long to block the window from appearing. The UI imports nothing from the
+processing package at start-up; ``ProcessorWarmup`` loads it on a background
+thread while the user picks a file and keeps one warmed-up AudioProcessor
+that every job reuses.
+"""
+import threading
+import time
+
+
+class ProcessorWarmup:
+    """Loads and warms up a shared AudioProcessor on a background thread"""
+
+    def __init__(self):
+        self.seconds = None
+        self._processor = None
+        self._error = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start warming up (does nothing if already started)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return self
+
+    @property
+    def ready(self):
+        """True once the processor is available (or warm-up has failed)"""
+        return self._ready.is_set()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            from src.audio_processing.processor import AudioProcessor
+            processor = AudioProcessor()
+            processor.warm_up()
+            self._processor = processor
+        except Exception as e:
+            self._error = e
+        finally:
+            self.seconds = time.perf_counter() - start
+            self._ready.set()
+
+    def get_processor(self, timeout=None):
+        """
+        Return the warmed-up processor, waiting for the warm-up if necessary
+
+        If warm-up failed, a fresh AudioProcessor is created so the job can
+        still run (and report the real error if the import itself is broken).
+        """
+        self.start()
+        self._ready.wait(timeout)
+        if self._processor is None:
+            from src.audio_processing.processor import AudioProcessor
+            self._processor = AudioProcessor()
+        return self._processor
@@ -0,0 +1,342 @@
+"""
+Headless batch processing.
+
+Expands files, directories and glob patterns into a job list and processes
+them on a pool of worker processes, each of which owns one AudioProcessor.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.ogg', '.flac', '.m4a')
+
+# AudioProcessor owned by the current worker process
+_processor = None
+
+# Stage event log, cProfile output directory and memory tracing of the current worker process
+_events_sink = None
+_profile_dir = None
+_trace_memory = False
+
+
+def collect_inputs(patterns):
+    """
+    Expand files, directories and glob patterns into a sorted list of audio files
+
+    Args:
+        patterns (list): Paths, directories or glob patterns
+
+    Returns:
+        list: Unique audio file paths in a stable order
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        elif os.path.isfile(pattern):
+            files.append(pattern)
+        else:
+            files.extend(sorted(glob.glob(pattern, recursive=True)))
+
+    seen = set()
+    result = []
+    for path in files:
+        path = os.path.abspath(path)
+        if path in seen or not path.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        seen.add(path)
+        result.append(path)
+    return result
+
+
+def audio_duration(path):
+    """Duration of an audio file in seconds, or None if it cannot be determined"""
+    try:
+        import soundfile as sf
+        return sf.info(path).duration
+    except Exception:
+        pass
+    try:
+        import librosa
+        return librosa.get_duration(path=path)
+    except Exception:
+        return None
+
+
+def _init_worker(output_dir, events_log=None, profile_dir=None, cache=True, cache_max_bytes=None,
+                 trace_memory=False, scratch_dir=None, mapped_threshold_bytes=None):
+    """Create the AudioProcessor (and the stage event sink) once per worker process"""
+    global _processor, _events_sink, _profile_dir, _trace_memory
+    from src.audio_processing.processor import AudioProcessor
+    from src.audio_processing.result_cache import DEFAULT_MAX_BYTES
+    from src.audio_processing.scratch import DEFAULT_MAPPED_THRESHOLD_BYTES
+    from src.utils.instrumentation import JsonLinesSink
+    # Every file is rendered once, so intermediate stage outputs are not worth keeping
+    _processor = AudioProcessor(
+        output_dir=output_dir, cache=cache, cache_max_bytes=cache_max_bytes or DEFAULT_MAX_BYTES, stage_cache=False,
+        scratch_dir=scratch_dir, mapped_threshold_bytes=mapped_threshold_bytes or DEFAULT_MAPPED_THRESHOLD_BYTES
+    )
+    _events_sink = JsonLinesSink(events_log) if events_log else None
+    _profile_dir = profile_dir
+    _trace_memory = trace_memory
+
+
+def _instrumentation(input_file):
+    """Instrumentation for one job, writing to the worker's event log and profile directory"""
+    from src.utils.instrumentation import CProfileHook, Instrumentation
+    profiler = None
+    if _profile_dir:
+        # Equally named inputs from different folders must not overwrite each other's dump
+        name = os.path.splitext(os.path.basename(input_file))[0]
+        tag = hashlib.sha256(os.path.abspath(input_file).encode('utf-8')).hexdigest()[:8]
+        profiler = CProfileHook(os.path.join(_profile_dir, f"{name}-{tag}.prof"))
+    sinks = [_events_sink] if _events_sink else []
+    return Instrumentation(sinks, job=input_file, profiler=profiler, trace_memory=_trace_memory)
+
+
+def _run_job(input_file, settings):
+    """Process one file in a worker; never raises so the batch keeps going"""
+    start = time.perf_counter()
+    try:
+        result = _processor.process_audio(input_file, settings, instrumentation=_instrumentation(input_file))
+        error = None
+    except Exception as e:
+        result = None
+        error = str(e)
+    return {
+        'input': input_file,
+        'output': result.output_file if result else None,
+        'renditions': [rendition.as_dict() for rendition in result.renditions] if result else [],
+        'error': error,
+        'seconds': time.perf_counter() - start,
+        'duration': audio_duration(input_file),
+    }
+
+
+def run_batch(files, settings, workers=None, output_dir=None, out=sys.stdout, events_log=None, profile_dir=None,
+              cache=True, cache_max_bytes=None, trace_memory=False, scratch_dir=None, mapped_threshold_bytes=None):
+    """
+    Process files in parallel and print per-file timings and a summary
+
+    Args:
+        files (list): Input audio files
+        settings (dict): Processing settings passed to AudioProcessor.process_audio
+        workers (int): Number of worker processes (defaults to the CPU count)
+        output_dir (str): Directory for the processed files
+        out: Stream the report is written to
+        events_log (str): Append per-stage events of every job to this JSON lines file
+        profile_dir (str): Write a cProfile dump of every job to this directory
+        cache (bool): Reuse earlier outputs of the same input and settings
+        cache_max_bytes (int): Size limit of the result cache
+        trace_memory (bool): Add tracemalloc peak memory per stage to the events
+        scratch_dir (str): Directory for the memory-mapped scratch files of large inputs
+        mapped_threshold_bytes (int): Decoded size above which inputs are processed in scratch files
+
+    Returns:
+        list: One result dict per file, in completion order
+    """
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(files)))
+    results = []
+    names = Counter(os.path.basename(path) for path in files)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(output_dir, events_log, profile_dir, cache, cache_max_bytes, trace_memory, scratch_dir, mapped_threshold_bytes)) as pool:
+        futures = [pool.submit(_run_job, path, settings) for path in files]
+        for index, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            name = os.path.basename(result['input'])
+            if names[name] > 1:
+                # Outputs of equally named inputs only differ by a suffix, so show the full input path
+                name = result['input']
+            if result['error']:
+                print(f"[{index}/{len(files)}] FAILED {name} after {result['seconds']:.2f}s: {result['error']}", file=out)
+            else:
+                speed = ''
+                if result['duration']:
+                    speed = f" ({result['duration'] / result['seconds']:.1f}x realtime)"
+                print(f"[{index}/{len(files)}] {name} -> {result['output']} in {result['seconds']:.2f}s{speed}", file=out)
+                if len(result['renditions']) > 1:
+                    for rendition in result['renditions']:
+                        print(f"    {os.path.basename(rendition['output_file'])}: "
+                              f"{rendition['size'] / 1024 ** 2:.1f} MB, encoded in {rendition['seconds']:.2f}s", file=out)
+    wall = time.perf_counter() - start
+
+    ok = [r for r in results if not r['error']]
+    audio_seconds = sum(r['duration'] or 0.0 for r in ok)
+    print(f"\nProcessed {len(ok)}/{len(results)} files with {workers} workers in {wall:.2f}s", file=out)
+    if wall > 0:
+        print(f"Throughput: {len(ok) / wall * 60:.1f} files/min, "
+              f"{audio_seconds / 60:.1f} min of audio ({audio_seconds / wall:.1f}x realtime)", file=out)
+
+    return results
+
+
+def _estimate_profile(path):
+    """Noise profile from the quietest region of a file"""
+    from src.audio_processing.noise_profile import NoiseProfile
+    try:
+        return NoiseProfile.from_file_scan(path)
+    except Exception:
+        import librosa
+        y, sr = librosa.load(path, sr=None)
+        return NoiseProfile.from_signal(y, sr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='cli.py',
+        description='Process podcast recordings without the GUI.'
+    )
+    parser.add_argument('inputs', nargs='+', help='Audio files, directories or glob patterns')
+    parser.add_argument('--noise-reduction', type=float, default=0.5, help='Noise reduction amount 0-1 (default: 0.5)')
+    parser.add_argument('--compression', type=float, default=0.5, help='Compression amount 0-1 (default: 0.5)')
+    parser.add_argument('--eq-preset', default='Stüdyo', help='EQ preset (Stüdyo, Doğal, Sıcak, Parlak, Derin, Özel)')
+    parser.add_argument('--chain', default=None,
+                        help='Processing chain preset (.json or .toml) used instead of the stage options above')
+    parser.add_argument('--loudness', type=float, default=None,
+                        help='Normalize to this integrated loudness in LUFS, e.g. -16 (default: peak normalization)')
+    parser.add_argument('--true-peak', type=float, default=-1.0,
+                        help='True-peak ceiling in dBTP when normalizing loudness (default: -1)')
+    parser.add_argument('--processing-rate', type=int, default=None,
+                        help='Resample every file to this rate before processing (default: keep the file rate)')
+    parser.add_argument('--max-processing-rate', type=int, default=None,
+                        help='Only resample files above this rate, e.g. 48000 for 96 kHz uploads')
+    parser.add_argument('--output-rate', type=int, default=None,
+                        help='Sample rate of the output files (default: the processing rate)')
+    parser.add_argument('--skip-silence', action='store_true',
+                        help='Run noise reduction only where there is speech and attenuate the pauses')
+    parser.add_argument('--trim-silence', action='store_true', help='Cut leading and trailing silence')
+    parser.add_argument('--denoise-workers', type=int, default=1,
+                        help='Worker processes gating the blocks of one file in parallel (0 = CPU count, default: 1)')
+    parser.add_argument('--rendition', action='append', default=None, metavar='CODEC[:BITRATE][:mono]',
+                        help='Output rendition, repeat for several files from one processing run, '
+                             'e.g. --rendition mp3:128k --rendition opus:64k:mono --rendition flac')
+    parser.add_argument('--encode-workers', type=int, default=None,
+                        help='Renditions encoded at the same time (default: CPU count)')
+    parser.add_argument('--streaming', action='store_true', help='Process block by block with bounded memory')
+    parser.add_argument('--low-memory', action='store_true',
+                        help='Keep the whole file in memory as float32 and process it in place')
+    parser.add_argument('--scratch', choices=('auto', 'memory', 'mapped'), default='auto',
+                        help='Keep the signal in RAM or in memory-mapped scratch files '
+                             '(default: auto, mapped above --mapped-threshold)')
+    parser.add_argument('--scratch-dir', default=None,
+                        help='Directory for scratch files (default: the system temp directory)')
+    parser.add_argument('--mapped-threshold', type=float, default=None,
+                        help='Decoded size in MB above which --scratch auto uses scratch files (default: 2048)')
+    parser.add_argument('--noise-profile', default=None,
+                        help='Saved noise profile (.npz) or a room-tone audio clip to estimate one from')
+    parser.add_argument('--save-noise-profile', default=None,
+                        help='Save a noise profile to a .npz file for later episodes: the --noise-profile, or '
+                             'else one estimated from the first input. Only saved; every file keeps its own '
+                             'noise estimate unless --apply-saved-profile is given')
+    parser.add_argument('--apply-saved-profile', action='store_true',
+                        help='Also denoise every file of this batch with the profile from --save-noise-profile')
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--output-dir', default=None, help='Directory for processed files (default: ./output)')
+    parser.add_argument('--events-log', default=None,
+                        help='Append per-stage timing and memory events to this JSON lines file')
+    parser.add_argument('--profile-dir', default=None, help='Write a cProfile dump (<name>-<path hash>.prof) of every job here')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Add the peak traced memory of every stage to --events-log (slower)')
+    parser.add_argument('--no-cache', action='store_true', help='Always reprocess, even if the result is cached')
+    parser.add_argument('--cache-size', type=float, default=None, help='Result cache size limit in MB (default: 2048)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        print('No audio files found.', file=sys.stderr)
+        return 2
+    names = Counter(os.path.basename(path) for path in files)
+    shared = sorted(name for name, count in names.items() if count > 1)
+    if shared:
+        print(f"Several inputs are named {', '.join(shared)}; outputs finished in the same second get "
+              f"a -2, -3... suffix, the report lists the input of each output", file=sys.stderr)
+
+    settings = {
+        'noise_reduction': args.noise_reduction,
+        'compression': args.compression,
+        'eq_preset': args.eq_preset,
+        'loudness_target': args.loudness,
+        'true_peak': args.true_peak,
+        'processing_rate': args.processing_rate,
+        'max_processing_rate': args.max_processing_rate,
+        'output_rate': args.output_rate,
+        'skip_silence': args.skip_silence,
+        'trim_silence': args.trim_silence,
+        'denoise_workers': args.denoise_workers,
+        'encode_workers': args.encode_workers,
+        'streaming': args.streaming,
+        'low_memory': args.low_memory,
+        'scratch': args.scratch,
+    }
+
+    if args.rendition:
+        from src.audio_processing.renditions import output_renditions, parse_rendition
+        settings['renditions'] = [parse_rendition(text) for text in args.rendition]
+        try:
+            output_renditions(settings)
+        except ValueError as e:
+            print(f"Invalid rendition: {e}", file=sys.stderr)
+            return 2
+
+    if args.chain:
+        from src.audio_processing.chain import ChainError, compile_chain
+        try:
+            chain = compile_chain(args.chain)
+        except ChainError as e:
+            print(f"Invalid chain: {e}", file=sys.stderr)
+            return 2
+        settings['chain'] = args.chain
+        print(f"Chain {chain.name}: {len(chain.stages)} stages in {len(chain.ops)} passes")
+        print(chain.describe())
+
+    if args.noise_profile:
+        settings['noise_profile'] = args.noise_profile
+    if args.apply_saved_profile and not args.save_noise_profile:
+        print('--apply-saved-profile needs --save-noise-profile', file=sys.stderr)
+        return 2
+
+    # Saving a profile does not change this batch: files estimated from their own noise keep doing
+    # so, unless the saved profile is explicitly shared with every job
+    if args.save_noise_profile:
+        from src.audio_processing.noise_profile import NoiseProfile
+        if args.noise_profile:
+            profile = NoiseProfile.load(args.noise_profile)
+            source = args.noise_profile
+        else:
+            profile = _estimate_profile(files[0])
+            source = files[0]
+        saved = profile.save(args.save_noise_profile)
+        print(f"Noise profile of {source} saved to {saved}")
+        if args.apply_saved_profile:
+            settings['noise_profile'] = saved
+            print('Every file is denoised with this profile')
+
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+
+    results = run_batch(
+        files, settings,
+        workers=args.workers,
+        output_dir=args.output_dir,
+        events_log=args.events_log,
+        profile_dir=args.profile_dir,
+        cache=not args.no_cache,
+        cache_max_bytes=int(args.cache_size * 1024 ** 2) if args.cache_size else None,
+        trace_memory=args.trace_memory,
+        scratch_dir=args.scratch_dir,
+        mapped_threshold_bytes=int(args.mapped_threshold * 1024 ** 2) if args.mapped_threshold else None
+    )
+    return 1 if any(r['error'] for r in results) else 0
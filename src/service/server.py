@@ -0,0 +1,561 @@
+"""
+Local HTTP processing service.
+
+Lets other programs (e.g. a CMS) submit episodes without the GUI. Uploads
+are streamed to disk in chunks, queued in a ``JobQueue`` and processed by a
+fixed pool of worker processes, each of which owns one AudioProcessor.
+Everything is served by the standard library's ``ThreadingHTTPServer``:
+
+    POST   /jobs?filename=episode.wav&settings={...}&priority=high
+                                 upload the raw file as the request body
+    GET    /jobs                 state of every job
+    GET    /jobs/<id>            state of one job (status, progress, error)
+    GET    /jobs/<id>/result     the processed file, streamed in chunks
+                                 (?rendition=<n> for the n-th of several renditions)
+    DELETE /jobs/<id>            cancel a waiting or running job, delete a finished one
+    GET    /metrics              queue depth, job counts and per-job latencies
+
+Settings are the same dict as for ``AudioProcessor.process_audio``; a
+chain is given as the name of a preset chain or as an inline spec. Every
+setting is type-checked before the upload is read (unknown keys and wrong
+types are rejected with 400) and numbers are clamped to their range, so a
+request cannot ask for, say, a thousand denoising processes. A noise profile
+is the name of a saved ``.npz`` profile in the service's profile directory;
+other paths on the host are refused.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.managers import SyncManager
+from urllib.parse import parse_qs, urlsplit
+from src.audio_processing.jobs import (
+    CANCELLED, DONE, FAILED, FINISHED_STATES, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, QUEUED, RUNNING, JobQueue
+)
+from src.cli.batch import AUDIO_EXTENSIONS
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Largest accepted upload
+DEFAULT_MAX_UPLOAD_BYTES = 4 * 1024 ** 3
+
+# Bytes read from or written to a socket at a time
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+
+# Finished jobs whose latencies are kept for /metrics
+LATENCY_WINDOW = 1000
+
+# Finished jobs (and their outputs) are deleted this many seconds after finishing...
+DEFAULT_JOB_TTL = 24 * 3600
+
+# ...or once more than this many finished jobs are kept, oldest first
+DEFAULT_MAX_FINISHED_JOBS = 1000
+
+PRIORITIES = {'low': PRIORITY_LOW, 'normal': PRIORITY_NORMAL, 'high': PRIORITY_HIGH}
+
+CONTENT_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.m4a': 'audio/mp4',
+    '.ogg': 'audio/ogg',
+    '.opus': 'audio/ogg',
+    '.flac': 'audio/flac',
+}
+
+# Switches a job may set
+BOOLEAN_SETTINGS = ('skip_silence', 'trim_silence', 'streaming', 'low_memory')
+
+# Numbers a job may set: key -> (low, high, type); values outside the range are clamped
+# and a high of None stands for the CPU count (worker counts of 0 already mean all cores)
+NUMBER_SETTINGS = {
+    'noise_reduction': (0.0, 1.0, float),
+    'compression': (0.0, 1.0, float),
+    'compression_attack_ms': (0.0, 1000.0, float),
+    'compression_release_ms': (0.0, 5000.0, float),
+    'compression_knee': (0.0, 1.0, float),
+    'compression_lookahead_ms': (0.0, 50.0, float),
+    'loudness_target': (-70.0, 0.0, float),
+    'true_peak': (-20.0, 0.0, float),
+    'processing_rate': (8000, 192000, int),
+    'max_processing_rate': (8000, 192000, int),
+    'output_rate': (8000, 192000, int),
+    'denoise_workers': (0, None, int),
+    'encode_workers': (0, None, int),
+}
+
+# Strings a job may set: key -> allowed values (None: checked in validate_settings)
+CHOICE_SETTINGS = {
+    'scratch': ('auto', 'memory', 'mapped'),
+    'eq_preset': None,
+    'codec': None,
+    'bitrate': None,
+}
+
+# Settings checked by the chain and rendition validation
+STRUCTURED_SETTINGS = ('chain', 'noise_profile', 'renditions')
+
+BITRATE_PATTERN = r'\d{1,4}k'
+
+# AudioProcessor and progress queue of the current worker process
+_processor = None
+_updates = None
+
+
+def _ignore_stop_signals():
+    """Leave Ctrl+C and SIGTERM to the server process, which shuts the helper processes down in order"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+
+def _init_worker(output_dir, updates):
+    """Create the AudioProcessor once per worker process"""
+    global _processor, _updates
+    _ignore_stop_signals()
+    from src.audio_processing.processor import AudioProcessor
+    # Every upload is rendered once, so intermediate stage outputs are not worth keeping
+    _processor = AudioProcessor(output_dir=output_dir, stage_cache=False)
+    _updates = updates
+
+
+def _run_job(token, input_file, settings, cancel_event):
+    """Process one file in a worker, reporting progress under ``token``"""
+    last = [None]
+
+    def progress(value):
+        if value != last[0]:
+            last[0] = value
+            _updates.put((token, value))
+
+    return _processor.process_audio(input_file, settings, progress_callback=progress, cancel_event=cancel_event)
+
+
+class WorkerPool:
+    """
+    Stand-in for an AudioProcessor that runs every job in a worker process
+
+    ``JobQueue`` calls ``process_audio`` from its threads as usual; the call
+    blocks until a worker has processed the file, forwarding the worker's
+    progress and the job's cancel flag across the process boundary.
+    """
+
+    def __init__(self, workers, output_dir):
+        self.workers = workers
+        self.output_dir = output_dir
+        self._manager = SyncManager()
+        self._manager.start(_ignore_stop_signals)
+        self._updates = self._manager.Queue()
+        self._callbacks = {}
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+        self._listener = threading.Thread(target=self._forward_progress, daemon=True)
+        self._listener.start()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.output_dir, self._updates))
+
+    def process_audio(self, input_file, settings, progress_callback=None, instrumentation=None, cancel_event=None):
+        """Process a file in a worker (same result and exceptions as AudioProcessor.process_audio)"""
+        token = next(self._tokens)
+        remote_cancel = self._manager.Event()
+        with self._lock:
+            self._callbacks[token] = progress_callback
+            future = self._pool.submit(_run_job, token, input_file, settings, remote_cancel)
+            pool = self._pool
+        try:
+            while not wait([future], timeout=0.2).done:
+                if cancel_event is not None and cancel_event.is_set():
+                    remote_cancel.set()
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                # A crashed worker takes the pool down; later jobs get a fresh one
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = self._new_pool()
+                raise RuntimeError('The worker process processing this job exited unexpectedly')
+        finally:
+            with self._lock:
+                self._callbacks.pop(token, None)
+
+    def _forward_progress(self):
+        while True:
+            try:
+                token, value = self._updates.get()
+            except (EOFError, OSError):
+                return
+            with self._lock:
+                callback = self._callbacks.get(token)
+            if callback:
+                callback(value)
+
+    def shutdown(self):
+        """Stop the workers (running jobs are cancelled through the queue first)"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._manager.shutdown()
+
+
+def _percentiles(values):
+    """Mean, median, 95th percentile and maximum of a list of seconds"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'mean': sum(ordered) / len(ordered),
+        'p50': ordered[(len(ordered) - 1) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+        'max': ordered[-1],
+    }
+
+
+class ProcessingService:
+    """Uploads, the job queue and its metrics, independent of HTTP"""
+
+    def __init__(self, output_dir, workers=None, max_upload_bytes=DEFAULT_MAX_UPLOAD_BYTES, profile_dir=None,
+                 job_ttl=DEFAULT_JOB_TTL, max_finished_jobs=DEFAULT_MAX_FINISHED_JOBS):
+        """
+        Args:
+            output_dir (str): Directory for the processed files (uploads go to its 'uploads' subdirectory)
+            workers (int): Number of worker processes (default: CPU count)
+            max_upload_bytes (int): Largest accepted upload
+            profile_dir (str): Directory of the noise profiles jobs may use (default: ``output_dir/profiles``)
+            job_ttl (float): Seconds a finished job and its outputs are kept
+            max_finished_jobs (int): Finished jobs kept at most (the oldest are deleted first)
+        """
+        self.output_dir = os.path.abspath(output_dir)
+        self.upload_dir = os.path.join(self.output_dir, 'uploads')
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.profile_dir = os.path.abspath(profile_dir or os.path.join(self.output_dir, 'profiles'))
+        self.max_upload_bytes = max_upload_bytes
+        self.job_ttl = job_ttl
+        self.max_finished_jobs = max_finished_jobs
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = WorkerPool(self.workers, self.output_dir)
+        self.queue = JobQueue(lambda: self.pool, workers=self.workers, on_update=self._job_updated)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._recorded = set()
+        self._lock = threading.Lock()
+        self._uploads = itertools.count(1)
+
+    def validate_settings(self, settings):
+        """
+        Check the types of ``settings`` and clamp its numbers
+
+        Returns:
+            dict: The settings to queue (None values dropped, numbers in range)
+
+        Raises:
+            ValueError: Unknown key, wrong type or value, or a chain that does not compile
+        """
+        from src.audio_processing.chain import compile_chain, settings_chain
+        from src.audio_processing.chain_files import available_chains
+        from src.audio_processing.encoder import CODECS, LOSSLESS_CODECS
+        from src.audio_processing.equalizer import EQ_PRESETS
+        from src.audio_processing.renditions import output_renditions
+        if not isinstance(settings, dict):
+            raise ValueError('settings must be a JSON object')
+        choices = dict(CHOICE_SETTINGS, eq_preset=tuple(EQ_PRESETS), codec=tuple(CODECS) + tuple(LOSSLESS_CODECS))
+
+        checked = {}
+        for key, value in settings.items():
+            if value is None:
+                # Same as leaving the setting out
+                continue
+            if key in BOOLEAN_SETTINGS:
+                if not isinstance(value, bool):
+                    raise ValueError(f"{key} must be true or false")
+            elif key in NUMBER_SETTINGS:
+                low, high, kind = NUMBER_SETTINGS[key]
+                if (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)
+                        or (kind is int and value != int(value))):
+                    raise ValueError(f"{key} must be {'an integer' if kind is int else 'a number'}")
+                high = (os.cpu_count() or 1) if high is None else high
+                value = kind(min(max(value, low), high))
+            elif key == 'bitrate':
+                if not isinstance(value, str) or not re.fullmatch(BITRATE_PATTERN, value):
+                    raise ValueError("bitrate must look like '128k'")
+            elif key in choices:
+                if value not in choices[key]:
+                    raise ValueError(f"{key} must be one of {', '.join(choices[key])}")
+            elif key not in STRUCTURED_SETTINGS:
+                raise ValueError(f"unknown setting {key!r}")
+            checked[key] = value
+
+        chain = checked.get('chain')
+        if isinstance(chain, str) and chain not in available_chains():
+            raise ValueError(f"unknown chain {chain!r}, expected one of {sorted(available_chains())} or a spec")
+        if chain is not None and not isinstance(chain, (str, dict)):
+            raise ValueError('chain must be the name of a preset chain or a spec')
+        if 'noise_profile' in checked:
+            checked['noise_profile'] = self.profile_path(checked['noise_profile'])
+        try:
+            compile_chain(settings_chain(checked))
+            for rendition in output_renditions(checked):
+                if rendition.bitrate is not None and not re.fullmatch(BITRATE_PATTERN, rendition.bitrate):
+                    raise ValueError("rendition bitrates must look like '128k'")
+        except TypeError as e:
+            # e.g. a string where a number belongs (ChainError already is a ValueError)
+            raise ValueError(f"invalid settings: {e}") from e
+        return checked
+
+    def profile_path(self, name):
+        """
+        Path of the saved profile ``name`` (e.g. 'studio.npz') in the profile directory
+
+        Raises:
+            ValueError: Not a .npz file name inside the profile directory (absolute paths,
+                '..' and links pointing elsewhere are refused) or no such profile
+        """
+        if (not isinstance(name, str) or not name.endswith('.npz') or os.path.isabs(name)
+                or '..' in re.split(r'[\\/]', name)):
+            raise ValueError("noise_profile must be the name of a saved .npz profile, e.g. 'studio.npz'")
+        path = os.path.realpath(os.path.join(self.profile_dir, name))
+        if not path.startswith(os.path.realpath(self.profile_dir) + os.sep) or not os.path.isfile(path):
+            raise ValueError(f"no saved noise profile named {name!r}")
+        return path
+
+    def receive_upload(self, filename, stream, length):
+        """
+        Copy ``length`` bytes of ``stream`` into a new upload file, a chunk at a time
+
+        Returns:
+            str: Path of the stored upload
+        """
+        name = os.path.basename(filename or '')
+        if not name.lower().endswith(AUDIO_EXTENSIONS):
+            raise ValueError(f"filename must end with one of {', '.join(AUDIO_EXTENSIONS)}")
+        if length < 0:
+            raise ValueError('Content-Length must not be negative')
+        if length > self.max_upload_bytes:
+            raise ValueError(f"upload larger than {self.max_upload_bytes} bytes")
+        # A unique prefix keeps uploads (and the outputs named after them) apart
+        path = os.path.join(self.upload_dir, f"{next(self._uploads)}-{int(time.time())}-{name}")
+        remaining = length
+        try:
+            with open(path, 'wb') as f:
+                while remaining > 0:
+                    chunk = stream.read(min(TRANSFER_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise ValueError('upload ended before Content-Length bytes were received')
+                    f.write(chunk)
+                    remaining -= len(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
+
+    def submit(self, input_file, settings, priority=PRIORITY_NORMAL):
+        self.expire_jobs()
+        return self.queue.submit(input_file, settings, priority)
+
+    def forget(self, job):
+        """Remove a finished job and its output files"""
+        if self.queue.remove(job.id):
+            with self._lock:
+                self._recorded.discard(job.id)
+            if job.result is not None:
+                for path in job.result.output_files:
+                    if os.path.isfile(path):
+                        os.remove(path)
+
+    def expire_jobs(self):
+        """Forget finished jobs older than ``job_ttl`` and the oldest beyond ``max_finished_jobs``"""
+        finished = [job for job in self.queue.jobs() if job.status in FINISHED_STATES]
+        cutoff = time.time() - self.job_ttl
+        excess = len(finished) - self.max_finished_jobs
+        for index, job in enumerate(finished):
+            # Oldest first (see JobQueue.jobs)
+            if index < excess or (job.finished is not None and job.finished < cutoff):
+                self.forget(job)
+
+    def _job_updated(self, job):
+        if job.status not in FINISHED_STATES:
+            return
+        with self._lock:
+            if job.id in self._recorded:
+                return
+            self._recorded.add(job.id)
+            if job.status == DONE:
+                self._latencies.append((job.wait_seconds, job.seconds, job.finished - job.submitted))
+        # The upload is no longer needed once its job has finished
+        if os.path.isfile(job.input_file):
+            os.remove(job.input_file)
+        self.expire_jobs()
+
+    def metrics(self):
+        """Queue depth, job counts by status and latency statistics of recently finished jobs"""
+        jobs = self.queue.snapshot()
+        counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in jobs:
+            counts[job['status']] += 1
+        with self._lock:
+            latencies = list(self._latencies)
+        return {
+            'workers': self.workers,
+            'queue_depth': counts[QUEUED],
+            'running': counts[RUNNING],
+            'jobs': counts,
+            'latency_seconds': {
+                'finished_jobs': len(latencies),
+                'wait': _percentiles([wait for wait, _, _ in latencies]),
+                'processing': _percentiles([processing for _, processing, _ in latencies]),
+                'total': _percentiles([total for _, _, total in latencies]),
+            },
+        }
+
+    def shutdown(self):
+        self.queue.shutdown()
+        self.pool.shutdown()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """Routes the HTTP requests of a ``ProcessingService`` (``self.server.service``)"""
+
+    server_version = 'PodcastStudioEnhancer'
+
+    def do_GET(self):
+        path = urlsplit(self.path).path.rstrip('/')
+        if path == '/jobs':
+            return self._send_json(self.server.service.queue.snapshot())
+        if path == '/metrics':
+            return self._send_json(self.server.service.metrics())
+        match = re.fullmatch(r'/jobs/(\d+)(/result)?', path)
+        if not match:
+            return self._send_error(HTTPStatus.NOT_FOUND, 'no such endpoint')
+        job = self.server.service.queue.get(int(match.group(1)))
+        if job is None:
+            return self._send_error(HTTPStatus.NOT_FOUND, 'no such job')
+        if match.group(2):
+            return self._send_result(job, parse_qs(urlsplit(self.path).query).get('rendition', ['0'])[-1])
+        return self._send_json(job.as_dict())
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            return self._send_error(HTTPStatus.NOT_FOUND, 'no such endpoint')
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = self.headers.get('Content-Length')
+        if length is None:
+            return self._send_error(HTTPStatus.LENGTH_REQUIRED, 'Content-Length is required')
+        service = self.server.service
+        try:
+            settings = service.validate_settings(json.loads(query.get('settings', '{}')))
+            priority = PRIORITIES.get(query.get('priority', 'normal'))
+            if priority is None:
+                raise ValueError(f"priority must be one of {', '.join(PRIORITIES)}")
+            if int(length) > service.max_upload_bytes:
+                self.close_connection = True
+                return self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'upload too large')
+            input_file = service.receive_upload(query.get('filename'), self.rfile, int(length))
+        except ValueError as e:
+            # The body was not read, so the connection cannot be reused
+            self.close_connection = True
+            return self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+        job = service.submit(input_file, settings, priority)
+        self._send_json(job.as_dict(), HTTPStatus.ACCEPTED, {'Location': f"/jobs/{job.id}"})
+
+    def do_DELETE(self):
+        match = re.fullmatch(r'/jobs/(\d+)', urlsplit(self.path).path.rstrip('/'))
+        if not match:
+            return self._send_error(HTTPStatus.NOT_FOUND, 'no such endpoint')
+        service = self.server.service
+        job = service.queue.get(int(match.group(1)))
+        if job is None:
+            return self._send_error(HTTPStatus.NOT_FOUND, 'no such job')
+        if job.status in FINISHED_STATES:
+            service.forget(job)
+        else:
+            service.queue.cancel(job.id)
+        self._send_json(job.as_dict())
+
+    def _send_result(self, job, rendition):
+        if job.status != DONE:
+            return self._send_error(HTTPStatus.CONFLICT, f"job is {job.status}")
+        files = job.result.output_files
+        if not rendition.isdigit() or int(rendition) >= len(files):
+            return self._send_error(HTTPStatus.NOT_FOUND, f"rendition must be 0-{len(files) - 1}")
+        path = files[int(rendition)]
+        if not path or not os.path.isfile(path):
+            return self._send_error(HTTPStatus.GONE, 'the output file no longer exists')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream'))
+        self.send_header('Content-Length', str(os.path.getsize(path)))
+        self.send_header('Content-Disposition', f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile, TRANSFER_CHUNK_SIZE)
+
+    def _send_json(self, payload, status=HTTPStatus.OK, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message):
+        self._send_json({'error': message}, status)
+
+
+def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Serve ``service`` until interrupted"""
+    server = ThreadingHTTPServer((host, port), ServiceHandler)
+    server.daemon_threads = True
+    server.service = service
+    # Stopped by a service manager like by Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"Serving on http://{host}:{server.server_address[1]} with {service.workers} worker processes")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='serve.py',
+        description='Process podcast recordings submitted over a local HTTP API.'
+    )
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('--workers', type=int, default=None, help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--output-dir', default='output', help='Directory for uploads and processed files (default: ./output)')
+    parser.add_argument('--max-upload', type=float, default=None, help='Largest accepted upload in MB (default: 4096)')
+    parser.add_argument('--keep-hours', type=float, default=None,
+                        help=f"Hours a finished job and its outputs are kept (default: {DEFAULT_JOB_TTL // 3600})")
+    parser.add_argument('--max-finished-jobs', type=int, default=DEFAULT_MAX_FINISHED_JOBS,
+                        help=f"Finished jobs kept at most, oldest deleted first (default: {DEFAULT_MAX_FINISHED_JOBS})")
+    parser.add_argument('--profile-dir', default=None,
+                        help='Directory of the saved noise profiles jobs may use (default: <output-dir>/profiles)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    service = ProcessingService(
+        args.output_dir,
+        workers=args.workers,
+        max_upload_bytes=int(args.max_upload * 1024 ** 2) if args.max_upload else DEFAULT_MAX_UPLOAD_BYTES,
+        profile_dir=args.profile_dir,
+        job_ttl=args.keep_hours * 3600 if args.keep_hours is not None else DEFAULT_JOB_TTL,
+        max_finished_jobs=args.max_finished_jobs
+    )
+    serve(service, args.host, args.port)
+    return 0
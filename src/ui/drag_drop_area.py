@@ -2,11 +2,17 @@ import tkinter as tk
 from tkinter import ttk, filedialog
 import os
 
+# File dialog filter for the supported audio formats
+AUDIO_FILETYPES = [
+    ("Ses Dosyaları", "*.mp3 *.wav *.ogg *.flac *.m4a"),
+    ("Tüm Dosyalar", "*.*")
+]
+
 class AudioDropArea(ttk.Frame):
     def __init__(self, parent, callback):
         super().__init__(parent)
         
-        # Store callback function
+        # Store callback function (called with a list of file paths)
         self.callback = callback
         
         # Configure frame appearance
@@ -20,7 +26,7 @@ class AudioDropArea(ttk.Frame):
         # Create label
         self.label = ttk.Label(
             self, 
-            text="Ses dosyasını buraya sürükleyip bırakın\nveya tıklayarak seçin",
+            text="Ses dosyalarını buraya sürükleyip bırakın\nveya tıklayarak seçin",
             font=("Arial", 14),
             foreground="#888888",
             background="#2a2a2a",
@@ -37,17 +43,14 @@ class AudioDropArea(ttk.Frame):
         self.configure(borderwidth=2, relief="groove")
         
     def on_click(self, event):
-        """Handle click event to open file dialog"""
-        file_path = filedialog.askopenfilename(
+        """Handle click event to open file dialog (several files can be selected)"""
+        file_paths = filedialog.askopenfilenames(
             title="Ses Dosyası Seç",
-            filetypes=[
-                ("Ses Dosyaları", "*.mp3 *.wav *.ogg *.flac *.m4a"),
-                ("Tüm Dosyalar", "*.*")
-            ]
+            filetypes=AUDIO_FILETYPES
         )
         
-        if file_path:
-            self.callback(file_path)
+        if file_paths:
+            self.callback(list(file_paths))
     
     def set_file_loaded(self, loaded, filename=None):
         """Update appearance when a file is loaded"""
@@ -69,7 +72,7 @@ class AudioDropArea(ttk.Frame):
             # Reset to default style
             self.configure(style="DropArea.TFrame")
             self.label.configure(
-                text="Ses dosyasını buraya sürükleyip bırakın\nveya tıklayarak seçin",
+                text="Ses dosyalarını buraya sürükleyip bırakın\nveya tıklayarak seçin",
                 foreground="#888888",
                 background="#2a2a2a"
             )
@@ -1,44 +1,121 @@
 import os
+import queue
+import subprocess
+import sys
+import tempfile
 import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
-from src.ui.drag_drop_area import AudioDropArea
-from src.audio_processing.processor import AudioProcessor
+from src.ui.drag_drop_area import AUDIO_FILETYPES, AudioDropArea
+from src.audio_processing.jobs import (
+    CANCELLED, DONE, FAILED, FINISHED_STATES, PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, QUEUED, RUNNING,
+    JobQueue
+)
+from src.audio_processing.chain_files import available_chains
+from src.audio_processing.warmup import ProcessorWarmup
+from src.utils.event_bus import COMPLETE, ERROR, JOB, LOG, PREVIEW, PROGRESS, EventBus, EventBusSink
 
-class ProcessingThread(threading.Thread):
-    def __init__(self, audio_file, settings, progress_callback, complete_callback, error_callback):
-        super().__init__()
-        self.audio_file = audio_file
-        self.settings = settings
-        self.progress_callback = progress_callback
-        self.complete_callback = complete_callback
-        self.error_callback = error_callback
-        self.daemon = True  # Thread will exit when main program exits
-        
-    def run(self):
-        try:
-            processor = AudioProcessor()
-            output_file = processor.process_audio(
-                self.audio_file, 
-                self.settings,
-                progress_callback=self.progress_callback
-            )
-            self.complete_callback(output_file)
-        except Exception as e:
-            self.error_callback(str(e))
+# Labels shown in the job list
+STATUS_LABELS = {
+    QUEUED: "Sırada",
+    RUNNING: "İşleniyor",
+    DONE: "Tamamlandı",
+    FAILED: "Hata",
+    CANCELLED: "İptal edildi"
+}
+
+PRIORITY_LABELS = {
+    PRIORITY_HIGH: "Yüksek",
+    PRIORITY_NORMAL: "Normal",
+    PRIORITY_LOW: "Düşük"
+}
+
+# Output level choices: integrated loudness target in LUFS (None = peak normalization)
+LOUDNESS_CHOICES = {
+    "-16 LUFS (Podcast)": -16.0,
+    "-19 LUFS": -19.0,
+    "-23 LUFS (Yayın)": -23.0,
+    "Tepe (0.95)": None
+}
+
+# Processing rate choices (settings merged into the job settings)
+PROCESSING_RATE_CHOICES = {
+    "Dosyanın hızı (en fazla 48 kHz)": {'max_processing_rate': 48000},
+    "Dosyanın hızı": {},
+    "48 kHz": {'processing_rate': 48000},
+    "44.1 kHz": {'processing_rate': 44100}
+}
+
+# Chain choice that uses the stage settings above instead of a preset chain
+CUSTOM_CHAIN_LABEL = "Yukarıdaki ayarlar"
+
+# Output rate choices (None = processing rate)
+OUTPUT_RATE_CHOICES = {
+    "İşleme hızı": None,
+    "48 kHz": 48000,
+    "44.1 kHz": 44100
+}
+
+# How often the events published by the workers are applied to the widgets (ms)
+EVENT_INTERVAL_MS = 100
+
+# Raw events handled per tick at most, so a burst of events cannot freeze the UI
+EVENTS_PER_TICK = 5000
+
+# Delay between the last settings change and the preview re-render (ms)
+PREVIEW_DEBOUNCE_MS = 250
+
+# Length of the previewed region (seconds)
+PREVIEW_SECONDS = 10.0
+
+
+def play_audio_file(path, previous=None):
+    """Play an audio file in the background with the platform's player, stopping the previous one"""
+    if previous is not None and previous.poll() is None:
+        previous.terminate()
+    if sys.platform == 'win32':
+        import winsound
+        winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+        return None
+    player = 'afplay' if sys.platform == 'darwin' else 'aplay'
+    try:
+        return subprocess.Popen([player, path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
 
 class MainWindow:
     def __init__(self, root):
         self.root = root
         
         # Initialize variables
-        self.audio_file = None
-        self.processing_thread = None
-        self.file_selected = False  # Track if a file has been selected
+        self.audio_files = []  # Files selected but not queued yet
+        
+        # Heavy DSP modules are loaded in the background once the window is up
+        self.warmup = ProcessorWarmup()
+        
+        # Selected files are processed as jobs on a small pool of worker threads.
+        # Workers never touch Tk: they publish events that the Tk thread drains.
+        self.events = EventBus()
+        self.published_status = {}
+        self.job_queue = JobQueue(
+            self.warmup.get_processor,
+            on_update=self.publish_job_update,
+            sinks=[EventBusSink(self.events)]
+        )
+        
+        # Preview renders run on their own thread; only the latest request is rendered
+        self.preview_requests = queue.Queue()
+        self.preview_thread = None
+        self.preview_file = None
+        self.preview_player = None
+        self.preview_output = None
+        self.preview_after_id = None
         
         # Setup UI
         self.setup_ui()
+        self.root.after_idle(self.warmup.start)
+        self.root.after(EVENT_INTERVAL_MS, self.pump_events)
         
     def setup_ui(self):
         # Create menu bar
@@ -104,8 +181,8 @@ class MainWindow:
         separator.pack(fill="x", pady=10)
         
         # Create drag and drop area
-        self.drop_area = AudioDropArea(main_frame, self.set_audio_file)
-        self.drop_area.pack(fill="x", pady=10, ipady=50)
+        self.drop_area = AudioDropArea(main_frame, self.set_audio_files)
+        self.drop_area.pack(fill="x", pady=10, ipady=30)
         
         # Add file info label
         self.file_info_label = ttk.Label(
@@ -154,7 +231,7 @@ class MainWindow:
             from_=0, 
             to=100, 
             orient="horizontal",
-            command=lambda v: self.noise_value_label.config(text=f"{int(float(v))}%")
+            command=lambda v: self.on_setting_changed(self.noise_value_label, v)
         )
         self.noise_slider.set(50)
         self.noise_slider.pack(side="left", fill="x", expand=True, padx=10)
@@ -174,7 +251,7 @@ class MainWindow:
             from_=0, 
             to=100, 
             orient="horizontal",
-            command=lambda v: self.comp_value_label.config(text=f"{int(float(v))}%")
+            command=lambda v: self.on_setting_changed(self.comp_value_label, v)
         )
         self.comp_slider.set(50)
         self.comp_slider.pack(side="left", fill="x", expand=True, padx=10)
@@ -194,218 +271,434 @@ class MainWindow:
         )
         self.eq_combo.current(0)  # Set default to "Stüdyo"
         self.eq_combo.pack(side="left", padx=10, fill="x", expand=True)
+        self.eq_combo.bind("<<ComboboxSelected>>", lambda e: self.schedule_preview())
+        
+        # Add output loudness settings
+        loudness_frame = ttk.Frame(settings_frame)
+        loudness_frame.pack(fill="x", pady=5)
+        
+        loudness_label = ttk.Label(loudness_frame, text="Ses Seviyesi:", foreground="white")
+        loudness_label.pack(side="left")
+        
+        self.loudness_combo = ttk.Combobox(
+            loudness_frame,
+            values=list(LOUDNESS_CHOICES),
+            width=15,
+            state="readonly"
+        )
+        self.loudness_combo.current(0)  # Set default to -16 LUFS
+        self.loudness_combo.pack(side="left", padx=10, fill="x", expand=True)
+        self.loudness_combo.bind("<<ComboboxSelected>>", lambda e: self.schedule_preview())
+        
+        # Add processing and output sample rate settings
+        rate_frame = ttk.Frame(settings_frame)
+        rate_frame.pack(fill="x", pady=5)
+        
+        rate_label = ttk.Label(rate_frame, text="Örnekleme Hızı:", foreground="white")
+        rate_label.pack(side="left")
+        
+        self.processing_rate_combo = ttk.Combobox(
+            rate_frame,
+            values=list(PROCESSING_RATE_CHOICES),
+            width=28,
+            state="readonly"
+        )
+        self.processing_rate_combo.current(0)  # Set default to at most 48 kHz
+        self.processing_rate_combo.pack(side="left", padx=10, fill="x", expand=True)
+        self.processing_rate_combo.bind("<<ComboboxSelected>>", lambda e: self.schedule_preview())
+        
+        output_rate_label = ttk.Label(rate_frame, text="Çıkış:", foreground="white")
+        output_rate_label.pack(side="left")
+        
+        self.output_rate_combo = ttk.Combobox(
+            rate_frame,
+            values=list(OUTPUT_RATE_CHOICES),
+            width=12,
+            state="readonly"
+        )
+        self.output_rate_combo.current(0)  # Set default to the processing rate
+        self.output_rate_combo.pack(side="left", padx=10)
+        
+        # Add processing chain presets (a chain replaces the stage settings above)
+        chain_frame = ttk.Frame(settings_frame)
+        chain_frame.pack(fill="x", pady=5)
+        
+        chain_label = ttk.Label(chain_frame, text="İşlem Zinciri:", foreground="white")
+        chain_label.pack(side="left")
+        
+        self.chains = available_chains()
+        self.chain_combo = ttk.Combobox(
+            chain_frame,
+            values=[CUSTOM_CHAIN_LABEL] + list(self.chains),
+            width=28,
+            state="readonly"
+        )
+        self.chain_combo.current(0)  # Set default to the settings above
+        self.chain_combo.pack(side="left", padx=10, fill="x", expand=True)
+        self.chain_combo.bind("<<ComboboxSelected>>", lambda e: self.schedule_preview())
+        
+        # Add silence handling settings
+        silence_frame = ttk.Frame(settings_frame)
+        silence_frame.pack(fill="x", pady=5)
+        
+        silence_label = ttk.Label(silence_frame, text="Sessizlik:", foreground="white")
+        silence_label.pack(side="left")
+        
+        self.skip_silence = tk.BooleanVar(value=False)
+        skip_silence_check = ttk.Checkbutton(
+            silence_frame, text="Duraklamaları hızlı işle", variable=self.skip_silence
+        )
+        skip_silence_check.pack(side="left", padx=10)
+        
+        self.trim_silence = tk.BooleanVar(value=False)
+        trim_silence_check = ttk.Checkbutton(
+            silence_frame, text="Baştaki/sondaki sessizliği kes", variable=self.trim_silence
+        )
+        trim_silence_check.pack(side="left", padx=10)
+        
+        # Add preview of a short region with the current settings
+        preview_frame = ttk.Frame(settings_frame)
+        preview_frame.pack(fill="x", pady=5)
+        
+        preview_label = ttk.Label(preview_frame, text="Önizleme başlangıcı (sn):", foreground="white")
+        preview_label.pack(side="left")
+        
+        self.preview_start = tk.StringVar(value="0")
+        self.preview_start_entry = ttk.Spinbox(
+            preview_frame, from_=0, to=36000, increment=10, width=8, textvariable=self.preview_start
+        )
+        self.preview_start_entry.pack(side="left", padx=10)
+        
+        self.preview_button = ttk.Button(preview_frame, text="Önizle", command=self.start_preview)
+        self.preview_button.pack(side="left", padx=5)
+        
+        self.preview_info_label = ttk.Label(preview_frame, text="", foreground="#aaaaaa")
+        self.preview_info_label.pack(side="left", padx=10)
+        
+        # Add priority setting for newly queued files
+        priority_frame = ttk.Frame(settings_frame)
+        priority_frame.pack(fill="x", pady=5)
+        
+        priority_label = ttk.Label(priority_frame, text="Öncelik:", foreground="white")
+        priority_label.pack(side="left")
+        
+        self.priority_combo = ttk.Combobox(
+            priority_frame,
+            values=[PRIORITY_LABELS[p] for p in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)],
+            width=15,
+            state="readonly"
+        )
+        self.priority_combo.current(1)  # Set default to "Normal"
+        self.priority_combo.pack(side="left", padx=10, fill="x", expand=True)
+        
+        # Add job queue
+        queue_frame = ttk.LabelFrame(
+            main_frame,
+            text="İş Kuyruğu",
+            padding=10,
+            style="TLabelframe"
+        )
+        queue_frame.pack(fill="both", expand=True, pady=10)
         
-        # Progress variable (will be used in popup)
-        self.progress_var = tk.IntVar()
+        list_frame = ttk.Frame(queue_frame)
+        list_frame.pack(fill="both", expand=True)
         
-        # Process button is now the start button defined above
+        self.job_list = ttk.Treeview(
+            list_frame,
+            columns=("file", "priority", "status", "progress"),
+            show="headings",
+            height=6,
+            selectmode="browse"
+        )
+        self.job_list.heading("file", text="Dosya")
+        self.job_list.heading("priority", text="Öncelik")
+        self.job_list.heading("status", text="Durum")
+        self.job_list.heading("progress", text="İlerleme")
+        self.job_list.column("file", width=300)
+        self.job_list.column("priority", width=80, anchor="center")
+        self.job_list.column("status", width=200)
+        self.job_list.column("progress", width=80, anchor="center")
+        self.job_list.pack(side="left", fill="both", expand=True)
+        self.job_list.bind("<<TreeviewSelect>>", lambda e: self.update_job_buttons())
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.job_list.yview)
+        scrollbar.pack(side="right", fill="y")
+        self.job_list.configure(yscrollcommand=scrollbar.set)
+        
+        # Add job buttons
+        buttons_frame = ttk.Frame(queue_frame)
+        buttons_frame.pack(fill="x", pady=(10, 0))
+        
+        self.up_button = ttk.Button(buttons_frame, text="Yukarı", command=lambda: self.move_job(-1))
+        self.down_button = ttk.Button(buttons_frame, text="Aşağı", command=lambda: self.move_job(1))
+        self.cancel_button = ttk.Button(buttons_frame, text="İptal Et", command=self.cancel_job)
+        self.open_button = ttk.Button(buttons_frame, text="Klasörü Aç", command=self.open_job_output)
+        self.clear_button = ttk.Button(buttons_frame, text="Bitenleri Temizle", command=self.clear_finished_jobs)
+        for button in (self.up_button, self.down_button, self.cancel_button, self.open_button, self.clear_button):
+            button.pack(side="left", padx=5, fill="x", expand=True)
+        self.update_job_buttons()
+        
+        # Add status line with the latest worker message
+        self.status_label = ttk.Label(queue_frame, text="", foreground="#aaaaaa")
+        self.status_label.pack(fill="x", pady=(5, 0))
     
     def browse_file(self):
-        file_path = filedialog.askopenfilename(
+        file_paths = filedialog.askopenfilenames(
             title="Ses Dosyası Seç",
-            filetypes=[
-                ("Ses Dosyaları", "*.mp3 *.wav *.ogg *.flac *.m4a"),
-                ("Tüm Dosyalar", "*.*")
-            ]
+            filetypes=AUDIO_FILETYPES
         )
         
-        if file_path:
-            self.set_audio_file(file_path)
+        if file_paths:
+            self.set_audio_files(file_paths)
     
     def set_audio_file(self, file_path):
-        if os.path.exists(file_path):  # Verify the file exists
-            self.audio_file = file_path
-            self.file_selected = True  # Mark that a file has been selected
-            file_name = os.path.basename(file_path)
+        self.set_audio_files([file_path])
+    
+    def set_audio_files(self, file_paths):
+        """Select the files that the next click on the start button queues"""
+        existing = [path for path in file_paths if os.path.exists(path)]  # Verify the files exist
+        if len(existing) < len(file_paths):
+            messagebox.showerror("Hata", "Seçilen dosya bulunamadı.")
+        
+        self.audio_files = existing
+        if len(existing) == 1:
+            file_name = os.path.basename(existing[0])
             self.file_info_label.config(text=f"Seçilen dosya: {file_name}")
             self.start_button.config(state="normal")
             self.drop_area.set_file_loaded(True, file_name)
+        elif existing:
+            self.file_info_label.config(text=f"Seçilen dosyalar: {len(existing)} dosya")
+            self.start_button.config(state="normal")
+            self.drop_area.set_file_loaded(True, f"{len(existing)} dosya")
         else:
-            messagebox.showerror("Hata", "Seçilen dosya bulunamadı.")
-            self.file_selected = False
-            self.audio_file = None
             self.file_info_label.config(text="Henüz bir ses dosyası seçilmedi")
             self.start_button.config(state="disabled")
             self.drop_area.set_file_loaded(False)
     
-    def process_audio(self):
-        # Double check that we have a valid file
-        if not self.file_selected or not self.audio_file or not os.path.exists(self.audio_file):
-            messagebox.showwarning("Uyarı", "Lütfen önce bir ses dosyası seçin.")
-            # Reset file selection state
-            self.file_selected = False
-            self.audio_file = None
-            self.file_info_label.config(text="Henüz bir ses dosyası seçilmedi")
-            self.start_button.config(state="disabled")
-            self.drop_area.set_file_loaded(False)
-            return
-        
-        # Disable UI elements during processing
-        self.start_button.config(state="disabled")
-        self.progress_var.set(0)
-        
-        # Create progress dialog
-        self.progress_dialog = tk.Toplevel(self.root)
-        self.progress_dialog.title("İşlem Sürüyor")
-        self.progress_dialog.geometry("400x150")
-        self.progress_dialog.resizable(False, False)
-        self.progress_dialog.transient(self.root)  # Set as transient to main window
-        self.progress_dialog.grab_set()  # Make dialog modal
-        
-        # Center the dialog
-        window_width = 400
-        window_height = 150
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
-        center_x = int(screen_width/2 - window_width/2)
-        center_y = int(screen_height/2 - window_height/2)
-        self.progress_dialog.geometry(f'{window_width}x{window_height}+{center_x}+{center_y}')
-        
-        # Configure dialog style
-        self.progress_dialog.configure(bg="#2e2e2e")
-        
-        # Add processing message
-        message_label = ttk.Label(
-            self.progress_dialog,
-            text="Ses dosyası işleniyor...",
-            font=("Arial", 12, "bold"),
-            foreground="white",
-            background="#2e2e2e"
-        )
-        message_label.pack(pady=(20, 10))
-        
-        # Add file name
-        file_name = os.path.basename(self.audio_file)
-        file_label = ttk.Label(
-            self.progress_dialog,
-            text=f"Dosya: {file_name}",
-            foreground="#aaaaaa",
-            background="#2e2e2e"
-        )
-        file_label.pack(pady=(0, 10))
-        
-        # Add progress bar to dialog
-        self.progress_bar = ttk.Progressbar(
-            self.progress_dialog,
-            orient="horizontal",
-            length=350,
-            mode="determinate",
-            variable=self.progress_var
-        )
-        self.progress_bar.pack(pady=10, padx=25)
-        
-        # Add percentage label
-        self.percentage_label = ttk.Label(
-            self.progress_dialog,
-            text="0%",
-            foreground="white",
-            background="#2e2e2e"
-        )
-        self.percentage_label.pack()
-        
-        # Get settings
-        settings = {
+    def get_settings(self):
+        return {
             'noise_reduction': self.noise_slider.get() / 100.0,
             'compression': self.comp_slider.get() / 100.0,
-            'eq_preset': self.eq_combo.get()
+            'eq_preset': self.eq_combo.get(),
+            'loudness_target': LOUDNESS_CHOICES.get(self.loudness_combo.get()),
+            'output_rate': OUTPUT_RATE_CHOICES.get(self.output_rate_combo.get()),
+            'skip_silence': self.skip_silence.get(),
+            'trim_silence': self.trim_silence.get(),
+            'chain': self.chains.get(self.chain_combo.get()),
+            **PROCESSING_RATE_CHOICES.get(self.processing_rate_combo.get(), {})
         }
-        
-        # Start processing thread
-        self.processing_thread = ProcessingThread(
-            self.audio_file, 
-            settings,
-            self.update_progress,
-            self.processing_complete,
-            self.processing_error
-        )
-        self.processing_thread.start()
     
-    def update_progress(self, value):
-        self.progress_var.set(value)
-        # Update percentage label
-        if hasattr(self, 'percentage_label'):
-            self.percentage_label.config(text=f"{value}%")
-        self.root.update_idletasks()  # Update UI
+    def get_priority(self):
+        labels = {label: priority for priority, label in PRIORITY_LABELS.items()}
+        return labels.get(self.priority_combo.get(), PRIORITY_NORMAL)
     
-    def processing_complete(self, output_file):
-        self.progress_var.set(100)
-        
-        # Close progress dialog if it exists
-        if hasattr(self, 'progress_dialog') and self.progress_dialog.winfo_exists():
-            self.progress_dialog.destroy()
-        
-        # Re-enable start button
-        self.start_button.config(state="normal")
-        
-        # Create a custom completion dialog
-        completion_dialog = tk.Toplevel(self.root)
-        completion_dialog.title("İşlem Tamamlandı")
-        completion_dialog.geometry("500x250")
-        completion_dialog.resizable(False, False)
-        completion_dialog.transient(self.root)  # Set as transient to main window
-        completion_dialog.grab_set()  # Make dialog modal
-        
-        # Center the dialog
-        window_width = 500
-        window_height = 250
-        screen_width = self.root.winfo_screenwidth()
-        screen_height = self.root.winfo_screenheight()
-        center_x = int(screen_width/2 - window_width/2)
-        center_y = int(screen_height/2 - window_height/2)
-        completion_dialog.geometry(f'{window_width}x{window_height}+{center_x}+{center_y}')
-        
-        # Configure dialog style
-        completion_dialog.configure(bg="#2e2e2e")
-        
-        # Add success message
-        success_label = ttk.Label(
-            completion_dialog,
-            text="İşlem Başarıyla Tamamlandı!",
-            font=("Arial", 16, "bold"),
-            foreground="#aaffaa",
-            background="#2e2e2e"
-        )
-        success_label.pack(pady=(20, 10))
-        
-        # Add file info
-        file_name = os.path.basename(output_file)
-        file_info_label = ttk.Label(
-            completion_dialog,
-            text=f"Dosya kaydedildi:\n{file_name}",
-            font=("Arial", 12),
-            foreground="white",
-            background="#2e2e2e",
-            justify="center"
-        )
-        file_info_label.pack(pady=(0, 20))
+    def process_audio(self):
+        """Queue every selected file with the current settings"""
+        files = [path for path in self.audio_files if os.path.exists(path)]
+        if not files:
+            messagebox.showwarning("Uyarı", "Lütfen önce bir ses dosyası seçin.")
+            self.set_audio_files([])
+            return
         
-        # Add buttons frame
-        buttons_frame = ttk.Frame(completion_dialog, style="TFrame")
-        buttons_frame.pack(fill="x", padx=20, pady=10)
+        settings = self.get_settings()
+        priority = self.get_priority()
+        for path in files:
+            self.job_queue.submit(path, settings, priority)
         
-        # Add open folder button
-        open_folder_button = ttk.Button(
-            buttons_frame,
-            text="Klasörü Aç",
-            command=lambda: os.system(f'open -R "{output_file}"') or completion_dialog.destroy()
-        )
-        open_folder_button.pack(side="left", padx=10, fill="x", expand=True)
+        # The selection has been queued; new files can be picked right away
+        self.set_audio_files([])
+        self.refresh_jobs()
+    
+    def selected_job_id(self):
+        selection = self.job_list.selection()
+        return int(selection[0]) if selection else None
+    
+    def move_job(self, offset):
+        job_id = self.selected_job_id()
+        if job_id is not None and self.job_queue.move(job_id, offset):
+            self.refresh_jobs()
+    
+    def cancel_job(self):
+        job_id = self.selected_job_id()
+        if job_id is not None and self.job_queue.cancel(job_id):
+            self.refresh_jobs()
+    
+    def open_job_output(self):
+        job = self.job_queue.get(self.selected_job_id())
+        if job is not None and job.output_file:
+            os.system(f'open -R "{job.output_file}"')
+    
+    def clear_finished_jobs(self):
+        for job in self.job_queue.jobs():
+            if job.status in FINISHED_STATES:
+                self.job_queue.remove(job.id)
+        self.refresh_jobs()
+    
+    def update_job_buttons(self):
+        job = self.job_queue.get(self.selected_job_id())
+        queued = job is not None and job.status == QUEUED
+        self.up_button.config(state="normal" if queued else "disabled")
+        self.down_button.config(state="normal" if queued else "disabled")
+        self.cancel_button.config(state="normal" if job is not None and job.status in (QUEUED, RUNNING) else "disabled")
+        self.open_button.config(state="normal" if job is not None and job.output_file else "disabled")
+    
+    def publish_job_update(self, job):
+        """Called from worker threads: hand the job's state to the Tk thread"""
+        state = job.as_dict()
+        if self.published_status.get(job.id) == state['status']:
+            # Progress only; coalesced to the latest value per job
+            self.events.publish(PROGRESS, key=job.id, progress=state['progress'])
+            return
         
-        # Add close button
-        close_button = ttk.Button(
-            buttons_frame,
-            text="Kapat",
-            command=completion_dialog.destroy
-        )
-        close_button.pack(side="right", padx=10, fill="x", expand=True)
+        self.published_status[job.id] = state['status']
+        self.events.publish(JOB, key=job.id, **state)
+        if state['status'] == DONE:
+            self.events.publish(COMPLETE, **state)
+        elif state['status'] == FAILED:
+            self.events.publish(ERROR, **state)
+    
+    def pump_events(self):
+        """Apply everything the workers published since the last tick (runs on the Tk thread)"""
+        reorder = False
+        for event in self.events.drain(EVENTS_PER_TICK):
+            if event.kind == JOB:
+                reorder = True
+            elif event.kind == PROGRESS:
+                self.set_job_progress(event.key, event.data['progress'])
+            elif event.kind == LOG:
+                self.status_label.config(text=f"{event.data['job']} - {event.data['message']}")
+            elif event.kind == COMPLETE:
+                self.processing_complete(event.data)
+            elif event.kind == ERROR:
+                self.processing_error(event.data['name'], event.data['error'])
+            elif event.kind == PREVIEW:
+                self.preview_ready(event.data)
+        
+        # Status changes can reorder the list; progress only updates a cell
+        if reorder:
+            self.refresh_jobs()
+        
+        self.root.after(EVENT_INTERVAL_MS, self.pump_events)
+    
+    def set_job_progress(self, job_id, progress):
+        item = str(job_id)
+        if self.job_list.exists(item):
+            self.job_list.set(item, "progress", f"{progress}%")
+    
+    def refresh_jobs(self):
+        """Show the current state and order of every job (runs on the Tk thread)"""
+        jobs = self.job_queue.snapshot()
+        selected = self.job_list.selection()
+        
+        ids = [str(job['id']) for job in jobs]
+        for item in self.job_list.get_children():
+            if item not in ids:
+                self.job_list.delete(item)
+        
+        for index, job in enumerate(jobs):
+            status = STATUS_LABELS[job['status']]
+            if job['status'] == FAILED:
+                status = f"{status}: {job['error']}"
+            values = (job['name'], PRIORITY_LABELS.get(job['priority'], job['priority']), status, f"{job['progress']}%")
+            item = str(job['id'])
+            if self.job_list.exists(item):
+                self.job_list.item(item, values=values)
+                self.job_list.move(item, "", index)
+            else:
+                self.job_list.insert("", index, iid=item, values=values)
+        
+        if selected and self.job_list.exists(selected[0]):
+            self.job_list.selection_set(selected)
+        self.update_job_buttons()
+    
+    def processing_complete(self, job):
+        """A job has finished (always called on the Tk thread)"""
+        output_name = os.path.basename(job['output_file'])
+        status = f"Tamamlandı: {job['name']} → {output_name} ({job['seconds']:.1f} sn)"
+        
+        # How often re-renders could reuse intermediate results during this session
+        processor = self.warmup.get_processor()
+        if processor.stage_cache is not None:
+            stats = processor.stage_cache.stats()
+            status += f" · ara sonuç önbelleği: {stats['hits']} isabet / {stats['misses']} ıska"
+        self.status_label.config(text=status)
+    
+    def processing_error(self, file_name, error_message):
+        """A job has failed (always called on the Tk thread)"""
+        # No modal dialog here: it would stop the event pump (and every other job's
+        # progress) while open. The job row shows the error as well.
+        self.status_label.config(text=f"Hata: {file_name} işlenemedi - {error_message}")
     
-    def processing_error(self, error_message):
-        # Close progress dialog if it exists
-        if hasattr(self, 'progress_dialog') and self.progress_dialog.winfo_exists():
-            self.progress_dialog.destroy()
+    def on_setting_changed(self, value_label, value):
+        value_label.config(text=f"{int(float(value))}%")
+        self.schedule_preview()
+    
+    def schedule_preview(self):
+        """Re-render the preview shortly after the settings stop changing"""
+        if self.preview_file is None:
+            return
+        if self.preview_after_id is not None:
+            self.root.after_cancel(self.preview_after_id)
+        self.preview_after_id = self.root.after(PREVIEW_DEBOUNCE_MS, self.request_preview)
+    
+    def start_preview(self):
+        """Preview the selected file (or the last previewed one) from the chosen start time"""
+        files = [path for path in self.audio_files if os.path.exists(path)]
+        if files:
+            self.preview_file = files[0]
+        if self.preview_file is None:
+            messagebox.showwarning("Uyarı", "Lütfen önce bir ses dosyası seçin.")
+            return
+        self.request_preview()
+    
+    def request_preview(self):
+        self.preview_after_id = None
+        try:
+            start = max(0.0, float(self.preview_start.get().replace(',', '.')))
+        except ValueError:
+            start = 0.0
+        self.preview_info_label.config(text="Önizleme hazırlanıyor...")
+        self.preview_requests.put((self.preview_file, start, self.get_settings()))
+        if self.preview_thread is None:
+            self.preview_thread = threading.Thread(target=self.preview_worker, daemon=True)
+            self.preview_thread.start()
+    
+    def preview_worker(self):
+        """Preview thread: decode regions and render them, skipping requests that are already outdated"""
+        from src.audio_processing.preview import PreviewEngine
+        engine = None
+        while True:
+            request = self.preview_requests.get()
+            while not self.preview_requests.empty():
+                request = self.preview_requests.get()
+            input_file, start, settings = request
             
-        # Re-enable start button
-        self.start_button.config(state="normal")
-        
-        messagebox.showerror("Hata", f"İşlem sırasında bir hata oluştu:\n{error_message}")
-
+            try:
+                if engine is None:
+                    engine = PreviewEngine(self.warmup.get_processor())
+                if (engine.input_file, engine.start) != (input_file, start):
+                    engine.load(input_file, start, PREVIEW_SECONDS)
+                render = engine.render(settings)
+                fd, path = tempfile.mkstemp(suffix='.wav', prefix='preview_')
+                os.close(fd)
+                render.write(path)
+            except Exception as e:
+                self.events.publish(PREVIEW, name=os.path.basename(input_file), error=str(e))
+                continue
+            self.events.publish(
+                PREVIEW, name=os.path.basename(input_file), path=path,
+                latency=render.latency, duration=render.duration, error=None
+            )
+    
+    def preview_ready(self, preview):
+        """Play a finished preview and show how long it took (Tk thread)"""
+        if preview['error']:
+            self.preview_info_label.config(text=f"Önizleme hatası: {preview['error']}")
+            return
+        self.preview_player = play_audio_file(preview['path'], self.preview_player)
+        if self.preview_output and os.path.exists(self.preview_output):
+            os.remove(self.preview_output)
+        self.preview_output = preview['path']
+        self.preview_info_label.config(
+            text=f"{preview['name']}: {preview['duration']:.1f} sn, {preview['latency'] * 1000:.0f} ms'de hazırlandı"
+        )
@@ -0,0 +1,116 @@
+"""
+Thread-safe event bus between worker threads and a UI thread.
+
+Workers ``publish`` events from any thread; the UI thread calls ``drain``
+on a fixed cadence (e.g. from Tk's ``after``) and handles a coalesced batch.
+Events published with a ``key`` replace any pending event of the same kind
+and key, so a job that reported progress a hundred times since the last
+drain yields a single progress event with the latest value. Events without
+a key (completions, errors, log lines) are always delivered, in order.
+"""
+import queue
+import time
+
+# Event kinds used by the job queue front ends
+JOB = 'job'
+PROGRESS = 'progress'
+LOG = 'log'
+COMPLETE = 'complete'
+ERROR = 'error'
+PREVIEW = 'preview'
+
+
+class Event:
+    """One published event"""
+
+    __slots__ = ('kind', 'key', 'data', 'timestamp')
+
+    def __init__(self, kind, key, data, timestamp):
+        self.kind = kind
+        self.key = key
+        self.data = data
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"Event({self.kind!r}, {self.key!r}, {self.data!r})"
+
+
+class EventBus:
+    """Multi-producer, single-consumer queue of events with coalescing on drain"""
+
+    def __init__(self, max_log_events=200):
+        """
+        Args:
+            max_log_events (int): Log events kept per drain; older ones are dropped
+        """
+        self.max_log_events = max_log_events
+        self._queue = queue.SimpleQueue()
+
+    def publish(self, kind, key=None, **data):
+        """Publish an event (safe to call from any thread)"""
+        self._queue.put(Event(kind, key, data, time.time()))
+
+    def drain(self, limit=None):
+        """
+        Take the pending events and coalesce them (call from the consumer thread)
+
+        Args:
+            limit (int): Maximum number of raw events taken in one call, so a
+                flood of events cannot block the UI; the rest stay queued
+
+        Returns:
+            list: Events in the order they were first published
+        """
+        events = []
+        keyed = {}
+        logs = 0
+        taken = 0
+        while limit is None or taken < limit:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            taken += 1
+
+            if event.key is not None:
+                index = keyed.get((event.kind, event.key))
+                if index is not None:
+                    # Keep the original position, with the latest data
+                    events[index] = event
+                    continue
+                keyed[(event.kind, event.key)] = len(events)
+            elif event.kind == LOG:
+                logs += 1
+            events.append(event)
+
+        if logs > self.max_log_events:
+            excess = logs - self.max_log_events
+            kept = []
+            for event in events:
+                if event.kind == LOG and event.key is None and excess:
+                    excess -= 1
+                    continue
+                kept.append(event)
+            events = kept
+        return events
+
+    def empty(self):
+        return self._queue.empty()
+
+
+class EventBusSink:
+    """Instrumentation sink that publishes finished stages as log events"""
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    def handle(self, event):
+        if event['event'] != 'end':
+            return
+        message = f"{event['stage']}: {event['wall_seconds']:.2f}s"
+        if event.get('error'):
+            message += f" ({event['error']})"
+        self.bus.publish(LOG, job=event['job'], stage=event['stage'], message=message)
+
+    def close(self):
+        pass
@@ -0,0 +1,388 @@
+"""
+Structured per-stage instrumentation for the processing pipeline.
+
+Every stage of a job emits a ``start`` and an ``end`` event (plain dicts) to
+the configured sinks. End events carry the wall time, CPU time, number of
+samples processed and how much the stage raised the process's peak RSS::
+
+    {"job": "episode.wav", "stage": "eq", "event": "end", "timestamp": 1700000000.0,
+     "wall_seconds": 0.41, "cpu_seconds": 0.40, "samples": 2880000,
+     "peak_rss_delta": 23068672}
+
+With ``trace_memory`` enabled, end events also carry the peak of the
+memory traced by tracemalloc during the stage (numpy reports its buffers to
+tracemalloc) and that peak in multiples of the signal's size, i.e. how many
+signal-sized buffers the stage allocated at once.
+
+Figures that belong to the job rather than to one stage (such as the hits
+and misses of the stage cache) are emitted once as a ``summary`` event::
+
+    {"job": "episode.wav", "stage": "stage_cache", "event": "summary", "timestamp": 1700000000.0,
+     "hits": 3, "misses": 2, "cache": {"hits": 41, "misses": 17, ...}}
+
+Sinks: ``CollectorSink`` (in-process list), ``JsonLinesSink`` (one JSON
+object per line), ``LogSink`` (standard logging). A profiler hook such as
+``CProfileHook`` can be attached to profile a single job.
+"""
+import cProfile
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, or None if unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class CollectorSink:
+    """Keeps events in memory, e.g. for tests, benchmarks or the UI"""
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def stage_totals(self):
+        """Wall seconds per stage summed over all collected end events"""
+        totals = {}
+        for event in self.events:
+            if event['event'] == 'end':
+                totals[event['stage']] = totals.get(event['stage'], 0.0) + event['wall_seconds']
+        return totals
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    """Appends every event as one JSON line to a file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def handle(self, event):
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class LogSink:
+    """Writes end and summary events through the logging module (or a log file)"""
+
+    def __init__(self, logger=None, path=None, level=logging.INFO):
+        if logger is None:
+            logger = logging.getLogger('podcast_studio_enhancer.stages')
+            if path is not None:
+                handler = logging.FileHandler(path, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                logger.addHandler(handler)
+                logger.setLevel(level)
+        self.logger = logger
+        self.level = level
+
+    def handle(self, event):
+        if event['event'] == 'summary':
+            fields = {key: value for key, value in event.items() if key not in ('job', 'stage', 'event', 'timestamp')}
+            self.logger.log(self.level, "%s %s: %s", event['job'], event['stage'], fields)
+            return
+        if event['event'] != 'end':
+            return
+        memory = ''
+        if 'traced_peak_bytes' in event:
+            memory = f", traced peak {event['traced_peak_bytes']} bytes"
+            if event.get('signal_copies') is not None:
+                memory += f" ({event['signal_copies']}x signal)"
+        self.logger.log(
+            self.level,
+            "%s %s: %.3fs wall, %.3fs cpu, %s samples, peak RSS +%s bytes%s%s",
+            event['job'], event['stage'], event['wall_seconds'], event['cpu_seconds'],
+            event['samples'], event['peak_rss_delta'], memory,
+            f", error: {event['error']}" if event.get('error') else ''
+        )
+
+    def close(self):
+        pass
+
+
+class CProfileHook:
+    """Profiles one job with cProfile and dumps the stats to a file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self._profile.dump_stats(self.path)
+
+
+class Instrumentation:
+    """
+    Emits stage events for one job to a set of sinks
+
+    Args:
+        sinks (list): Objects with ``handle(event)``
+        job (str): Identifier put into every event (usually the input file name)
+        profiler: Optional hook with ``start()``/``stop()`` wrapped around the job
+        trace_memory (bool): Trace allocations of every stage with tracemalloc (slow)
+    """
+
+    def __init__(self, sinks=None, job=None, profiler=None, trace_memory=False):
+        self.sinks = list(sinks or [])
+        self.job = job
+        self.profiler = profiler
+        self.trace_memory = trace_memory
+        # stage -> [wall seconds, samples] summed over the job
+        self.totals = {}
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink.handle(event)
+
+    def _event(self, stage, kind, **fields):
+        event = {'job': self.job, 'stage': stage, 'event': kind, 'timestamp': time.time()}
+        event.update(fields)
+        return event
+
+    @contextmanager
+    def stage(self, name, samples=None, nbytes=None):
+        """
+        Time a stage; yields a dict whose 'samples' and 'nbytes' entries may be updated inside
+        (other keys added to it are put into the end event as-is)
+
+        Usage::
+
+            with instrumentation.stage('eq', samples=len(y), nbytes=y.nbytes):
+                y = apply_eq(y)
+        """
+        info = {'samples': samples, 'nbytes': nbytes}
+        self.emit(self._event(name, 'start', samples=samples))
+        trace = _start_trace() if self.trace_memory else None
+        rss_before = peak_rss()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        error = None
+        try:
+            yield info
+        except BaseException as e:
+            error = str(e) or type(e).__name__
+            raise
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.process_time() - cpu_start
+            fields = {key: value for key, value in info.items() if key not in ('samples', 'nbytes')}
+            if trace:
+                fields.update(_stop_trace(trace, info['nbytes']))
+            self.record(
+                name,
+                wall_seconds,
+                cpu_seconds,
+                info['samples'],
+                _rss_delta(rss_before),
+                error=error,
+                **fields
+            )
+
+    def record(self, name, wall_seconds, cpu_seconds, samples=None, peak_rss_delta=None, error=None, **fields):
+        """
+        Emit an end event for a stage that was timed elsewhere (extra fields are added as-is)
+
+        Stages marked ``cached=True`` (output taken from a cache) are left out of ``totals``,
+        which estimate how long computing a stage takes.
+        """
+        event = self._event(
+            name, 'end',
+            wall_seconds=wall_seconds,
+            cpu_seconds=cpu_seconds,
+            samples=samples,
+            peak_rss_delta=peak_rss_delta
+        )
+        event.update(fields)
+        if error is not None:
+            event['error'] = error
+
+        if not fields.get('cached'):
+            total = self.totals.setdefault(name, [0.0, 0])
+            total[0] += wall_seconds
+            total[1] += samples or 0
+
+        self.emit(event)
+
+    def summary(self, name, **fields):
+        """Emit a summary event with figures of the whole job (fields are added as-is)"""
+        self.emit(self._event(name, 'summary', **fields))
+
+    @contextmanager
+    def job_profile(self):
+        """Run the profiler hook (if any) around a whole job"""
+        if self.profiler is None:
+            yield
+            return
+        self.profiler.start()
+        try:
+            yield
+        finally:
+            self.profiler.stop()
+
+
+def _rss_delta(before):
+    after = peak_rss()
+    if before is None or after is None:
+        return None
+    return after - before
+
+
+def _start_trace():
+    """Start (or reuse) tracemalloc and remember the memory traced before the stage"""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    current, _ = tracemalloc.get_traced_memory()
+    return started, current
+
+
+def _stop_trace(trace, nbytes):
+    """Memory fields of an end event for a stage traced since ``_start_trace``"""
+    started, before = trace
+    _, peak = tracemalloc.get_traced_memory()
+    if started:
+        tracemalloc.stop()
+    fields = {'traced_peak_bytes': max(0, peak - before)}
+    if nbytes:
+        fields['signal_copies'] = round(fields['traced_peak_bytes'] / nbytes, 2)
+    return fields
+
+
+class StreamStageTimer:
+    """
+    Measures the time a block generator stage spends producing its blocks
+
+    Generator stages are interleaved, and pulling a block from a stage also
+    runs every upstream stage. Each timer therefore records its inclusive
+    time and subtracts the time of the upstream timer it wraps.
+    """
+
+    def __init__(self, name, upstream=None):
+        self.name = name
+        self.upstream = upstream
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.samples = 0
+
+    def wrap(self, blocks):
+        iterator = iter(blocks)
+        while True:
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            try:
+                block = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.wall_seconds += time.perf_counter() - wall_start
+                self.cpu_seconds += time.process_time() - cpu_start
+            self.samples += block.shape[-1]
+            yield block
+
+    @property
+    def exclusive_wall_seconds(self):
+        upstream = self.upstream.wall_seconds if self.upstream else 0.0
+        return max(0.0, self.wall_seconds - upstream)
+
+    @property
+    def exclusive_cpu_seconds(self):
+        upstream = self.upstream.cpu_seconds if self.upstream else 0.0
+        return max(0.0, self.cpu_seconds - upstream)
+
+
+class JobCancelled(Exception):
+    """Raised at the next safe point of a job whose cancel flag has been set"""
+
+
+class ProgressTracker:
+    """
+    Turns work done into progress percentages
+
+    Every planned stage has a relative cost (seconds per sample from earlier
+    jobs, or a default estimate). Progress is the cost of the finished stages
+    plus the finished fraction of the current one, over the total cost.
+
+    Stages report progress at points where stopping is safe (between blocks),
+    so the tracker is also where a job notices that it has been cancelled.
+    """
+
+    def __init__(self, stage_costs, callback=None, cancel_event=None):
+        """
+        Args:
+            stage_costs (list): (stage name, relative cost) in execution order
+            callback (callable): Receives integer percentages 0-100
+            cancel_event (threading.Event): When set, ``begin``/``update`` raise JobCancelled
+        """
+        self.costs = dict(stage_costs)
+        self.order = [name for name, _ in stage_costs]
+        self.total = sum(self.costs.values()) or 1.0
+        self.callback = callback
+        self.cancel_event = cancel_event
+        self._done = 0.0
+        self._current = None
+        self._last = -1
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job's cancel flag is set"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise JobCancelled(f"cancelled during {self._current or 'start-up'}")
+
+    def begin(self, stage):
+        """Mark the start of a stage (finishing any previous one)"""
+        if self._current is not None:
+            self._done += self.costs.get(self._current, 0.0)
+        self._current = stage
+        self.check_cancelled()
+        self._report(0.0)
+
+    def update(self, fraction):
+        """Report the finished fraction (0-1) of the current stage"""
+        self.check_cancelled()
+        self._report(min(max(fraction, 0.0), 1.0))
+
+    def finish(self):
+        """Mark the whole job as done"""
+        self._current = None
+        self._done = self.total
+        self._report(0.0)
+
+    def _report(self, fraction):
+        if self.callback is None:
+            return
+        current = self.costs.get(self._current, 0.0) * fraction if self._current else 0.0
+        percent = int(100 * (self._done + current) / self.total)
+        if percent != self._last:
+            self._last = percent
+            self.callback(percent)
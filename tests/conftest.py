@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(1234)
+
+
+@pytest.fixture
+def speech_like(rng):
+    """Make a (channels, samples) float32 test signal: tones, noise and a quiet pause"""
+    def make(seconds=2.0, sr=48000, channels=1):
+        t = np.arange(int(seconds * sr)) / sr
+        y = np.empty((channels, len(t)), dtype=np.float32)
+        for channel in range(channels):
+            tone = 0.4 * np.sin(2 * np.pi * (180 + 40 * channel) * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 3 * t))
+            y[channel] = tone + 0.02 * rng.standard_normal(len(t))
+        # Room tone only, so noise profiles and silence detection have something to find
+        y[:, int(0.2 * sr):int(0.6 * sr)] = 0.01 * rng.standard_normal((channels, int(0.6 * sr) - int(0.2 * sr)))
+        return y[0] if channels == 1 else y
+    return make
+
+
+@pytest.fixture
+def wav_file(tmp_path, speech_like):
+    """Write a test signal to a WAV file and return its path"""
+    def write(name='episode.wav', seconds=2.0, sr=48000, channels=1):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        y = speech_like(seconds, sr, channels)
+        sf.write(str(path), y.T, sr, subtype='FLOAT')
+        return str(path)
+    return write
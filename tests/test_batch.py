@@ -0,0 +1,22 @@
+import os
+from src.audio_processing.noise_profile import NoiseProfile
+from src.cli.batch import main
+
+
+def test_saved_profile_is_applied_and_profiles_do_not_collide(tmp_path, wav_file):
+    inputs = [wav_file('a/episode.wav'), wav_file('b/episode.wav')]
+    profile = str(tmp_path / 'studio')
+    profile_dir = tmp_path / 'prof'
+
+    status = main(inputs + [
+        '--save-noise-profile', profile, '--apply-saved-profile', '--profile-dir', str(profile_dir),
+        '--output-dir', str(tmp_path / 'out'), '--rendition', 'wav', '--workers', '1', '--no-cache',
+    ])
+    assert status == 0
+    # Saved (and applied) under the name numpy writes, with '.npz' added
+    assert isinstance(NoiseProfile.load(profile + '.npz'), NoiseProfile)
+    assert len(os.listdir(tmp_path / 'out')) == 2
+
+    # One cProfile dump per input, although both are named episode.wav
+    dumps = sorted(os.listdir(profile_dir))
+    assert len(dumps) == 2 and all(name.startswith('episode-') and name.endswith('.prof') for name in dumps)
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from scipy import signal
+from src.audio_processing.chain import ChainError, compile_chain
+from src.audio_processing.compressor import Compressor
+from src.audio_processing.equalizer import get_eq_filter
+from src.audio_processing.processor import AudioProcessor
+
+SR = 48000
+
+
+def chain(*stages):
+    return {'name': 'test', 'stages': list(stages)}
+
+
+def db(value):
+    return 10 ** (value / 20)
+
+
+def butter(y, kind, freq, order=2):
+    return signal.sosfilt(signal.butter(order, freq / (SR / 2), btype=kind, output='sos'), y)
+
+
+def apply_op(op, y):
+    if op.kind == 'filter':
+        return op.linear_filter(SR).apply(y)
+    if op.kind == 'pointwise':
+        return op.pointwise()(y)
+    if op.kind == 'compression':
+        return op.compressor().compress(y, SR)
+    raise AssertionError(f"unexpected op {op.kind}")
+
+
+@pytest.fixture
+def y(rng):
+    return rng.standard_normal(SR) * 0.3
+
+
+def test_adjacent_filters_merge_into_one_pass(y):
+    compiled = compile_chain(chain(
+        {'type': 'highpass', 'freq': 80}, {'type': 'eq', 'preset': 'Parlak'}, {'type': 'lowpass', 'freq': 12000},
+        {'type': 'normalize'}
+    ))
+    assert [op.kind for op in compiled.ops] == ['filter', 'normalize']
+    assert compiled.ops[0].name == 'highpass+eq+lowpass'
+
+    expected = butter(get_eq_filter('Parlak', SR).apply(butter(y, 'highpass', 80)), 'lowpass', 12000)
+    out = apply_op(compiled.ops[0], y)
+    assert np.max(np.abs(out - expected)) < 1e-4 * np.max(np.abs(y))
+
+
+def test_gains_around_a_filter_fold_into_it(y):
+    compiled = compile_chain(chain({'type': 'gain', 'db': 6.0}, {'type': 'eq', 'preset': 'Sıcak'}, {'type': 'gain', 'db': -2.0}))
+    assert [op.kind for op in compiled.ops] == ['filter']
+    expected = get_eq_filter('Sıcak', SR).apply(y) * db(4.0)
+    np.testing.assert_allclose(apply_op(compiled.ops[0], y), expected, rtol=0, atol=1e-9)
+
+
+def test_gain_after_a_compressor_becomes_makeup_gain(y):
+    compiled = compile_chain(chain({'type': 'compression', 'amount': 0.6}, {'type': 'gain', 'db': 3.0}))
+    assert [op.kind for op in compiled.ops] == ['pointwise']
+    assert len(compiled.ops[0].primitives) == 1
+    expected = Compressor.from_amount(0.6).compress(y, SR) * db(3.0)
+    np.testing.assert_allclose(apply_op(compiled.ops[0], y), expected, rtol=1e-12, atol=0)
+
+    smoothed = {'type': 'compression', 'amount': 0.6, 'attack_ms': 5.0, 'release_ms': 50.0}
+    compiled = compile_chain(chain(smoothed, {'type': 'gain', 'db': 3.0}))
+    assert [op.kind for op in compiled.ops] == ['compression']
+    expected = Compressor.from_amount(0.6, attack_ms=5.0, release_ms=50.0).compress(y, SR) * db(3.0)
+    np.testing.assert_allclose(apply_op(compiled.ops[0], y), expected, rtol=1e-12, atol=0)
+
+
+def test_gain_before_a_compressor_is_not_folded(y):
+    compiled = compile_chain(chain({'type': 'gain', 'db': 6.0}, {'type': 'compression', 'amount': 0.6}))
+    out = y
+    for op in compiled.ops:
+        out = apply_op(op, out)
+    expected = Compressor.from_amount(0.6).compress(y * db(6.0), SR)
+    np.testing.assert_allclose(out, expected, rtol=1e-12, atol=0)
+
+
+def test_gains_in_front_of_normalization_are_dropped():
+    compiled = compile_chain(chain(
+        {'type': 'eq', 'preset': 'Derin'}, {'type': 'gain', 'db': 6.0}, {'type': 'compression', 'amount': 0.5},
+        {'type': 'gain', 'db': 2.0}, {'type': 'normalize'}
+    ))
+    assert [op.kind for op in compiled.ops] == ['filter', 'pointwise', 'normalize']
+    # The gain after the EQ stays (it feeds the compressor), the compressor's makeup goes
+    assert compiled.ops[0].primitives[0]['factor'] == pytest.approx(db(6.0))
+    assert compiled.ops[1].primitives[0]['factor'] == 1.0
+
+
+def test_gain_in_front_of_silence_trimming_is_kept():
+    compiled = compile_chain(chain({'type': 'gain', 'db': -20.0}, {'type': 'trim_silence'}, {'type': 'normalize'}))
+    assert [op.kind for op in compiled.ops] == ['pointwise', 'trim', 'normalize']
+
+
+def test_invalid_stages_are_rejected():
+    with pytest.raises(ChainError, match='Stage 2'):
+        compile_chain(chain({'type': 'eq'}, {'type': 'gain', 'db': 'loud'}))
+    with pytest.raises(ChainError, match='unknown type'):
+        compile_chain(chain({'type': 'reverb'}))
+
+
+def test_compiled_chain_renders_like_its_stages_one_by_one(tmp_path, wav_file):
+    input_file = wav_file(sr=SR)
+    stages = [
+        {'type': 'gain', 'db': 6.0}, {'type': 'highpass', 'freq': 100}, {'type': 'eq', 'preset': 'Parlak'},
+        {'type': 'gain', 'db': -3.0}, {'type': 'compression', 'amount': 0.4}, {'type': 'gain', 'db': 2.0},
+        {'type': 'normalize', 'peak': 0.9},
+    ]
+    processor = AudioProcessor(output_dir=str(tmp_path / 'out'), cache=False, stage_cache=False)
+    result = processor.process_audio(input_file, {'chain': chain(*stages), 'renditions': [{'codec': 'wav'}]})
+    out = sf.read(result.output_file)[0]
+
+    y = sf.read(input_file, dtype='float32')[0].astype(np.float64)
+    y = butter(y * db(6.0), 'highpass', 100)
+    y = get_eq_filter('Parlak', SR).apply(y) * db(-3.0)
+    y = Compressor.from_amount(0.4).compress(y, SR) * db(2.0)
+    expected = y * (0.9 / np.max(np.abs(y)))
+    # The FIR truncation of both linear stages (1e-4 of the peak each, as for the EQ alone)
+    # plus one 16-bit step
+    assert np.max(np.abs(out - expected)) < 2e-4 * 0.9 + 1 / 32768
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from src.audio_processing.compressor import Compressor
+
+
+def reference_compression(y, amount):
+    """The per-sample loop the Compressor replaced (AudioProcessor._apply_compression)"""
+    threshold = 0.5 - (amount * 0.4)
+    ratio = 1 + (amount * 5)
+    y_compressed = np.zeros_like(y)
+    for i in range(len(y)):
+        if abs(y[i]) > threshold:
+            y_compressed[i] = threshold + (abs(y[i]) - threshold) / ratio
+            if y[i] < 0:
+                y_compressed[i] = -y_compressed[i]
+        else:
+            y_compressed[i] = y[i]
+    makeup_gain = 1.0 + (amount * 0.3)
+    return y_compressed * makeup_gain
+
+
+@pytest.mark.parametrize('amount', [0.0, 0.25, 0.5, 1.0])
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_static_compression_is_bit_identical_to_the_loop(rng, amount, dtype):
+    y = (rng.standard_normal(20000) * 0.4).astype(dtype)
+    expected = reference_compression(y, amount)
+    out = Compressor.from_amount(amount).compress(y, 48000)
+    assert out.dtype == expected.dtype
+    assert np.array_equal(out, expected)
+
+
+def test_static_compression_of_channels_matches_each_channel(rng):
+    y = rng.standard_normal((3, 5000)) * 0.4
+    out = Compressor.from_amount(0.7).compress(y, 48000)
+    for channel in range(3):
+        assert np.array_equal(out[channel], reference_compression(y[channel], 0.7))
+
+
+def test_in_place_compression_matches_whole_signal(rng):
+    y = rng.standard_normal(50000) * 0.4
+    compressor = Compressor.from_amount(0.6, attack_ms=5.0, release_ms=50.0, knee=0.1, lookahead_ms=2.0)
+    expected = compressor.compress(y, 48000)
+    out = compressor.compress_in_place(y.copy(), 48000, block_size=4096)
+    np.testing.assert_allclose(out, expected, rtol=0, atol=1e-12)
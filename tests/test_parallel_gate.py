@@ -0,0 +1,20 @@
+import numpy as np
+from src.audio_processing.noise_profile import MultichannelGate, NoiseProfile, SpectralGate
+from src.audio_processing.parallel_gate import ParallelGate
+
+SR = 48000
+BLOCK_SIZE = 20000
+CONTEXT_SIZE = 4096
+
+
+def test_parallel_gate_equals_the_serial_gate(speech_like, rng):
+    profile = NoiseProfile.from_signal(rng.standard_normal(SR) * 0.01, SR)
+    mono = speech_like(seconds=3.0, sr=SR)
+    stereo = speech_like(seconds=3.0, sr=SR, channels=2)
+    for gate, y in ((SpectralGate(profile, SR, 0.8), mono),
+                    (MultichannelGate.from_profiles([profile, profile], SR, 0.8), stereo)):
+        expected = gate.apply(y, BLOCK_SIZE, CONTEXT_SIZE)
+        with ParallelGate(gate, workers=2) as parallel:
+            np.testing.assert_array_equal(parallel.apply(y, BLOCK_SIZE, CONTEXT_SIZE), expected)
+            # Workers are never forked from a process that may be running threads
+            assert parallel._pool._mp_context.get_start_method() in ('forkserver', 'spawn')
@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+import soundfile as sf
+from src.audio_processing.processor import AudioProcessor
+from src.audio_processing.renditions import claim_output_base, encode_renditions, output_renditions, remix
+
+
+def test_claimed_output_bases_never_collide(tmp_path):
+    base = str(tmp_path / 'episode_enhanced_20240101-000000')
+    suffixes = ['_128k.mp3', '.flac']
+    with ThreadPoolExecutor(8) as pool:
+        claimed = list(pool.map(lambda _: claim_output_base(base, suffixes), range(16)))
+    assert len(set(claimed)) == 16
+    assert claimed.count(base) == 1
+    for candidate in claimed:
+        for suffix in suffixes:
+            assert os.path.exists(candidate + suffix)
+
+
+def test_equally_named_inputs_get_separate_outputs(tmp_path, wav_file):
+    first = wav_file('a/episode.wav')
+    second = wav_file('b/episode.wav')
+    processor = AudioProcessor(output_dir=str(tmp_path / 'out'), cache=False, stage_cache=False)
+    settings = {'renditions': [{'codec': 'flac'}]}
+    with ThreadPoolExecutor(2) as pool:
+        results = list(pool.map(lambda path: processor.process_audio(path, settings), [first, second]))
+    outputs = [result.output_file for result in results]
+    assert len(set(outputs)) == 2
+    assert all(os.path.getsize(path) > 0 for path in outputs)
+
+
+def test_failed_encoding_leaves_no_files(tmp_path):
+    y = np.zeros((1, 1000), dtype=np.float32)
+    renditions = output_renditions({'renditions': [{'codec': 'flac'}, {'codec': 'wav', 'label': 'master'}]})
+
+    def cancel(fraction):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        encode_renditions(y, 48000, str(tmp_path / 'episode'), renditions, progress=cancel, block_size=10)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('source_channels', [1, 2, 4])
+@pytest.mark.parametrize('streaming', [False, True])
+def test_renditions_have_the_requested_channel_count(tmp_path, wav_file, source_channels, streaming):
+    input_file = wav_file(channels=source_channels)
+    settings = {
+        'streaming': streaming,
+        'renditions': [
+            {'codec': 'flac', 'channels': 2},
+            {'codec': 'flac', 'channels': 1, 'label': 'mono'},
+            {'codec': 'wav'},
+        ],
+    }
+    processor = AudioProcessor(output_dir=str(tmp_path / 'out'), cache=False, stage_cache=False)
+    result = processor.process_audio(input_file, settings)
+    channels = [sf.info(path).channels for path in result.output_files]
+    assert channels == [2, 1, source_channels]
+
+
+def test_stereo_fold_keeps_stereo_and_balances_more_channels():
+    stereo = np.arange(20, dtype=np.float32).reshape(10, 2)
+    assert np.array_equal(remix(stereo, 2), stereo)
+
+    # Four channels of the same signal fold to that signal on both sides
+    same = np.repeat(np.linspace(-1, 1, 10, dtype=np.float32)[:, None], 4, axis=1)
+    folded = remix(same, 2)
+    assert folded.shape == (10, 2) and folded.dtype == np.float32
+    np.testing.assert_allclose(folded, same[:, :2], atol=1e-6)
+
+    # The first channel is fully left, the last fully right
+    first = np.zeros((1, 4), dtype=np.float32)
+    first[0, 0] = 1.0
+    assert remix(first, 2)[0, 1] == 0.0
+    last = np.zeros((1, 4), dtype=np.float32)
+    last[0, 3] = 1.0
+    assert remix(last, 2)[0, 0] == 0.0
@@ -0,0 +1,157 @@
+import json
+import multiprocessing
+import os
+import pytest
+from src.audio_processing.noise_profile import NoiseProfile
+from src.audio_processing.processor import AudioProcessor
+from src.audio_processing.renditions import ProcessingResult, Rendition, RenditionResult
+from src.audio_processing.result_cache import INDEX_FILE, ResultCache
+
+BASE_SETTINGS = {
+    'noise_reduction': 0.5,
+    'compression': 0.5,
+    'eq_preset': 'Stüdyo',
+    'loudness_target': -16.0,
+}
+
+# Every one of these changes the processed audio, so it must change the key
+OUTPUT_CHANGES = [
+    {'noise_reduction': 0.6},
+    {'compression': 0.6},
+    {'compression_attack_ms': 5.0},
+    {'compression_release_ms': 50.0},
+    {'compression_knee': 0.2},
+    {'compression_lookahead_ms': 2.0},
+    {'eq_preset': 'Sıcak'},
+    {'skip_silence': True},
+    {'trim_silence': True},
+    {'loudness_target': -19.0},
+    {'loudness_target': None},
+    {'true_peak': -2.0},
+    {'codec': 'flac'},
+    {'bitrate': '128k'},
+    {'renditions': [{'codec': 'mp3', 'bitrate': '64k', 'channels': 1}]},
+    {'processing_rate': 44100},
+    {'output_rate': 44100},
+    {'chain': {'name': 'x', 'stages': [{'type': 'highpass', 'freq': 90}, {'type': 'normalize'}]}},
+]
+
+# These change how the audio is processed, not the result
+IGNORED_CHANGES = [
+    {'streaming': True},
+    {'low_memory': True},
+    {'scratch': 'mapped'},
+    {'denoise_workers': 4},
+    {'encode_workers': 2},
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / 'cache'))
+
+
+@pytest.fixture
+def input_file(wav_file):
+    return wav_file()
+
+
+@pytest.mark.parametrize('change', OUTPUT_CHANGES)
+def test_settings_that_change_the_output_change_the_key(cache, input_file, change):
+    assert cache.make_key(input_file, dict(BASE_SETTINGS, **change), '1') != cache.make_key(input_file, BASE_SETTINGS, '1')
+
+
+@pytest.mark.parametrize('change', IGNORED_CHANGES)
+def test_settings_that_do_not_change_the_output_keep_the_key(cache, input_file, change):
+    assert cache.make_key(input_file, dict(BASE_SETTINGS, **change), '1') == cache.make_key(input_file, BASE_SETTINGS, '1')
+
+
+def test_input_contents_and_version_are_part_of_the_key(cache, tmp_path, wav_file):
+    first = wav_file('a.wav')
+    key = cache.make_key(first, BASE_SETTINGS, '1')
+    assert cache.make_key(first, BASE_SETTINGS, '2') != key
+
+    with open(first, 'r+b') as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b'\x00\x00\x80\x3f')
+    assert cache.make_key(first, BASE_SETTINGS, '1') != key
+
+
+def test_options_of_disabled_stages_do_not_change_the_key(cache, input_file):
+    settings = {'compression': 0.0, 'noise_reduction': 0.0}
+    key = cache.make_key(input_file, settings, '1')
+    assert cache.make_key(input_file, dict(settings, compression_attack_ms=10.0), '1') == key
+    assert cache.make_key(input_file, dict(settings, skip_silence=True), '1') == key
+
+
+def test_noise_profiles_are_keyed_by_their_contents(cache, tmp_path, input_file, rng):
+    path = str(tmp_path / 'studio.npz')
+    NoiseProfile.from_signal(rng.standard_normal(48000) * 0.01, 48000).save(path)
+    settings = dict(BASE_SETTINGS, noise_profile=path)
+    key = cache.make_key(input_file, settings, '1')
+    NoiseProfile.from_signal(rng.standard_normal(48000) * 0.05, 48000).save(path)
+    assert cache.make_key(input_file, settings, '1') != key
+
+
+def test_noise_profile_of_a_denoising_chain_is_part_of_the_key(cache, tmp_path, input_file, rng):
+    # The noise_reduction slider is 0: the chain's own stage uses the profile
+    denoising = {'name': 'x', 'stages': [{'type': 'noise_reduction', 'amount': 0.7}, {'type': 'normalize'}]}
+    keys = set()
+    for name, level in (('quiet.npz', 0.01), ('loud.npz', 0.05)):
+        path = str(tmp_path / name)
+        NoiseProfile.from_signal(rng.standard_normal(48000) * level, 48000).save(path)
+        keys.add(cache.make_key(input_file, {'chain': denoising, 'noise_reduction': 0.0, 'noise_profile': path}, '1'))
+    assert len(keys) == 2
+
+    # Without a noise reduction stage the profile is unused
+    plain = {'name': 'x', 'stages': [{'type': 'highpass', 'freq': 90}, {'type': 'normalize'}]}
+    assert (cache.make_key(input_file, {'chain': plain, 'noise_profile': str(tmp_path / 'quiet.npz')}, '1')
+            == cache.make_key(input_file, {'chain': plain}, '1'))
+
+def test_chain_files_are_keyed_by_their_contents(cache, tmp_path, input_file):
+    path = tmp_path / 'chain.json'
+    path.write_text(json.dumps({'name': 'x', 'stages': [{'type': 'highpass', 'freq': 90}]}))
+    key = cache.make_key(input_file, {'chain': str(path)}, '1')
+    path.write_text(json.dumps({'name': 'x', 'stages': [{'type': 'highpass', 'freq': 120}]}))
+    assert cache.make_key(input_file, {'chain': str(path)}, '1') != key
+
+
+def test_second_render_comes_from_the_cache(tmp_path, input_file):
+    processor = AudioProcessor(output_dir=str(tmp_path / 'out'), stage_cache=False)
+    settings = {'compression': 0.5, 'renditions': [{'codec': 'flac'}, {'codec': 'wav', 'label': 'master'}]}
+    first = processor.process_audio(input_file, settings)
+    second = processor.process_audio(input_file, settings)
+    assert not first.cached and second.cached
+    for original, copy in zip(first.output_files, second.output_files):
+        assert original != copy
+        with open(original, 'rb') as a, open(copy, 'rb') as b:
+            assert a.read() == b.read()
+
+
+def _put_entries(cache_dir, worker, count):
+    cache = ResultCache(cache_dir)
+    for index in range(count):
+        output = os.path.join(cache_dir, '..', f"out-{worker}-{index}.wav")
+        with open(output, 'wb') as f:
+            f.write(os.urandom(64))
+        cache.put(f"{worker:04d}{index:04d}", ProcessingResult([RenditionResult(Rendition('wav', label=''), output)]))
+
+
+def test_processes_sharing_a_cache_lose_no_entries(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    ResultCache(cache_dir)
+    # A file that no entry refers to, as left by a crash between copying and indexing
+    orphan = os.path.join(cache_dir, 'orphan.wav')
+    open(orphan, 'wb').close()
+
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_put_entries, args=(cache_dir, worker, 10)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    with open(os.path.join(cache_dir, INDEX_FILE), encoding='utf-8') as f:
+        assert len(json.load(f)) == 40
+    assert not os.path.exists(orphan)
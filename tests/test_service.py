@@ -0,0 +1,74 @@
+import io
+import os
+import time
+import pytest
+from src.audio_processing.jobs import DONE, FINISHED_STATES
+from src.audio_processing.noise_profile import NoiseProfile
+from src.service.server import ProcessingService
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = ProcessingService(str(tmp_path / 'out'), workers=1)
+    yield service
+    service.shutdown()
+
+
+def wait_for(job, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while job.status not in FINISHED_STATES:
+        assert time.monotonic() < deadline, f"job {job.id} did not finish"
+        time.sleep(0.05)
+    # The service's update hook runs right after the status changes
+    time.sleep(0.2)
+
+
+def upload(service, wav_file, name):
+    with open(wav_file(name), 'rb') as f:
+        data = f.read()
+    return service.receive_upload(name, io.BytesIO(data), len(data))
+
+
+def test_negative_content_length_is_rejected(service):
+    with pytest.raises(ValueError, match='negative'):
+        service.receive_upload('episode.wav', io.BytesIO(b'\0' * 1024), -1)
+    assert os.listdir(service.upload_dir) == []
+
+
+def test_noise_profiles_come_from_the_profile_directory(service, tmp_path, rng):
+    os.makedirs(service.profile_dir)
+    profile = NoiseProfile.from_signal(rng.standard_normal(48000) * 0.01, 48000)
+    saved = profile.save(os.path.join(service.profile_dir, 'studio.npz'))
+    outside = profile.save(str(tmp_path / 'secret.npz'))
+    os.makedirs(os.path.join(service.profile_dir, 'shows'))
+    profile.save(os.path.join(service.profile_dir, 'shows', 'late.npz'))
+
+    assert service.validate_settings({'noise_profile': 'studio.npz'})['noise_profile'] == os.path.realpath(saved)
+    assert service.validate_settings({'noise_profile': 'shows/late.npz'})['noise_profile'].startswith(
+        os.path.realpath(service.profile_dir))
+
+    if hasattr(os, 'symlink'):
+        os.symlink(outside, os.path.join(service.profile_dir, 'link.npz'))
+    for name in (outside, '../secret.npz', 'shows/../../secret.npz', 'link.npz', 'missing.npz', 'studio', 3):
+        with pytest.raises(ValueError):
+            service.validate_settings({'noise_profile': name})
+
+
+def test_finished_jobs_expire_with_their_outputs(service, wav_file):
+    service.max_finished_jobs = 1
+    settings = {'renditions': [{'codec': 'wav'}]}
+    first = service.submit(upload(service, wav_file, 'first.wav'), settings)
+    wait_for(first)
+    second = service.submit(upload(service, wav_file, 'second.wav'), settings)
+    wait_for(second)
+    assert first.status == second.status == DONE
+
+    # Only the newest finished job is kept
+    assert [job.id for job in service.queue.jobs()] == [second.id]
+    assert not any(os.path.exists(path) for path in first.result.output_files)
+    assert all(os.path.exists(path) for path in second.result.output_files)
+
+    service.job_ttl = 0
+    service.expire_jobs()
+    assert service.queue.jobs() == []
+    assert not any(os.path.exists(path) for path in second.result.output_files)
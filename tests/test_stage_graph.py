@@ -0,0 +1,44 @@
+import gc
+import os
+import time
+import numpy as np
+from src.audio_processing.stage_graph import SPILL_SUFFIX, STALE_SPILL_SECONDS, StageCache
+
+
+def test_caches_sharing_a_spill_directory_keep_their_spills(tmp_path, rng):
+    spill_dir = str(tmp_path / 'stages')
+    value = rng.standard_normal(4096)
+    # Smaller memory budget than the value: it goes straight to disk
+    first = StageCache(max_bytes=1024, spill_dir=spill_dir)
+    first.put('denoise', value)
+    assert first.stats()['spills'] == 1
+
+    second = StageCache(max_bytes=1024, spill_dir=spill_dir)
+    second.put('denoise', value * 2)
+    np.testing.assert_array_equal(first.get('denoise'), value)
+    np.testing.assert_array_equal(second.get('denoise'), value * 2)
+
+    # A cache's session directory goes with it, the other one stays
+    first_dir = first.spill_dir
+    del first
+    gc.collect()
+    assert not os.path.exists(first_dir)
+    assert os.path.isdir(second.spill_dir)
+
+
+def test_stale_spills_of_crashed_sessions_are_removed(tmp_path):
+    spill_dir = tmp_path / 'stages'
+    stale_session = spill_dir / 'session-1-crashed'
+    stale_session.mkdir(parents=True)
+    (stale_session / ('x' + SPILL_SUFFIX)).write_bytes(b'\0')
+    loose = spill_dir / ('y' + SPILL_SUFFIX)
+    loose.write_bytes(b'\0')
+    old = time.time() - STALE_SPILL_SECONDS - 60
+    for path in (stale_session, loose):
+        os.utime(path, (old, old))
+    live_session = spill_dir / 'session-2-running'
+    live_session.mkdir()
+
+    StageCache(spill_dir=str(spill_dir))
+    assert not stale_session.exists() and not loose.exists()
+    assert live_session.exists()
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pytest
+import soundfile as sf
+from src.audio_processing.processor import AudioProcessor
+from src.utils.instrumentation import CollectorSink, Instrumentation
+
+# Outputs are written as 16-bit FLAC: allow one step
+LSB = 1.0 / 32768
+
+SETTINGS = [
+    {},
+    {'noise_reduction': 0.5, 'compression': 0.5, 'eq_preset': 'Sıcak'},
+    {'compression': 0.4, 'compression_attack_ms': 5.0, 'compression_release_ms': 80.0,
+     'compression_lookahead_ms': 2.0, 'loudness_target': -16.0},
+    {'chain': {'name': 'test', 'stages': [
+        {'type': 'highpass', 'freq': 100}, {'type': 'gain', 'db': 3.0}, {'type': 'eq', 'preset': 'Parlak'},
+        {'type': 'compression', 'amount': 0.3}, {'type': 'normalize'}]}},
+]
+
+
+def render(tmp_path, input_file, settings, name):
+    processor = AudioProcessor(output_dir=str(tmp_path / name), cache=False, stage_cache=False)
+    events = CollectorSink()
+    result = processor.process_audio(input_file, dict(settings, renditions=[{'codec': 'flac'}]),
+                                     instrumentation=Instrumentation([events]))
+    # The streaming pipeline runs the whole chain as one 'process' stage
+    streamed = any(event['stage'] == 'process' for event in events.events)
+    assert streamed == bool(settings.get('streaming'))
+    return sf.read(result.output_file, always_2d=True)[0]
+
+
+@pytest.mark.parametrize('settings', SETTINGS)
+@pytest.mark.parametrize('channels', [1, 2])
+def test_streaming_output_equals_in_memory_output(tmp_path, wav_file, settings, channels):
+    input_file = wav_file(seconds=3.0, channels=channels)
+    in_memory = render(tmp_path, input_file, settings, 'memory')
+    streamed = render(tmp_path, input_file, dict(settings, streaming=True), 'streaming')
+    assert streamed.shape == in_memory.shape
+    assert np.max(np.abs(streamed - in_memory)) <= LSB + 1e-9
+
+
+def test_streaming_scratch_file_has_no_4gib_limit(tmp_path, wav_file, monkeypatch):
+    opened = []
+    original = sf.SoundFile
+
+    def recording_soundfile(file, mode='r', *args, **kwargs):
+        opened.append((str(file), mode, kwargs.get('format')))
+        return original(file, mode, *args, **kwargs)
+
+    monkeypatch.setattr(sf, 'SoundFile', recording_soundfile)
+    scratch_dir = tmp_path / 'scratch'
+    processor = AudioProcessor(output_dir=str(tmp_path / 'out'), cache=False, stage_cache=False,
+                               scratch_dir=str(scratch_dir))
+    processor.process_audio(wav_file(), {'streaming': True, 'renditions': [{'codec': 'flac'}]})
+
+    scratch = [(mode, file_format) for path, mode, file_format in opened
+               if os.path.dirname(path) == str(scratch_dir) and mode == 'w']
+    # Plain RIFF WAV stops at 4 GiB, about 3 hours of 32-bit stereo
+    assert scratch and all(file_format in ('RF64', 'W64') for _, file_format in scratch)